@@ -1,11 +1,12 @@
 'use client'
 
-import { useEffect, useState, useCallback } from 'react'
+import { useEffect, useState, useCallback, useRef } from 'react'
 import { useRouter } from 'next/navigation'
 import Link from 'next/link'
 import { Search, FileText, Download, Trash2, BookOpen, Eye } from 'lucide-react'
 import { useAuth } from '@/hooks/useAuth'
 import { getApiUrl, getAuthHeaders, getAuthHeadersFormData } from '@/lib/api'
+import { NoteDelta, getFeedVersion, mergeNoteDelta } from '@/lib/feed'
 import Navigation from '@/components/Navigation'
 import NotePreview from '@/components/NotePreview'
 
@@ -31,6 +32,8 @@ export default function DashboardPage() {
   const [deletingNotes, setDeletingNotes] = useState<Set<number>>(new Set())
   const [error, setError] = useState<string | null>(null)
   const [previewNote, setPreviewNote] = useState<Note | null>(null)
+  // Feed version of the loaded notes, for fetching only what changed since
+  const feedVersion = useRef<number | null>(null)
 
   const fetchNotes = useCallback(async () => {
     setLoadingNotes(true)
@@ -43,6 +46,7 @@ export default function DashboardPage() {
       if (response.ok) {
         const data = await response.json()
         // Ensure data is an array
+        feedVersion.current = getFeedVersion(response)
         setNotes(Array.isArray(data) ? data : [])
         setError(null)
       } else if (response.status === 401) {
@@ -68,6 +72,28 @@ export default function DashboardPage() {
     }
   }, [router])
 
+  // Fetch only the notes created, changed or deleted since the last load
+  const refreshNotes = useCallback(async () => {
+    if (feedVersion.current === null) {
+      return fetchNotes()
+    }
+    try {
+      const apiUrl = getApiUrl(`/api/notes?since=${feedVersion.current}`)
+      const response = await fetch(apiUrl, { headers: getAuthHeaders() })
+      if (!response.ok) {
+        return fetchNotes()
+      }
+      const delta: NoteDelta<Note> = await response.json()
+      if (delta.reset) {
+        return fetchNotes()
+      }
+      feedVersion.current = delta.version
+      setNotes(prevNotes => mergeNoteDelta(prevNotes, delta))
+    } catch (error) {
+      console.error('Error refreshing notes:', error)
+    }
+  }, [fetchNotes])
+
   // Fetch notes when user is available
   useEffect(() => {
     if (!loading && user) {
@@ -84,13 +110,13 @@ export default function DashboardPage() {
 
     const handleVisibilityChange = () => {
       if (document.visibilityState === 'visible' && user && !loading) {
-        fetchNotes()
+        refreshNotes()
       }
     }
 
     const handleFocus = () => {
       if (user && !loading) {
-        fetchNotes()
+        refreshNotes()
       }
     }
 
@@ -101,7 +127,7 @@ export default function DashboardPage() {
       document.removeEventListener('visibilitychange', handleVisibilityChange)
       window.removeEventListener('focus', handleFocus)
     }
-  }, [user, loading, fetchNotes])
+  }, [user, loading, refreshNotes])
 
   // Derive classes dynamically from user's notes
   useEffect(() => {
@@ -186,13 +212,13 @@ export default function DashboardPage() {
         }
         alert(errorMessage)
         // Refresh notes if deletion failed
-        fetchNotes()
+        refreshNotes()
       }
     } catch (error) {
       console.error('Error deleting note:', error)
       alert('Network error. Please check your connection and try again.')
       // Refresh notes on error
-      fetchNotes()
+      refreshNotes()
     } finally {
       setDeletingNotes(prev => {
         const newSet = new Set(prev)
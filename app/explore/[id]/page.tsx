@@ -5,7 +5,7 @@ import { useRouter, useParams } from 'next/navigation'
 import Link from 'next/link'
 import { BookOpen, Heart, MessageCircle, Download, ArrowLeft, Send, Eye } from 'lucide-react'
 import { useAuth } from '@/hooks/useAuth'
-import { getApiUrl, getAuthHeaders } from '@/lib/api'
+import { getApiUrl, getAuthHeaders, getAuthToken } from '@/lib/api'
 import Navigation from '@/components/Navigation'
 import NotePreview from '@/components/NotePreview'
 import { validateContent } from '@/lib/contentFilter'
@@ -31,6 +31,13 @@ interface Note {
   is_liked: boolean
   comment_count: number
   comments: Comment[]
+  comments_next_cursor: string | null
+}
+
+// The live stream also delivers our own comments, so skip ones already shown
+function addComment(note: Note | null, comment: Comment): Note | null {
+  if (!note || note.comments.some(existing => existing.id === comment.id)) return note
+  return { ...note, comments: [...note.comments, comment], comment_count: note.comment_count + 1 }
 }
 
 export default function NoteDetailPage() {
@@ -46,6 +53,7 @@ export default function NoteDetailPage() {
   const [liking, setLiking] = useState(false)
   const [showPreview, setShowPreview] = useState(false)
   const [commentError, setCommentError] = useState<string | null>(null)
+  const [loadingComments, setLoadingComments] = useState(false)
 
   const fetchNote = useCallback(async () => {
     setLoadingNote(true)
@@ -74,6 +82,49 @@ export default function NoteDetailPage() {
     }
   }, [user, loading, router, fetchNote])
 
+  // Live like counts and comments from other users
+  useEffect(() => {
+    const token = getAuthToken()
+    if (!user || !token) return
+
+    const events = new EventSource(getApiUrl(`/api/live/notes/${noteId}?token=${encodeURIComponent(token)}`))
+    events.addEventListener('like', (event) => {
+      const { like_count } = JSON.parse((event as MessageEvent).data)
+      setNote(prev => prev ? { ...prev, like_count } : prev)
+    })
+    events.addEventListener('comment', (event) => {
+      const { comment } = JSON.parse((event as MessageEvent).data)
+      setNote(prev => addComment(prev, comment))
+    })
+    return () => events.close()
+  }, [user, noteId])
+
+  // Comments come in pages; live and posted comments may already be shown
+  const loadMoreComments = async () => {
+    if (!note?.comments_next_cursor || loadingComments) return
+
+    setLoadingComments(true)
+    try {
+      const apiUrl = getApiUrl(`/api/notes/${noteId}/comments?cursor=${note.comments_next_cursor}`)
+      const response = await fetch(apiUrl, { headers: getAuthHeaders() })
+      if (response.ok) {
+        const page: { comments: Comment[]; next_cursor: string | null } = await response.json()
+        setNote(prev => {
+          if (!prev) return prev
+          const byId = new Map([...prev.comments, ...page.comments].map(comment => [comment.id, comment]))
+          const comments = Array.from(byId.values()).sort(
+            (a, b) => a.created_at.localeCompare(b.created_at) || a.id - b.id
+          )
+          return { ...prev, comments, comments_next_cursor: page.next_cursor }
+        })
+      }
+    } catch (error) {
+      console.error('Error loading comments:', error)
+    } finally {
+      setLoadingComments(false)
+    }
+  }
+
   const handleLike = async () => {
     if (!user || liking) return
 
@@ -87,7 +138,9 @@ export default function NoteDetailPage() {
       })
 
       if (response.ok) {
-        fetchNote() // Refresh note data
+        const result = await response.json()
+        // The like endpoint returns the new count, so no refetch is needed
+        setNote(prev => prev ? { ...prev, is_liked: result.liked, like_count: result.like_count } : prev)
       }
     } catch (error) {
       console.error('Error toggling like:', error)
@@ -123,9 +176,10 @@ export default function NoteDetailPage() {
       })
 
       if (response.ok) {
+        const comment: Comment = await response.json()
         setCommentText('')
         setCommentError(null)
-        fetchNote() // Refresh note data
+        setNote(prev => addComment(prev, comment))
       } else {
         // Handle error response
         const errorData = await response.json().catch(() => ({ detail: 'Failed to add comment' }))
@@ -302,6 +356,15 @@ export default function NoteDetailPage() {
                   </div>
                 ))
               )}
+              {note.comments_next_cursor && (
+                <button
+                  onClick={loadMoreComments}
+                  disabled={loadingComments}
+                  className="w-full py-2 text-primary-600 hover:text-primary-700 font-medium disabled:opacity-50"
+                >
+                  {loadingComments ? 'Loading...' : 'Load more comments'}
+                </button>
+              )}
             </div>
           </div>
         </div>
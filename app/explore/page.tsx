@@ -1,11 +1,12 @@
 'use client'
 
-import { useEffect, useState, useCallback } from 'react'
+import { useEffect, useState, useCallback, useRef } from 'react'
 import { useRouter } from 'next/navigation'
 import Link from 'next/link'
 import { BookOpen, Search, Heart, MessageCircle, Download, Filter, Eye } from 'lucide-react'
 import { useAuth } from '@/hooks/useAuth'
 import { getApiUrl, getAuthHeaders } from '@/lib/api'
+import { NoteDelta, getFeedVersion, mergeNoteDelta } from '@/lib/feed'
 import Navigation from '@/components/Navigation'
 import NotePreview from '@/components/NotePreview'
 
@@ -15,7 +16,6 @@ interface Note {
   class_name: string
   description: string
   file_path: string
-  author_email: string
   author_username: string
   created_at: string
   like_count: number
@@ -23,6 +23,9 @@ interface Note {
   comment_count: number
 }
 
+// Ask the feed for only what the cards and preview use
+const NOTE_FIELDS = 'title,class_name,description,file_path,author_username,created_at,like_count,is_liked,comment_count'
+
 export default function ExplorePage() {
   const { user, loading } = useAuth()
   const router = useRouter()
@@ -35,6 +38,8 @@ export default function ExplorePage() {
   const [likingNotes, setLikingNotes] = useState<Set<number>>(new Set())
   const [error, setError] = useState<string | null>(null)
   const [previewNote, setPreviewNote] = useState<Note | null>(null)
+  // Feed version of the loaded notes, for fetching only what changed since
+  const feedVersion = useRef<number | null>(null)
 
   useEffect(() => {
     if (!loading && user) {
@@ -51,14 +56,14 @@ export default function ExplorePage() {
 
     const handleVisibilityChange = () => {
       if (document.visibilityState === 'visible' && user && !loading) {
-        fetchNotes()
+        refreshNotes()
         fetchClasses()
       }
     }
 
     const handleFocus = () => {
       if (user && !loading) {
-        fetchNotes()
+        refreshNotes()
         fetchClasses()
       }
     }
@@ -71,19 +76,34 @@ export default function ExplorePage() {
       window.removeEventListener('focus', handleFocus)
     }
     // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [user, loading]) // fetchNotes and fetchClasses are stable due to useCallback
+  }, [user, loading]) // refreshNotes and fetchClasses are stable due to useCallback
 
   const fetchNotes = useCallback(async () => {
     setLoadingNotes(true)
     setError(null)
     try {
-      const apiUrl = getApiUrl('/api/notes/global')
+      const apiUrl = getApiUrl(`/api/notes/global?fields=${NOTE_FIELDS}`)
       const headers = getAuthHeaders()
       const response = await fetch(apiUrl, { headers })
       if (response.ok) {
         const data = await response.json()
-        setNotes(Array.isArray(data) ? data : [])
+        const fetchedNotes: Note[] = Array.isArray(data) ? data : []
+        feedVersion.current = getFeedVersion(response)
+        setNotes(fetchedNotes)
         setError(null)
+        // The global feed is public, so ask which of these notes the user liked
+        if (fetchedNotes.length > 0) {
+          const likedResponse = await fetch(getApiUrl('/api/notes/liked-status'), {
+            method: 'POST',
+            headers,
+            body: JSON.stringify({ note_ids: fetchedNotes.map(note => note.id) }),
+          })
+          if (likedResponse.ok) {
+            const { liked } = await likedResponse.json()
+            const likedIds = new Set<number>(liked)
+            setNotes(fetchedNotes.map(note => ({ ...note, is_liked: likedIds.has(note.id) })))
+          }
+        }
       } else if (response.status === 401) {
         setError('Your session has expired. Please log in again.')
         document.cookie = 'token=; expires=Thu, 01 Jan 1970 00:00:00 UTC; path=/;'
@@ -100,6 +120,35 @@ export default function ExplorePage() {
     }
   }, [router])
 
+  // Fetch only the notes created, changed or deleted since the last load
+  const refreshNotes = useCallback(async () => {
+    if (feedVersion.current === null) {
+      return fetchNotes()
+    }
+    try {
+      const apiUrl = getApiUrl(`/api/notes/global?since=${feedVersion.current}&fields=${NOTE_FIELDS}`)
+      const response = await fetch(apiUrl, { headers: getAuthHeaders() })
+      if (!response.ok) {
+        return fetchNotes()
+      }
+      const delta: NoteDelta<Note> = await response.json()
+      if (delta.reset) {
+        return fetchNotes()
+      }
+      feedVersion.current = delta.version
+      setNotes(prevNotes => {
+        // The public feed does not know the user's likes; keep the ones we have
+        const likedIds = new Set(prevNotes.filter(note => note.is_liked).map(note => note.id))
+        return mergeNoteDelta(prevNotes, {
+          ...delta,
+          notes: delta.notes.map(note => ({ ...note, is_liked: likedIds.has(note.id) })),
+        })
+      })
+    } catch (error) {
+      console.error('Error refreshing notes:', error)
+    }
+  }, [fetchNotes])
+
   const fetchClasses = useCallback(async () => {
     try {
       const apiUrl = getApiUrl('/api/notes/classes')
@@ -167,7 +216,7 @@ export default function ExplorePage() {
               return {
                 ...note,
                 is_liked: result.liked,
-                like_count: result.liked ? note.like_count + 1 : Math.max(0, note.like_count - 1)
+                like_count: result.like_count
               }
             }
             return note
@@ -9,6 +9,8 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
+from tracing import span
+
 # Security configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
@@ -79,7 +81,7 @@ async def get_current_user(
 ):
     """Get the current authenticated user."""
     from database import get_db
-    from models import User
+    from statements import user_by_email
     
     # Get database session using dependency injection
     db_dep = get_db()
@@ -91,16 +93,28 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    with span("auth"):
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            email: str = payload.get("sub")
+            if email is None:
+                raise credentials_exception
+        except JWTError:
+            raise credentials_exception
+        
+        user = user_by_email(db, email)
+        if user is None:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        raise credentials_exception
     
     return user
+
+async def get_admin_user(current_user = Depends(get_current_user)):
+    """Get the current user if their email is in ``ADMIN_EMAILS``."""
+    from config import ADMIN_EMAILS
+    
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
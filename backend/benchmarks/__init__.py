@@ -0,0 +1 @@
+"""Benchmark scripts. Run from the backend directory, e.g. ``python -m benchmarks.bench_delete_note``."""
@@ -0,0 +1,93 @@
+"""Benchmark deleting a note with many likes.
+
+Compares the database-level ``ON DELETE CASCADE`` path used by
+``delete_note`` with the ORM-loaded cascade it replaced, which pulled every
+like and comment into the session and deleted them one by one.
+
+Usage: python -m benchmarks.bench_delete_note [--likes 50000] [--comments 1000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+
+def _seed(engine, like_count: int, comment_count: int) -> int:
+    """Create one note with ``like_count`` likes; returns the note id."""
+    from datetime import datetime
+    from models import User, Note, Like, Comment
+
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": i, "email": f"user{i}@example.edu", "username": f"user{i}",
+             "hashed_password": "x", "created_at": now}
+            for i in range(1, like_count + 1)
+        ])
+        note_id = conn.execute(Note.__table__.insert().values(
+            title="Popular note", class_name="BENCH 101", file_path="bench.txt",
+            author_id=1, created_at=now
+        )).inserted_primary_key[0]
+        conn.execute(Like.__table__.insert(), [
+            {"note_id": note_id, "user_id": i, "created_at": now}
+            for i in range(1, like_count + 1)
+        ])
+        conn.execute(Comment.__table__.insert(), [
+            {"note_id": note_id, "user_id": (i % like_count) + 1, "content": "Great notes!", "created_at": now}
+            for i in range(comment_count)
+        ])
+    return note_id
+
+
+def _delete_passive(session_factory, note_id: int) -> None:
+    from models import Note
+
+    db = session_factory()
+    try:
+        db.delete(db.get(Note, note_id))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _delete_orm_loaded(session_factory, note_id: int) -> None:
+    """Emulate the previous cascade="all, delete-orphan" behaviour."""
+    from models import Note
+
+    db = session_factory()
+    try:
+        note = db.get(Note, note_id)
+        # Loading the collections makes the ORM cascade delete each row itself
+        len(note.likes)
+        len(note.comments)
+        db.delete(note)
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--likes", type=int, default=50000)
+    parser.add_argument("--comments", type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_delete_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    from database import engine, Base, SessionLocal
+    import models  # noqa: F401
+
+    for label, delete in (("ORM-loaded cascade", _delete_orm_loaded),
+                          ("ON DELETE CASCADE", _delete_passive)):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        note_id = _seed(engine, args.likes, args.comments)
+        start = time.perf_counter()
+        delete(SessionLocal, note_id)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<20} {args.likes} likes, {args.comments} comments: {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
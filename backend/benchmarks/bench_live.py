@@ -0,0 +1,182 @@
+"""Load-test live updates: many idle SSE subscribers on one API process.
+
+Starts the API under uvicorn (one process, temporary SQLite database),
+opens ``--subscribers`` streams on one note, and reports the server's memory
+per subscriber and idle CPU, then toggles likes and measures how long each
+event takes to reach every subscriber.
+
+Usage: python -m benchmarks.bench_live [--subscribers 10000] [--events 20]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class Subscriber:
+    """A raw SSE client that timestamps each like event it reads."""
+
+    def __init__(self, received: list, on_event):
+        self.received = received
+        self.on_event = on_event
+        self.writer = None
+
+    async def connect(self, port: int, path: str) -> None:
+        reader, self.writer = await asyncio.open_connection("127.0.0.1", port)
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n".encode())
+        await self.writer.drain()
+        status = await reader.readline()
+        if b" 200 " not in status:
+            raise RuntimeError(f"Subscribe failed: {status!r}")
+        self.reader = reader
+
+    async def read(self) -> None:
+        try:
+            async for line in self.reader:
+                if line.startswith(b"event: like"):
+                    self.received.append(time.perf_counter())
+                    self.on_event()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+
+async def _run(args, port: int, pid: int) -> None:
+    base = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient(base_url=base, timeout=30) as client:
+        response = await client.post("/api/auth/register", json={
+            "email": "bench@example.edu", "password": "secret123", "username": "bench"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        token = response.json()["access_token"]
+        response = await client.post("/api/notes/upload", headers=headers,
+                                     files={"file": ("a.txt", b"live benchmark")},
+                                     data={"title": "Live", "class_name": "BENCH 100"})
+        note_id = response.json()["id"]
+
+        rss_before = _rss_mb(pid)
+        received: list = []
+        counts = {"events": 0}
+        all_received = asyncio.Event()
+
+        def on_event():
+            counts["events"] += 1
+            if counts["events"] == args.subscribers:
+                all_received.set()
+
+        subscribers = [Subscriber(received, on_event) for _ in range(args.subscribers)]
+        limit = asyncio.Semaphore(500)
+        path = f"/api/live/notes/{note_id}?token={token}"
+
+        async def connect(subscriber):
+            async with limit:
+                await subscriber.connect(port, path)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(connect(s) for s in subscribers))
+        readers = [asyncio.create_task(s.read()) for s in subscribers]
+        print(f"Opened {args.subscribers} streams in {time.perf_counter() - start:.1f}s")
+
+        await asyncio.sleep(2)
+        rss_after = _rss_mb(pid)
+        print(f"Server RSS {rss_before:.0f} MB -> {rss_after:.0f} MB "
+              f"({(rss_after - rss_before) * 1024 / args.subscribers:.1f} KB per subscriber)")
+        cpu_start = _cpu_seconds(pid)
+        await asyncio.sleep(args.idle_seconds)
+        idle_cpu = (_cpu_seconds(pid) - cpu_start) / args.idle_seconds * 100
+        print(f"Idle server CPU: {idle_cpu:.1f}% over {args.idle_seconds}s")
+
+        round_trips, first, last = [], [], []
+        for _ in range(args.events):
+            received.clear()
+            counts["events"] = 0
+            all_received.clear()
+            sent = time.perf_counter()
+            await client.post(f"/api/notes/{note_id}/like", headers=headers)
+            round_trips.append(time.perf_counter() - sent)
+            await asyncio.wait_for(all_received.wait(), timeout=60)
+            first.append(min(received) - sent)
+            last.append(max(received) - sent)
+
+        def median_ms(values):
+            return sorted(values)[len(values) // 2] * 1000
+
+        # The like request itself (a SQLite write) dominates; the spread from
+        # first to last subscriber is the hub's fan-out time
+        print(f"{args.events} like events to {args.subscribers} subscribers (medians): "
+              f"like request {median_ms(round_trips):.0f} ms, "
+              f"first subscriber {median_ms(first):.0f} ms, last subscriber {median_ms(last):.0f} ms, "
+              f"fan-out {median_ms([b - a for a, b in zip(first, last)]):.0f} ms")
+
+        stats = (await client.get("/api/live/stats", headers=headers)).json()
+        print(f"Hub: {stats}")
+        for task in readers:
+            task.cancel()
+        for subscriber in subscribers:
+            subscriber.writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--idle-seconds", type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_live_")
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        UPLOAD_DIR=os.path.join(workdir, "uploads"),
+        JOB_QUEUE_ENABLED="false",
+        ADMIN_EMAILS="bench@example.edu",  # For /api/live/stats
+        LIVE_MAX_SUBSCRIBERS=str(args.subscribers + 100),
+    )
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/health")
+                break
+            except httpx.TransportError:
+                time.sleep(0.2)
+        asyncio.run(_run(args, port, server.pid))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""End-to-end load test: a mix of browse, preview, like, comment and upload traffic.
+
+Each of ``--users`` virtual users logs in and then loops for
+``--duration`` seconds: it picks an action by the ``--mix`` weights, sends
+the request, waits ``--think`` seconds on average, and repeats.  Notes to
+preview, like and comment on are drawn from the ones users have seen while
+browsing, so popular pages get most of the follow-up traffic, as in real
+use.  Browsing is mostly the first pages of the global feed, plus class
+feeds, trending and note details.
+
+Without ``--url``, a temporary SQLite database is filled with seed.py and
+served by uvicorn on a free port; ``--notes``, ``--likes`` and so on size
+it.  With ``--url``, the target's data is used as is; pass
+``--seeded-accounts`` if it was seeded with seed.py to log in as its
+accounts, otherwise new accounts are registered.
+
+Reports throughput, errors and latency percentiles per action and overall,
+excluding the ``--warmup`` seconds.
+
+Usage: python -m benchmarks.bench_load [--url URL] [--users 20] [--duration 60]
+       [--mix browse=60,preview=20,like=10,comment=7,upload=3]
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import httpx
+
+DEFAULT_MIX = "browse=60,preview=20,like=10,comment=7,upload=3"
+ACTIONS = ("browse", "preview", "like", "comment", "upload")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for entry in value.split(","):
+        action, _, weight = entry.partition("=")
+        action = action.strip()
+        if action not in ACTIONS:
+            raise SystemExit(f"Unknown action {action!r} in --mix; use {', '.join(ACTIONS)}")
+        mix[action] = float(weight)
+    return mix
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a sorted list."""
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+class LoadTest:
+    """Shared state of the virtual users: seen notes and per-action results."""
+
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.rng = random.Random(args.random_seed)
+        self.mix = _parse_mix(args.mix)
+        self.seen = deque(maxlen=2000)  # Recently seen note ids, most recent last
+        self.classes: List[str] = []
+        self.latencies: Dict[str, List[float]] = {action: [] for action in ACTIONS}
+        self.errors: Dict[str, Dict[str, int]] = {action: {} for action in ACTIONS}
+        self.measuring = False
+        self.seconds = 0.0  # Measured duration, once the run is over
+
+    async def login(self, index: int, run_id: str) -> Dict[str, str]:
+        if self.args.seeded_accounts:
+            email = f"seed{self.args.first_account + index}@seed.example.edu"
+            response = await self.client.post("/api/auth/login", json={
+                "email": email, "password": self.args.password})
+        else:
+            response = await self.client.post("/api/auth/register", json={
+                "email": f"load{run_id}_{index}@load.example.edu", "password": "loadtest123",
+                "username": f"load{run_id}_{index}"})
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def _note_id(self) -> Optional[int]:
+        if not self.seen:
+            return None
+        # Favour recently seen notes, as users act on what they just browsed
+        return self.seen[-1 - min(len(self.seen) - 1, int(self.rng.expovariate(1 / 50)))]
+
+    def _remember(self, notes) -> None:
+        for note in notes:
+            self.seen.append(note["id"])
+            if note.get("class_name") and len(self.classes) < 500 and note["class_name"] not in self.classes:
+                self.classes.append(note["class_name"])
+
+    async def _browse(self, headers) -> httpx.Response:
+        choice = self.rng.random()
+        if choice < 0.55 or not self.seen:
+            page = min(50, int(self.rng.paretovariate(1.5)))
+            response = await self.client.get("/api/notes/global", params={"page": page, "page_size": 20})
+        elif choice < 0.75 and self.classes:
+            response = await self.client.get("/api/notes/global", params={
+                "class_name": self.rng.choice(self.classes), "page_size": 20})
+        elif choice < 0.9:
+            response = await self.client.get("/api/notes/trending", params={"page_size": 20})
+        else:
+            return await self.client.get(f"/api/notes/global/{self._note_id()}", headers=headers)
+        if response.status_code == 200:
+            self._remember(response.json())
+        return response
+
+    async def _act(self, action: str, headers) -> Optional[httpx.Response]:
+        if action == "browse":
+            return await self._browse(headers)
+        if action == "upload":
+            size = self.rng.randint(2_000, 50_000)
+            return await self.client.post("/api/notes/upload", headers=headers, files={
+                "file": ("notes.txt", os.urandom(size // 2).hex().encode())
+            }, data={"title": f"Load test {self.rng.randint(1, 10_000)}",
+                     "class_name": self.rng.choice(self.classes) if self.classes else "LOAD 100"})
+        note_id = self._note_id()
+        if note_id is None:
+            return None
+        if action == "preview":
+            return await self.client.get(f"/api/notes/{note_id}/preview", headers=headers)
+        if action == "like":
+            return await self.client.post(f"/api/notes/{note_id}/like", headers=headers)
+        return await self.client.post(f"/api/notes/{note_id}/comments", headers=headers,
+                                      json={"content": "Load test comment, thanks for sharing!"})
+
+    async def user(self, headers, deadline: float) -> None:
+        actions, weights = zip(*self.mix.items())
+        while time.monotonic() < deadline:
+            action = self.rng.choices(actions, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await self._act(action, headers)
+                error = None if response is None or response.status_code < 400 else str(response.status_code)
+            except httpx.HTTPError as e:
+                response, error = True, type(e).__name__
+            elapsed = time.perf_counter() - start
+            if response is not None and self.measuring:
+                if error:
+                    self.errors[action][error] = self.errors[action].get(error, 0) + 1
+                else:
+                    self.latencies[action].append(elapsed)
+            if self.args.think:
+                await asyncio.sleep(self.rng.expovariate(1 / self.args.think))
+
+    def report(self, seconds: float) -> None:
+        print(f"{self.args.users} users for {seconds:.0f}s (think {self.args.think}s):")
+        print(f"  {'action':<8} {'requests':>9} {'req/s':>8} {'errors':>7} "
+              f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        everything: List[float] = []
+        for action in ACTIONS + ("all",):
+            if action == "all":
+                latencies, errors = everything, sum(sum(e.values()) for e in self.errors.values())
+            else:
+                latencies, errors = self.latencies[action], sum(self.errors[action].values())
+                everything.extend(latencies)
+            if not latencies and not errors:
+                continue
+            ordered = sorted(latencies) or [0.0]
+            print(f"  {action:<8} {len(latencies):>9} {len(latencies) / seconds:>8.1f} {errors:>7} "
+                  + " ".join(f"{_percentile(ordered, q) * 1000:>8.1f}" for q in (0.5, 0.9, 0.99, 1.0)))
+        for action, errors in self.errors.items():
+            if errors:
+                print(f"  {action} errors: " + ", ".join(f"{code} x{count}" for code, count in errors.items()))
+
+
+async def _run(args, base_url: str) -> LoadTest:
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        test = LoadTest(client, args)
+        run_id = f"{int(time.time()) % 100_000:05d}"
+        tokens = await asyncio.gather(*(test.login(index, run_id) for index in range(args.users)))
+        await test._browse(tokens[0])
+
+        start = time.monotonic()
+        deadline = start + args.warmup + args.duration
+        users = [asyncio.create_task(test.user(headers, deadline)) for headers in tokens]
+        await asyncio.sleep(args.warmup)
+        test.measuring = True
+        measured_from = time.monotonic()
+        await asyncio.gather(*users)
+        test.seconds = time.monotonic() - measured_from
+        test.report(test.seconds)
+        return test
+
+
+def _seed_and_serve(args) -> subprocess.Popen:
+    workdir = tempfile.mkdtemp(prefix="bench_load_")
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        UPLOAD_DIR=os.path.join(workdir, "uploads"),
+        STORAGE_TYPE="local",
+        JOB_QUEUE_ENABLED="false",
+    )
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([
+        sys.executable, "seed.py", "--users", str(max(args.seed_users, args.users)), "--notes", str(args.notes),
+        "--likes", str(args.likes), "--comments", str(args.comments), "--password", args.password,
+    ], cwd=backend_dir, check=True)
+    args.seeded_accounts, args.first_account = True, 1
+
+    args.port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(args.port), "--log-level", "warning", "--no-access-log"],
+        cwd=backend_dir,
+    )
+    for _ in range(150):
+        try:
+            httpx.get(f"http://127.0.0.1:{args.port}/health")
+            break
+        except httpx.TransportError:
+            time.sleep(0.2)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="API to load (default: seed and start a local one)")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds first")
+    parser.add_argument("--think", type=float, default=0.0, help="Mean pause between a user's requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Relative weight of each action")
+    parser.add_argument("--seeded-accounts", action="store_true", help="Log in as seed.py accounts")
+    parser.add_argument("--first-account", type=int, default=1, help="User id of the first seeded account")
+    parser.add_argument("--password", default="seedpassword", help="Password of the seeded accounts")
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--seed-users", type=int, default=1000, help="Local database only")
+    parser.add_argument("--notes", type=int, default=50_000, help="Local database only")
+    parser.add_argument("--likes", type=int, default=250_000, help="Local database only")
+    parser.add_argument("--comments", type=int, default=50_000, help="Local database only")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        server = _seed_and_serve(args)
+        base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        asyncio.run(_run(args, base_url))
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+
+if __name__ == "__main__":
+    main()
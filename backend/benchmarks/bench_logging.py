@@ -0,0 +1,175 @@
+"""Benchmark request throughput with INFO logging off, written inline, and queued.
+
+Drives the ASGI app in-process against a temporary SQLite database and
+times note previews, which log an INFO line per request (plus the access
+log line uvicorn would add).  Three setups are compared, alternating short
+rounds and keeping each one's best, after timing a single ``logger.info``
+call in each (the SQLite work of a preview can hide the difference):
+
+- ``off``: level WARNING, so INFO calls return at the level check
+- ``inline``: the old ``logging.basicConfig`` setup, formatting and writing
+  every record on the request thread
+- ``queued``: logs.py, where the request only queues the record and the
+  writer thread formats it as JSON
+
+Records go to ``--output`` (a temporary file by default).  Point it at a
+pipe with a slow reader, such as ``>(pv -q -L 20k >/dev/null)``, to see
+what a backed-up log collector does to the inline setup.
+
+Usage: python -m benchmarks.bench_logging [--requests 3000] [--rounds 10] [--output PATH]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+
+def _seed(engine, upload_dir: str, notes: int) -> None:
+    from datetime import datetime, timedelta
+    from models import User, Note
+
+    os.makedirs(upload_dir, exist_ok=True)
+    for i in range(1, notes + 1):
+        with open(os.path.join(upload_dir, f"{i}.txt"), "w") as f:
+            f.write(f"Notes for lecture {i}\n" * 50)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": 1, "email": "reader@example.edu", "username": "reader", "hashed_password": "x",
+             "created_at": now}
+        ])
+        conn.execute(Note.__table__.insert(), [
+            {"id": i, "title": f"Note {i}", "class_name": "CLASS 1",
+             "file_path": os.path.join(upload_dir, f"{i}.txt"), "author_id": 1,
+             "created_at": now - timedelta(minutes=i)}
+            for i in range(1, notes + 1)
+        ])
+
+
+async def _request(app, path: str, token: str) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            # What uvicorn's access log does for every response
+            logging.getLogger("uvicorn.access").info(
+                '%s - "%s %s HTTP/%s" %d', "127.0.0.1:50000", "GET", path, "1.1", status)
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _throughput(app, token: str, notes: int, requests: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        await _request(app, f"/api/notes/{i % notes + 1}/preview", token)
+    return requests / (time.perf_counter() - start)
+
+
+def _call_cost(setup: str, stream, calls: int) -> float:
+    """Seconds a request spends in one INFO call, and when the records are all written."""
+    import logs
+
+    _use(setup, stream)
+    logger = logging.getLogger("routes.notes")
+    start = time.perf_counter()
+    for i in range(calls):
+        logger.info("Serving preview of note %s (%s, %s) to %s", i, f"/uploads/{i}.txt", "text/plain",
+                    "reader@example.edu")
+    caller = time.perf_counter() - start
+    if logs._writer is not None:
+        logs.stop_logging()  # Waits for the writer to finish the queue
+    return caller / calls, (time.perf_counter() - start) / calls
+
+
+def _use(setup: str, stream) -> None:
+    import logs
+
+    if setup == "inline":
+        logs.stop_logging()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter(logs.TEXT_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+    else:
+        logs.configure_logging(logging.WARNING if setup == "off" else logging.INFO, "json", stream)
+
+
+async def _run(args, stream) -> None:
+    from main import app
+    from auth import create_access_token
+    from counters import start_counter_buffer, stop_counter_buffer
+    import logs
+
+    # As in production: preview counts are buffered, not committed per request
+    start_counter_buffer()
+    token = create_access_token({"sub": "reader@example.edu"})
+    setups = ("off", "inline", "queued")
+
+    print("One logger.info call:")
+    for setup in setups:
+        caller, total = min(_call_cost(setup, stream, 5000) for _ in range(3))
+        print(f"  {setup:<7} {caller * 1e6:6.2f} us on the request thread, {total * 1e6:6.2f} us until written")
+    for setup in setups:
+        _use(setup, stream)
+        assert await _request(app, "/api/notes/1/preview", token) == 200
+        await _throughput(app, token, args.notes, args.requests // 10)
+
+    best = dict.fromkeys(setups, 0.0)
+    for _ in range(args.rounds):
+        for setup in setups:
+            _use(setup, stream)
+            best[setup] = max(best[setup], await _throughput(app, token, args.notes, args.requests // args.rounds))
+    stop_counter_buffer()
+    # Back to stderr before the output file closes
+    logs.configure_logging(logging.WARNING)
+
+    print(f"GET /api/notes/{{note_id}}/preview, best of {args.rounds} rounds:")
+    for setup in setups:
+        print(f"  {setup:<7} {best[setup]:8,.0f} req/s  {best[setup] / best['off'] * 100:5.1f}% of INFO off")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=3000, help="Requests per setup")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--notes", type=int, default=50)
+    parser.add_argument("--output", help="Where log records go (default: a temporary file)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_logging_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["JOB_QUEUE_ENABLED"] = "false"
+    os.environ["METRICS_ENABLED"] = "false"
+    os.environ["COUNTER_WRITE_BEHIND"] = "true"
+    # Keep the import-time log lines out of the terminal
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from database import engine, Base
+    import models  # noqa: F401
+
+    Base.metadata.create_all(bind=engine)
+    _seed(engine, os.environ["UPLOAD_DIR"], args.notes)
+    with open(args.output or os.path.join(workdir, "bench.log"), "a") as stream:
+        asyncio.run(_run(args, stream))
+
+
+if __name__ == "__main__":
+    main()
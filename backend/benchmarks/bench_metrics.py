@@ -0,0 +1,145 @@
+"""Benchmark the throughput cost of the /metrics middleware.
+
+Drives the ASGI app in-process (no sockets, so only the server-side work
+is timed) with and without ``MetricsMiddleware`` wrapped around it,
+alternating short rounds of each so drift affects both equally, and keeps
+each variant's best round.  Two routes are measured: ``/health``, where the
+middleware is the largest share of the work, and a 20-note
+``/api/notes/global`` page on a temporary SQLite database.
+
+Run-to-run noise on a shared machine can exceed the difference, so the
+middleware's own cost is also timed around an app that does nothing, and
+reported as a share of each route's time per request.
+
+Usage: python -m benchmarks.bench_metrics [--requests 2000] [--rounds 10]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+def _seed(engine, notes: int) -> None:
+    from datetime import datetime, timedelta
+    from models import User, Note
+
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": i, "email": f"user{i}@example.edu", "username": f"user{i}",
+             "hashed_password": "x", "created_at": now}
+            for i in range(1, 51)
+        ])
+        conn.execute(Note.__table__.insert(), [
+            {"id": i, "title": f"Note {i}", "class_name": f"CLASS {i % 10}", "file_path": f"{i}.txt",
+             "author_id": i % 50 + 1, "created_at": now - timedelta(minutes=i)}
+            for i in range(1, notes + 1)
+        ])
+
+
+async def _request(app, path: str, query: bytes = b"") -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query,
+        "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _throughput(app, path: str, query: bytes, requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        await _request(app, path, query)
+    return requests / (time.perf_counter() - start)
+
+
+async def _noop_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _middleware_cost(route, requests: int) -> float:
+    """Seconds the middleware adds per request, around an app that does nothing."""
+    from metrics import MetricsMiddleware
+
+    instrumented = MetricsMiddleware(_noop_app)
+    scope = {"type": "http", "method": "GET", "route": route}
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        pass
+
+    best = {}
+    for _ in range(5):
+        for name, app in (("plain", _noop_app), ("instrumented", instrumented)):
+            start = time.perf_counter()
+            for _ in range(requests):
+                await app(dict(scope), receive, send)
+            best[name] = min(best.get(name, float("inf")), (time.perf_counter() - start) / requests)
+    return best["instrumented"] - best["plain"]
+
+
+async def _run(args) -> None:
+    from main import app
+    from metrics import MetricsMiddleware
+
+    instrumented = MetricsMiddleware(app)
+    overhead = await _middleware_cost(app.routes[-1], 100_000)
+    print(f"Middleware cost: {overhead * 1e6:.1f} us per request")
+
+    for path, query in (("/health", b""), ("/api/notes/global", b"page_size=20")):
+        assert await _request(app, path, query) == 200
+        # Warm up both stacks (FastAPI builds its middleware stack lazily)
+        await _throughput(app, path, query, args.requests // 10)
+        await _throughput(instrumented, path, query, args.requests // 10)
+
+        plain_rate = measured_rate = 0.0
+        for _ in range(args.rounds):
+            plain_rate = max(plain_rate, await _throughput(app, path, query, args.requests // args.rounds))
+            measured_rate = max(measured_rate,
+                                await _throughput(instrumented, path, query, args.requests // args.rounds))
+        cost = (1 - measured_rate / plain_rate) * 100
+        print(f"{path}{'?' + query.decode() if query else ''}: {plain_rate:,.0f} req/s without metrics, "
+              f"{measured_rate:,.0f} req/s with ({cost:+.1f}% measured, "
+              f"{overhead * plain_rate * 100:.1f}% from the middleware's own cost)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per route and variant")
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_metrics_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["JOB_QUEUE_ENABLED"] = "false"
+    # The app itself without the middleware; the benchmark wraps it explicitly
+    os.environ["METRICS_ENABLED"] = "false"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from database import engine, Base
+    import models  # noqa: F401
+
+    Base.metadata.create_all(bind=engine)
+    _seed(engine, 200)
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Benchmark the related-notes batch job on a synthetic like set.
+
+Generates a like matrix with power-law note popularity and user activity
+(the default is 100k users x 500k notes) and times ``related.compute_related``,
+the sparse co-like products and top-K selection that ``rebuild()`` runs
+before writing rows.  Database I/O is not included.
+
+Usage: python -m benchmarks.bench_related [--users 100000] [--notes 500000] [--likes 3000000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+
+def _synthetic_likes(users: int, notes: int, likes: int, seed: int = 0):
+    """Draw ``likes`` distinct (user, note) pairs with Zipf-like skew on both sides."""
+    rng = np.random.default_rng(seed)
+    user_weights = 1.0 / np.arange(1, users + 1) ** 0.8
+    note_weights = 1.0 / np.arange(1, notes + 1) ** 0.9
+    user_ids = rng.choice(users, size=likes, p=user_weights / user_weights.sum())
+    note_ids = rng.choice(notes, size=likes, p=note_weights / note_weights.sum())
+    pairs = np.unique(user_ids.astype(np.int64) * notes + note_ids)
+    return pairs // notes, pairs % notes
+
+
+def main():
+    from related import compute_related
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--notes", type=int, default=500_000)
+    parser.add_argument("--likes", type=int, default=3_000_000)
+    parser.add_argument("--top-k", type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    user_ids, note_ids = _synthetic_likes(args.users, args.notes, args.likes)
+    print(f"Generated {len(user_ids)} likes over {len(np.unique(note_ids))} liked notes "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    rows = blocks = 0
+    for note_block, _, _ in compute_related(user_ids, note_ids, args.top_k):
+        rows += len(note_block)
+        blocks += 1
+    elapsed = time.perf_counter() - start
+    print(f"Computed top-{args.top_k} neighbours: {rows} rows in {blocks} blocks, {elapsed:.1f}s "
+          f"({len(user_ids) / elapsed / 1e6:.2f}M likes/s)")
+
+
+if __name__ == "__main__":
+    main()
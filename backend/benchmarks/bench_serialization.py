@@ -0,0 +1,146 @@
+"""Benchmark serializing a 100-note listing page: Pydantic models vs. plain rows.
+
+The old path builds a ``NoteResponse`` per note, has FastAPI validate the
+list against ``response_model`` again, and encodes it with the standard
+JSON encoder.  The listings now build plain dicts (optionally limited by
+``?fields=``) and encode them with orjson, or the stdlib fallback.  Count
+queries are stubbed with dictionaries, so only building and encoding the
+page are timed.
+
+Usage: python -m benchmarks.bench_serialization [--notes 100] [--rounds 2000]
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+
+def _page(notes: int):
+    """Transient Note objects with authors, as a listing query would load them."""
+    from models import Note, User
+
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    authors = [User(id=i, email=f"user{i}@example.edu", username=f"user{i}") for i in range(1, 21)]
+    page = []
+    for i in range(1, notes + 1):
+        author = rng.choice(authors)
+        page.append(Note(
+            id=i, title=f"Lecture {i} notes", class_name=f"CLASS {i % 12}",
+            description="Week summary, worked examples and exam hints. " * rng.randint(1, 4),
+            file_path=f"/uploads/{i:08x}.pdf", author_id=author.id, author=author,
+            created_at=now - timedelta(minutes=i),
+        ))
+    counts = {note.id: {"like_count": rng.randint(0, 300), "comment_count": rng.randint(0, 40),
+                        "preview_count": rng.randint(0, 5000), "download_count": rng.randint(0, 900)}
+              for note in page}
+    return page, counts
+
+
+def _pydantic_path(page, counts, field, loop, render) -> bytes:
+    from fastapi.routing import serialize_response
+    from schemas import NoteResponse
+
+    responses: List[NoteResponse] = [
+        NoteResponse(
+            id=note.id,
+            title=note.title,
+            class_name=note.class_name,
+            description=note.description,
+            file_path=note.file_path,
+            author_email=note.author.email,
+            author_username=note.author.username,
+            created_at=note.created_at,
+            like_count=counts[note.id]["like_count"],
+            is_liked=False,
+            comment_count=counts[note.id]["comment_count"],
+            preview_count=counts[note.id]["preview_count"],
+            download_count=counts[note.id]["download_count"],
+        )
+        for note in page
+    ]
+    content = loop.run_until_complete(serialize_response(field=field, response_content=responses))
+    return render(content)
+
+
+def _rows_path(page, counts, fields, response_class) -> bytes:
+    from note_fields import note_getters
+
+    getters = note_getters(fields, {
+        "like_count": lambda note_id: counts[note_id]["like_count"],
+        "is_liked": lambda note_id: False,
+        "comment_count": lambda note_id: counts[note_id]["comment_count"],
+        "preview_count": lambda note_id: counts[note_id]["preview_count"],
+        "download_count": lambda note_id: counts[note_id]["download_count"],
+    })
+    rows = [{name: get(note) for name, get in getters} for note in page]
+    return response_class(content=rows).body
+
+
+def _time(run, rounds: int) -> float:
+    """Median milliseconds per call over ``rounds`` calls, after a warm-up."""
+    for _ in range(min(50, rounds)):
+        run()
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    import json
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from fastapi.utils import create_model_field
+    from note_fields import FastJSONResponse, _StdlibJSONResponse, parse_fields
+    from schemas import NoteResponse
+
+    page, counts = _page(args.notes)
+    loop = asyncio.new_event_loop()
+    field = create_model_field(name="Response_get_global_notes", type_=List[NoteResponse], mode="serialization")
+
+    def render_stdlib(content) -> bytes:
+        return JSONResponse(content=content).body
+
+    # The explore page's selection, and a minimal one for counters-only views
+    explore = parse_fields("title,class_name,description,file_path,author_username,created_at,"
+                           "like_count,is_liked,comment_count")
+    minimal = parse_fields("title,like_count,comment_count")
+
+    paths = [
+        ("NoteResponse + response_model + json", lambda: _pydantic_path(page, counts, field, loop, render_stdlib)),
+        ("rows, all fields, stdlib json", lambda: _rows_path(page, counts, None, _StdlibJSONResponse)),
+    ]
+    if FastJSONResponse is ORJSONResponse:
+        paths += [
+            ("rows, all fields, orjson", lambda: _rows_path(page, counts, None, ORJSONResponse)),
+            ("rows, explore page fields, orjson", lambda: _rows_path(page, counts, explore, ORJSONResponse)),
+            ("rows, id/title/counts, orjson", lambda: _rows_path(page, counts, minimal, ORJSONResponse)),
+        ]
+    else:
+        print("orjson is not installed; timing the stdlib fallback only")
+
+    # Every full-page path must produce the same document
+    expected = json.loads(paths[0][1]())
+    for name, run in paths[1:3]:
+        assert json.loads(run()) == expected, f"{name} differs from the Pydantic path"
+
+    print(f"Serializing a {args.notes}-note page, median of {args.rounds} rounds:")
+    baseline = None
+    for name, run in paths:
+        elapsed = _time(run, args.rounds)
+        baseline = baseline or elapsed
+        print(f"  {name:<40} {elapsed:7.3f} ms  {len(run()):7d} bytes  {baseline / elapsed:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
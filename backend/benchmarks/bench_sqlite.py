@@ -0,0 +1,129 @@
+"""Mixed read/write benchmark of the default and tuned (SQLITE_TUNED) SQLite modes.
+
+Fills one database file with seed.py, then for each mode serves a copy of
+it with ``--workers`` uvicorn processes and runs the bench_load virtual
+users against it, with a write-heavy ``--mix`` of browsing, likes and
+comments.  With several processes on the default rollback journal, readers
+wait out every commit and concurrent writers retry the database lock until
+they time out; in tuned mode reads use WAL snapshots and each process
+queues its writes for its one writer connection.
+
+Prints each mode's bench_load report, then a side-by-side summary.
+
+Usage: python -m benchmarks.bench_sqlite [--workers 4] [--users 32] [--duration 30]
+       [--mix browse=70,like=20,comment=10] [--modes default,tuned]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_load import _free_port, _percentile, _run
+
+MODES = ("default", "tuned")
+
+
+def _serve(db_path: str, upload_dir: str, mode: str, workers: int, port: int) -> subprocess.Popen:
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        UPLOAD_DIR=upload_dir,
+        STORAGE_TYPE="local",
+        JOB_QUEUE_ENABLED="false",
+        SQLITE_TUNED="true" if mode == "tuned" else "false",
+    )
+    env.setdefault("LOG_LEVEL", "WARNING")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=backend_dir, env=env,
+    )
+    for _ in range(150):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health")
+            break
+        except httpx.TransportError:
+            time.sleep(0.2)
+    # Let every worker finish starting up, not just the first to answer
+    time.sleep(1 + workers * 0.5)
+    return server
+
+
+def _summary(results) -> None:
+    print(f"{'mode':<8} {'req/s':>8} {'errors':>7} " + " ".join(
+        f"{action + ' p50/p99 ms':>22}" for action in ("browse", "like", "comment")))
+    for mode, test in results.items():
+        requests = sum(len(latencies) for latencies in test.latencies.values())
+        errors = sum(sum(e.values()) for e in test.errors.values())
+        cells = []
+        for action in ("browse", "like", "comment"):
+            ordered = sorted(test.latencies[action])
+            cells.append(f"{_percentile(ordered, 0.5) * 1000:>10.1f} /{_percentile(ordered, 0.99) * 1000:>9.1f}"
+                         if ordered else f"{'-':>22}")
+        print(f"{mode:<8} {requests / test.seconds:>8.1f} {errors:>7} " + " ".join(f"{c:>22}" for c in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated, from: default, tuned")
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn worker processes")
+    parser.add_argument("--users", type=int, default=32, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds per mode")
+    parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds first")
+    parser.add_argument("--think", type=float, default=0.0, help="Mean pause between a user's requests")
+    parser.add_argument("--mix", default="browse=70,like=20,comment=10", help="Relative weight of each action")
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--notes", type=int, default=20_000)
+    parser.add_argument("--likes", type=int, default=100_000)
+    parser.add_argument("--comments", type=int, default=20_000)
+    args = parser.parse_args()
+    modes = [mode.strip() for mode in args.modes.split(",")]
+    for mode in modes:
+        if mode not in MODES:
+            raise SystemExit(f"Unknown mode {mode!r}; use {', '.join(MODES)}")
+    # Log in as the seeded accounts (the options bench_load's LoadTest reads)
+    args.seeded_accounts, args.first_account, args.password = True, 1, "seedpassword"
+
+    workdir = tempfile.mkdtemp(prefix="bench_sqlite_")
+    template = os.path.join(workdir, "seeded.db")
+    upload_dir = os.path.join(workdir, "uploads")
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([
+        sys.executable, "seed.py", "--users", str(max(500, args.users)), "--notes", str(args.notes),
+        "--likes", str(args.likes), "--comments", str(args.comments), "--password", args.password,
+    ], cwd=backend_dir, check=True, env=dict(
+        os.environ, DATABASE_URL=f"sqlite:///{template}", UPLOAD_DIR=upload_dir, STORAGE_TYPE="local",
+        JOB_QUEUE_ENABLED="false", LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"),
+    ))
+
+    results = {}
+    try:
+        for mode in modes:
+            db_path = os.path.join(workdir, f"{mode}.db")
+            shutil.copy(template, db_path)
+            port = _free_port()
+            server = _serve(db_path, upload_dir, mode, args.workers, port)
+            try:
+                print(f"\n{mode} ({args.workers} workers):")
+                results[mode] = asyncio.run(_run(args, f"http://127.0.0.1:{port}"))
+            finally:
+                server.terminate()
+                try:
+                    server.wait(timeout=20)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print()
+    _summary(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""CPU time per hot query and per request, with and without the prebuilt statements.
+
+Fills a temporary SQLite database with seed.py, then measures CPU time
+(``time.process_time``, so request work done on threadpool threads counts
+too) in two parts:
+
+- per lookup: each query the statements module replaces, as the
+  ``db.query(...)`` the routes used to build on every call and as the
+  ``statements`` helper that now runs instead;
+- per request: routes that run those queries, driven in-process through
+  the ASGI app, so only server-side work is counted.
+
+SQLite has no server-side prepare, so this measures the Python half of the
+saving; on Postgres the prepared statements also skip parsing and planning.
+For before/after request numbers, run ``--requests-only`` on a checkout
+without the statements module as well.
+
+Usage: python -m benchmarks.bench_statements [--calls 2000] [--requests 500] [--rounds 5] [--requests-only]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+SEED_SIZE = {"users": 500, "notes": 5_000, "likes": 25_000, "comments": 5_000}
+
+
+def _cpu_per_call(func: Callable[[], object], calls: int, rounds: int) -> float:
+    """Best round's CPU seconds per call."""
+    func()
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.process_time()
+        for _ in range(calls):
+            func()
+        best = min(best, (time.process_time() - start) / calls)
+    return best
+
+
+def _lookups(db, user_email: str, user_id: int, note_id: int, page_ids: List[int]) -> List[Tuple[str, Callable, Callable]]:
+    """name, old ``db.query`` form, prebuilt statement helper."""
+    from sqlalchemy import func
+    from models import Comment, Like, Note, NoteStats, User
+    import statements
+
+    return [
+        ("user by email",
+         lambda: db.query(User).filter(User.email == user_email).first(),
+         lambda: statements.user_by_email(db, user_email)),
+        ("note by id",
+         lambda: db.query(Note).filter(Note.id == note_id).first(),
+         lambda: statements.note_by_id(db, note_id)),
+        ("note exists",
+         lambda: db.query(Note.id).filter(Note.id == note_id).first(),
+         lambda: statements.note_exists(db, note_id)),
+        ("like counts[20]",
+         lambda: dict(db.query(Like.note_id, func.count(Like.id))
+                      .filter(Like.note_id.in_(page_ids)).group_by(Like.note_id).all()),
+         lambda: statements.like_counts(db, page_ids)),
+        ("comment counts[20]",
+         lambda: dict(db.query(Comment.note_id, func.count(Comment.id))
+                      .filter(Comment.note_id.in_(page_ids)).group_by(Comment.note_id).all()),
+         lambda: statements.comment_counts(db, page_ids)),
+        ("has liked",
+         lambda: db.query(Like).filter(Like.note_id == note_id, Like.user_id == user_id).first() is not None,
+         lambda: statements.has_liked(db, user_id, note_id)),
+        ("note stats[20]",
+         lambda: db.query(NoteStats).filter(NoteStats.note_id.in_(page_ids)).all(),
+         lambda: statements.note_stats(db, page_ids)),
+    ]
+
+
+def _asgi_request(loop, app, method: str, path: str, query: str = "",
+                  headers: Optional[list] = None, body: Optional[dict] = None) -> Callable[[], None]:
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope_headers = [(b"host", b"bench")] + (headers or [])
+    if body is not None:
+        scope_headers += [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+
+    async def request() -> int:
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+            "root_path": "", "headers": scope_headers, "client": ("127.0.0.1", 50000),
+            "server": ("bench", 80),
+        }
+        status = 0
+
+        async def receive():
+            return {"type": "http.request", "body": payload, "more_body": False}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        await app(scope, receive, send)
+        return status
+
+    def call() -> None:
+        status = loop.run_until_complete(request())
+        if status != 200:
+            raise RuntimeError(f"{method} {path}?{query} returned {status}")
+    return call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000, help="Calls per round of each lookup")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per round of each route")
+    parser.add_argument("--rounds", type=int, default=5, help="Rounds of each; the best is kept")
+    parser.add_argument("--requests-only", action="store_true",
+                        help="Skip the lookups, e.g. to measure a checkout without the statements module")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_statements_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["STORAGE_TYPE"] = "local"
+    os.environ["JOB_QUEUE_ENABLED"] = "false"
+    os.environ["METRICS_ENABLED"] = "false"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from auth import create_access_token
+    from database import engine, Base, SessionLocal
+    from main import app
+    from models import Note, User
+    import seed
+
+    Base.metadata.create_all(bind=engine)
+    seed.seed(engine, files=50, **SEED_SIZE)
+    db = SessionLocal()
+    loop = asyncio.new_event_loop()
+    try:
+        note_id, author_id = db.query(Note.id, Note.author_id).order_by(Note.id).first()
+        user_email = db.query(User.email).filter(User.id == author_id).scalar()
+        page_ids = [row[0] for row in db.query(Note.id).order_by(Note.id.desc()).limit(20)]
+
+        if not args.requests_only:
+            print(f"CPU per lookup ({args.calls} calls x {args.rounds} rounds, best round):")
+            print(f"  {'lookup':<22} {'db.query':>10} {'prebuilt':>10} {'saved':>7}")
+            for name, old, new in _lookups(db, user_email, author_id, note_id, page_ids):
+                before = _cpu_per_call(old, args.calls, args.rounds)
+                after = _cpu_per_call(new, args.calls, args.rounds)
+                print(f"  {name:<22} {before * 1e6:>8.0f}us {after * 1e6:>8.0f}us {1 - after / before:>6.0%}",
+                      flush=True)
+            print()
+
+        token = create_access_token({"sub": user_email})
+        auth_header = [(b"authorization", f"Bearer {token}".encode())]
+        routes: Dict[str, Callable[[], None]] = {
+            "GET /api/auth/me": _asgi_request(loop, app, "GET", "/api/auth/me", headers=auth_header),
+            "GET /api/notes/global/{id}": _asgi_request(loop, app, "GET", f"/api/notes/global/{note_id}",
+                                                       headers=auth_header),
+            "GET /api/notes/global": _asgi_request(loop, app, "GET", "/api/notes/global", "page_size=20"),
+            "GET /api/notes/{id}/comments": _asgi_request(loop, app, "GET", f"/api/notes/{note_id}/comments",
+                                                         headers=auth_header),
+            "POST /api/notes/batch[20]": _asgi_request(loop, app, "POST", "/api/notes/batch",
+                                                      headers=auth_header, body={"note_ids": page_ids}),
+        }
+        print(f"CPU per request ({args.requests} requests x {args.rounds} rounds, best round):")
+        for name, call in routes.items():
+            print(f"  {name:<30} {_cpu_per_call(call, args.requests, args.rounds) * 1e6:>8.0f}us", flush=True)
+    finally:
+        loop.close()
+        db.close()
+        engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Benchmark a trending page: precomputed scores vs. aggregating at request time.
+
+The naive query sums the decayed weight of every like and comment per note
+and sorts the result; the precomputed path reads a page from the
+``note_trending`` score index, as ``/api/notes/trending`` does.
+
+Usage: python -m benchmarks.bench_trending [--notes 20000] [--likes 500000] [--comments 50000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+_NAIVE_SQL = """
+    SELECT n.id,
+           {upload_weight} * exp(-:rate * (julianday(:now) - julianday(n.created_at)) * 86400)
+           + COALESCE(l.score, 0) + COALESCE(c.score, 0) AS score
+    FROM notes n
+    LEFT JOIN (
+        SELECT note_id, SUM({like_weight} * exp(-:rate * (julianday(:now) - julianday(created_at)) * 86400)) AS score
+        FROM likes GROUP BY note_id
+    ) l ON l.note_id = n.id
+    LEFT JOIN (
+        SELECT note_id, SUM({comment_weight} * exp(-:rate * (julianday(:now) - julianday(created_at)) * 86400)) AS score
+        FROM comments GROUP BY note_id
+    ) c ON c.note_id = n.id
+    WHERE (:class_name IS NULL OR n.class_name = :class_name)
+    ORDER BY score DESC
+    LIMIT 20
+"""
+
+
+def _seed(engine, notes: int, likes: int, comments: int) -> None:
+    """Spread notes over 50 classes and events over the last 30 days."""
+    from datetime import datetime, timedelta
+    from models import User, Note, Like, Comment
+
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    users = max(1000, likes // 50)
+
+    def recent():
+        return now - timedelta(seconds=rng.uniform(0, 30 * 86400))
+
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": i, "email": f"user{i}@example.edu", "username": f"user{i}",
+             "hashed_password": "x", "created_at": now}
+            for i in range(1, users + 1)
+        ])
+        conn.execute(Note.__table__.insert(), [
+            {"id": i, "title": f"Note {i}", "class_name": f"CLASS {i % 50}", "file_path": f"{i}.txt",
+             "author_id": rng.randint(1, users), "created_at": recent()}
+            for i in range(1, notes + 1)
+        ])
+        pairs = set()
+        while len(pairs) < likes:
+            # Skewed towards low note ids so some notes are clearly popular
+            pairs.add((int(notes ** rng.random()), rng.randint(1, users)))
+        like_rows = [{"note_id": n, "user_id": u, "created_at": recent()} for n, u in pairs]
+        for start in range(0, len(like_rows), 50_000):
+            conn.execute(Like.__table__.insert(), like_rows[start:start + 50_000])
+        conn.execute(Comment.__table__.insert(), [
+            {"note_id": int(notes ** rng.random()), "user_id": rng.randint(1, users),
+             "content": "Thanks!", "created_at": recent()}
+            for _ in range(comments)
+        ])
+
+
+def _time(fn, repeat: int) -> float:
+    fn()  # Warm the page cache
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=20_000)
+    parser.add_argument("--likes", type=int, default=500_000)
+    parser.add_argument("--comments", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_trending_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    from datetime import datetime
+    from sqlalchemy import text
+    from database import engine, Base, SessionLocal
+    import models  # noqa: F401
+    import trending
+
+    Base.metadata.create_all(bind=engine)
+    _seed(engine, args.notes, args.likes, args.comments)
+    db = SessionLocal()
+    start = time.perf_counter()
+    trending.rebuild(db)
+    db.commit()
+    print(f"Seeded {args.notes} notes, {args.likes} likes, {args.comments} comments; "
+          f"rebuilt scores in {time.perf_counter() - start:.2f}s")
+
+    naive = text(_NAIVE_SQL.format(
+        upload_weight=trending.UPLOAD_WEIGHT,
+        like_weight=trending.LIKE_WEIGHT,
+        comment_weight=trending.COMMENT_WEIGHT,
+    ))
+    rate = trending._RATE
+    for class_name in (None, "CLASS 7"):
+        params = {"rate": rate, "now": datetime.utcnow().isoformat(" "), "class_name": class_name}
+        naive_ids = [row.id for row in db.execute(naive, params)]
+        indexed_ids = trending.trending_note_ids(db, 20, class_name=class_name)
+        naive_time = _time(lambda: db.execute(naive, params).all(), args.repeat)
+        indexed_time = _time(lambda: trending.trending_note_ids(db, 20, class_name=class_name), args.repeat)
+        scope = class_name or "global"
+        print(f"{scope:<8} naive aggregate: {naive_time * 1000:8.2f} ms   "
+              f"score index: {indexed_time * 1000:6.3f} ms   "
+              f"same top 20: {naive_ids == indexed_ids}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""Micro-benchmark suite for backend hot paths, with baselines and regression checks.
+
+Covers content filtering, password hashing and tokens, ``NoteResponse``
+construction and serialization (and the plain-row path the listings use),
+``LocalStorage`` writes and reads, and every feed route, called through the
+ASGI app against an in-memory SQLite database filled by seed.py.
+
+Each benchmark is calibrated to run for at least ``--min-time`` seconds per
+repeat; the median, minimum and spread of ``--repeat`` repeats are kept, per
+call.  ``run --output`` stores them as JSON with the Python version,
+platform and git commit.  ``compare`` checks a candidate (a stored file, or
+a fresh run) against a baseline and exits with status 1 if any benchmark's
+median and fastest repeat are both more than ``--threshold`` slower.
+Compare results from the same machine only; on a shared or busy one, raise
+``--repeat`` and ``--threshold`` until comparing two runs of the same commit
+comes out clean.
+
+Usage: python -m benchmarks.suite run [--output baseline.json] [--filter feed]
+       python -m benchmarks.suite compare baseline.json [candidate.json] [--threshold 0.1]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Seeded once per run; enough rows for feeds to page through and count
+SEED_SIZE = {"users": 500, "notes": 20_000, "likes": 100_000, "comments": 20_000}
+
+TITLE = "Lecture 12 notes: eigenvalues and diagonalization"
+DESCRIPTION = (
+    "Full notes from this week's lectures, including worked examples on finding eigenvalues, "
+    "diagonalizing symmetric matrices and applying the spectral theorem. I also added the "
+    "practice problems from recitation with step-by-step solutions and a short summary of "
+    "the definitions that showed up on last year's midterm. Let me know if anything is unclear!"
+)
+
+# name, path, query (``{class_name}`` is a busy class) and whether it needs a user
+FEED_ROUTES = [
+    ("feed.global[page 1]", "/api/notes/global", "page_size=20", False),
+    ("feed.global[page 50]", "/api/notes/global", "page=50&page_size=20", False),
+    ("feed.global[class]", "/api/notes/global", "class_name={class_name}", False),
+    ("feed.global[since]", "/api/notes/global", "since=19990", False),
+    ("feed.mine", "/api/notes", "page_size=20", True),
+    ("feed.trending", "/api/notes/trending", "page_size=20", False),
+    ("feed.recent", "/api/notes/recent", "limit=6", False),
+    ("feed.search", "/api/notes/search", "q=exam&page_size=20", False),
+]
+
+# name -> timer(loops) returning the seconds ``loops`` calls took
+Timer = Callable[[int], float]
+
+
+def _sync_timer(func: Callable[[], object]) -> Timer:
+    def timer(loops: int) -> float:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        return time.perf_counter() - start
+    return timer
+
+
+def _asgi_timer(loop, app, path: str, query: str = "", headers: Optional[list] = None) -> Timer:
+    scope_headers = [(b"host", b"bench")] + (headers or [])
+
+    async def request() -> int:
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+            "root_path": "", "headers": scope_headers, "client": ("127.0.0.1", 50000),
+            "server": ("bench", 80),
+        }
+        status = 0
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        await app(scope, receive, send)
+        return status
+
+    status = loop.run_until_complete(request())
+    if status != 200:
+        raise RuntimeError(f"GET {path}?{query} returned {status}")
+
+    async def run(loops: int) -> float:
+        start = time.perf_counter()
+        for _ in range(loops):
+            await request()
+        return time.perf_counter() - start
+
+    return lambda loops: loop.run_until_complete(run(loops))
+
+
+def _unit_benchmarks(workdir: str) -> Dict[str, Timer]:
+    from datetime import timedelta
+    from jose import jwt
+    from pydantic import TypeAdapter
+    import auth
+    from content_filter import validate_content
+    from models import Note, User
+    from note_fields import json_response, note_getters
+    from schemas import NoteResponse
+    from storage import LocalStorage
+
+    hashed = auth.get_password_hash("correct horse battery")
+    token = auth.create_access_token({"sub": "reader@example.edu"}, timedelta(minutes=30))
+    now = datetime.utcnow()
+    row = {
+        "id": 1, "title": TITLE, "class_name": "MATH 240", "description": DESCRIPTION,
+        "file_path": "/uploads/0001.pdf", "author_email": "reader@example.edu", "author_username": "reader",
+        "created_at": now, "like_count": 42, "is_liked": True, "comment_count": 7, "preview_count": 310,
+        "download_count": 55,
+    }
+    page_models = [NoteResponse(**dict(row, id=i)) for i in range(20)]
+    page_adapter = TypeAdapter(List[NoteResponse])
+    author = User(id=1, email="reader@example.edu", username="reader")
+    page_notes = [Note(id=i, title=TITLE, class_name="MATH 240", description=DESCRIPTION,
+                       file_path="/uploads/0001.pdf", author_id=1, author=author, created_at=now)
+                  for i in range(20)]
+    getters = note_getters(None, {
+        "like_count": lambda note_id: 42, "is_liked": lambda note_id: True, "comment_count": lambda note_id: 7,
+        "preview_count": lambda note_id: 310, "download_count": lambda note_id: 55,
+    })
+
+    storage = LocalStorage(os.path.join(workdir, "storage"))
+    content = os.urandom(64 * 1024)
+    saved = storage.save_file(content, "read.bin")
+
+    return {
+        "content_filter.validate_content[title]": _sync_timer(lambda: validate_content(TITLE, "title")),
+        "content_filter.validate_content[description]":
+            _sync_timer(lambda: validate_content(DESCRIPTION, "description")),
+        "auth.verify_password": _sync_timer(lambda: auth.verify_password("correct horse battery", hashed)),
+        "auth.create_access_token":
+            _sync_timer(lambda: auth.create_access_token({"sub": "reader@example.edu"}, timedelta(minutes=30))),
+        "auth.decode_token": _sync_timer(lambda: jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])),
+        "schemas.NoteResponse[construct]": _sync_timer(lambda: NoteResponse(**row)),
+        "schemas.NoteResponse[serialize 20]": _sync_timer(lambda: page_adapter.dump_json(page_models)),
+        "note_fields.rows[build+encode 20]": _sync_timer(
+            lambda: json_response([{name: get(note) for name, get in getters} for note in page_notes]).body),
+        "storage.LocalStorage.save_file[64KB]": _sync_timer(lambda: storage.save_file(content, "write.bin")),
+        "storage.LocalStorage.get_file[64KB]": _sync_timer(lambda: storage.get_file(saved)),
+    }
+
+
+def _feed_benchmarks(loop, names_filter: Optional[str]) -> Dict[str, Timer]:
+    from auth import create_access_token
+    from database import engine, SessionLocal
+    from main import app
+    from models import Note
+    import seed
+
+    routes = [route for route in FEED_ROUTES if not names_filter or names_filter in route[0]]
+    if not routes:
+        return {}
+    seed.seed(engine, files=50, **SEED_SIZE)
+    db = SessionLocal()
+    try:
+        author_id, class_name = db.query(Note.author_id, Note.class_name).filter(Note.id == 1).one()
+    finally:
+        db.close()
+    token = create_access_token({"sub": f"seed{author_id}@{seed.EMAIL_DOMAIN}"})
+    auth_header = [(b"authorization", f"Bearer {token}".encode())]
+    return {
+        name: _asgi_timer(loop, app, path, query.format(class_name=class_name),
+                          auth_header if authenticated else None)
+        for name, path, query, authenticated in routes
+    }
+
+
+def _measure(timer: Timer, repeat: int, min_time: float) -> dict:
+    """Per-call seconds over ``repeat`` repeats of enough loops to take ``min_time``.
+
+    As in timeit, the collector is off while timing, so earlier allocations
+    (other benchmarks, the seed) do not decide when a collection lands.
+    """
+    gc.collect()
+    gc.disable()
+    try:
+        return _measure_loops(timer, repeat, min_time)
+    finally:
+        gc.enable()
+
+
+def _measure_loops(timer: Timer, repeat: int, min_time: float) -> dict:
+    loops = 1
+    while True:
+        elapsed = timer(loops)
+        if elapsed >= min_time or loops >= 1 << 24:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed * 1.2) + 1))
+    samples = [timer(loops) / loops for _ in range(repeat)]
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def _format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names_filter: Optional[str], repeat: int, min_time: float) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    # One in-memory database shared by every thread's connection
+    os.environ["DATABASE_URL"] = "sqlite:///file:bench_suite?mode=memory&cache=shared&uri=true"
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["STORAGE_TYPE"] = "local"
+    os.environ["JOB_QUEUE_ENABLED"] = "false"
+    os.environ["METRICS_ENABLED"] = "false"
+    os.environ["COUNTER_WRITE_BEHIND"] = "true"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from database import engine, Base
+    import models  # noqa: F401
+
+    keep_alive = engine.connect()  # The shared in-memory database lives while a connection is open
+    Base.metadata.create_all(bind=engine)
+    loop = asyncio.new_event_loop()
+    try:
+        benchmarks = _unit_benchmarks(workdir)
+        benchmarks.update(_feed_benchmarks(loop, names_filter))
+        results = {}
+        for name, timer in benchmarks.items():
+            if names_filter and names_filter not in name:
+                continue
+            results[name] = _measure(timer, repeat, min_time)
+            print(f"  {name:<48} {_format_time(results[name]['median']):>10}  "
+                  f"(+-{results[name]['stdev'] / results[name]['median'] * 100:.1f}%)", flush=True)
+    finally:
+        loop.close()
+        keep_alive.close()
+    return {
+        "created": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "min_time": min_time,
+        "benchmarks": results,
+    }
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> Tuple[List[str], List[str]]:
+    """Print a comparison; returns the names that got slower and faster than ``threshold``."""
+    slower, faster = [], []
+    print(f"Baseline {baseline.get('commit') or '?'} ({baseline['created']}) vs "
+          f"candidate {candidate.get('commit') or '?'} ({candidate['created']}), threshold {threshold:.0%}:")
+    for name, new in candidate["benchmarks"].items():
+        old = baseline["benchmarks"].get(name)
+        if old is None:
+            print(f"  {name:<48} {'':>10} -> {_format_time(new['median']):>10}  (new)")
+            continue
+        ratio = new["median"] / old["median"]
+        # The best repeat must agree, so one noisy stretch is not a regression
+        if ratio > 1 + threshold and new["min"] / old["min"] > 1 + threshold:
+            verdict = "SLOWER"
+            slower.append(name)
+        elif ratio < 1 / (1 + threshold) and new["min"] / old["min"] < 1 / (1 + threshold):
+            verdict = "faster"
+            faster.append(name)
+        else:
+            verdict = ""
+        print(f"  {name:<48} {_format_time(old['median']):>10} -> {_format_time(new['median']):>10}  "
+              f"{ratio:5.2f}x {verdict}")
+    for name in baseline["benchmarks"].keys() - candidate["benchmarks"].keys():
+        print(f"  {name:<48} not in the candidate")
+    return slower, faster
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    for command in ("run", "compare"):
+        sub = commands.add_parser(command)
+        if command == "run":
+            sub.add_argument("--output", help="Save the results as JSON here")
+        else:
+            sub.add_argument("baseline", help="Results saved by run --output")
+            sub.add_argument("candidate", nargs="?", help="Results to check (default: run the suite now)")
+            sub.add_argument("--threshold", type=float, default=0.10,
+                             help="Slowdown of the median that counts as a regression (0.10 = 10%%)")
+        sub.add_argument("--filter", help="Only benchmarks whose name contains this")
+        sub.add_argument("--repeat", type=int, default=7)
+        sub.add_argument("--min-time", type=float, default=0.2, help="Seconds per repeat, at least")
+    args = parser.parse_args()
+
+    if args.command == "run" or args.candidate is None:
+        print("Running benchmarks (per call, median of repeats):")
+        results = run(args.filter, args.repeat, args.min_time)
+        if args.command == "run":
+            if args.output:
+                with open(args.output, "w") as f:
+                    json.dump(results, f, indent=2, sort_keys=True)
+                print(f"Saved {len(results['benchmarks'])} results to {args.output}")
+            return
+        candidate = results
+    else:
+        with open(args.candidate) as f:
+            candidate = json.load(f)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.filter:
+        candidate["benchmarks"] = {name: result for name, result in candidate["benchmarks"].items()
+                                   if args.filter in name}
+        baseline["benchmarks"] = {name: result for name, result in baseline["benchmarks"].items()
+                                  if args.filter in name}
+
+    slower, faster = compare(baseline, candidate, args.threshold)
+    print(f"{len(slower)} slower, {len(faster)} faster, "
+          f"{len(candidate['benchmarks']) - len(slower) - len(faster)} unchanged")
+    sys.exit(1 if slower else 0)
+
+
+if __name__ == "__main__":
+    main()
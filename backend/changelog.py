@@ -0,0 +1,229 @@
+"""Change log behind the delta feeds (``?since=<version>``).
+
+Every write that changes what a feed shows (uploading or deleting a note,
+liking, commenting) appends a row to ``note_changes`` in the same
+transaction.  A client that has a feed as of version ``v`` asks for the
+notes with entries after ``v`` and gets their current state, or their ids
+if they are gone, so the cost of a refresh is proportional to what changed
+rather than to the page.
+
+Versions must become visible in order, or a client could read version 12
+before 11 commits and never see 11.  On SQLite, which serializes writers,
+the row's autoincrement ``version`` is the feed version.  On Postgres
+writers run concurrently, so the feed version is a transaction id instead:
+each entry stores its writer's ``pg_current_xact_id()`` in ``txid``, and the
+current version is the snapshot's ``xmin``, below which every transaction
+has finished.  A client at version ``v`` has seen every entry with
+``txid < v``, and anything that commits later has a ``txid`` of at least
+the ``xmin`` it is read under, so nothing is skipped and no writer waits on
+another (Postgres 13+).
+
+Compaction keeps the log small: a note's older entries are dropped once a
+newer one exists (a delta only needs the latest), and deletions older than
+``FEED_TOMBSTONE_RETENTION_DAYS`` are purged.  The newest purged entry is
+kept as a ``compacted`` marker; clients behind it are told to reload.
+
+Run ``python changelog.py --compact`` to compact by hand.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, delete, exists, func, literal, literal_column, or_, select, text, tuple_, update
+from sqlalchemy.orm import Session
+
+try:
+    from config import FEED_DELTA_MAX_CHANGES, FEED_TOMBSTONE_RETENTION_DAYS, FEED_COMPACT_INTERVAL
+except ImportError:
+    FEED_DELTA_MAX_CHANGES = 500
+    FEED_TOMBSTONE_RETENTION_DAYS = 7.0
+    FEED_COMPACT_INTERVAL = 3600.0
+
+logger = logging.getLogger(__name__)
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+COMPACTED = "compacted"
+
+_POSTGRES_TXID = "pg_current_xact_id()::text::bigint"
+_POSTGRES_XMIN = "pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+
+_schedule_lock = threading.Lock()
+_last_scheduled = float("-inf")
+
+
+def _postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def ensure_txid_column(engine) -> None:
+    """Add ``note_changes.txid`` to databases created before it existed."""
+    from sqlalchemy import inspect
+
+    if "txid" in {column["name"] for column in inspect(engine).get_columns("note_changes")}:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE note_changes ADD COLUMN txid BIGINT"))
+        if engine.dialect.name == "postgresql":
+            # Older entries then count as written now: clients behind them get
+            # them all again, or are told to reload if their version is ahead
+            conn.execute(text(f"UPDATE note_changes SET txid = {_POSTGRES_TXID}"))
+
+
+def record(db: Session, note_id: int, kind: str) -> None:
+    """Append a change to a note (caller commits).  Delete entries are recorded before the delete."""
+    from models import Note, NoteChange
+
+    columns = ["note_id", "author_id", "class_name", "kind", "changed_at"]
+    values = [Note.id, Note.author_id, Note.class_name, literal(kind), literal(datetime.utcnow())]
+    if _postgres(db):
+        columns.append("txid")
+        values.append(literal_column(_POSTGRES_TXID))
+    db.execute(
+        NoteChange.__table__.insert().from_select(columns, select(*values).where(Note.id == note_id))
+    )
+
+
+def current_version(db: Session) -> int:
+    """Latest feed version; a full feed read after this is at least this current."""
+    from models import NoteChange
+
+    if _postgres(db):
+        return db.execute(text(f"SELECT {_POSTGRES_XMIN}")).scalar()
+    return db.execute(select(func.max(NoteChange.version))).scalar() or 0
+
+
+def _horizon(db: Session) -> int:
+    """Oldest version with complete deltas: the one after the newest purged entry's."""
+    from models import NoteChange
+
+    if _postgres(db):
+        newest = db.execute(select(func.max(NoteChange.txid)).where(NoteChange.note_id.is_(None))).scalar()
+        return newest + 1 if newest is not None else 0
+    return db.execute(
+        select(func.max(NoteChange.version)).where(NoteChange.note_id.is_(None))
+    ).scalar() or 0
+
+
+def changes_since(
+    db: Session,
+    since: int,
+    author_id: Optional[int] = None,
+    class_name: Optional[str] = None,
+    limit: int = FEED_DELTA_MAX_CHANGES,
+) -> Tuple[int, Optional[List[int]]]:
+    """
+    Ids of notes changed after version ``since``, optionally for one author or class.
+
+    Returns ``(version, note_ids)``; ``note_ids`` is ``None`` when the client
+    should reload instead: ``since`` is from before the compaction horizon or
+    after the current version (another database), or more than ``limit``
+    notes changed.
+    """
+    from models import NoteChange
+
+    version = current_version(db)
+    if since > version or since < _horizon(db):
+        return version, None
+    if since == version:
+        return version, []
+
+    if _postgres(db):
+        unseen = [NoteChange.txid >= since, NoteChange.txid < version]
+    else:
+        unseen = [NoteChange.version > since, NoteChange.version <= version]
+    query = select(NoteChange.note_id).where(*unseen, NoteChange.note_id.is_not(None))
+    if author_id is not None:
+        query = query.where(NoteChange.author_id == author_id)
+    if class_name:
+        query = query.where(NoteChange.class_name == class_name)
+    note_ids = db.execute(query.distinct().limit(limit + 1)).scalars().all()
+    if len(note_ids) > limit:
+        return version, None
+    return version, note_ids
+
+
+def compact(db: Session) -> Tuple[int, int]:
+    """
+    Drop superseded entries and purge old deletions (caller commits).
+
+    Returns ``(superseded, purged)`` row counts.
+    """
+    from models import NoteChange
+
+    changes = NoteChange.__table__
+    newer = changes.alias("newer")
+    # Entries are ordered by what the feed version counts: txid on Postgres
+    order = "txid" if _postgres(db) else "version"
+    superseded = db.execute(
+        delete(changes).where(
+            changes.c.note_id.is_not(None),
+            exists().where(
+                newer.c.note_id == changes.c.note_id,
+                tuple_(newer.c[order], newer.c.version) > tuple_(changes.c[order], changes.c.version),
+            ),
+        )
+    ).rowcount
+
+    cutoff = datetime.utcnow() - timedelta(days=FEED_TOMBSTONE_RETENTION_DAYS)
+    expired = and_(changes.c.kind == DELETED, changes.c.changed_at < cutoff)
+    purgeable = or_(expired, changes.c.kind == COMPACTED)
+    marker = db.execute(
+        select(changes.c.version).where(purgeable)
+        .order_by(changes.c[order].desc(), changes.c.version.desc()).limit(1)
+    ).scalar()
+    purged = 0
+    if marker is not None:
+        purged = db.execute(
+            delete(changes).where(changes.c.version != marker, purgeable)
+        ).rowcount
+        db.execute(
+            update(changes).where(changes.c.version == marker).values(
+                note_id=None, author_id=None, class_name=None, kind=COMPACTED
+            )
+        )
+    logger.info("Compacted note change log: %d superseded, %d expired deletions", superseded, purged)
+    return superseded, purged
+
+
+def schedule_compaction() -> None:
+    """Queue a compaction at most once per ``FEED_COMPACT_INTERVAL`` from this process."""
+    global _last_scheduled
+    from jobs import enqueue_now
+
+    now = time.monotonic()
+    with _schedule_lock:
+        if now - _last_scheduled < FEED_COMPACT_INTERVAL:
+            return
+        _last_scheduled = now
+    try:
+        enqueue_now("compact_changes", delay=FEED_COMPACT_INTERVAL)
+    except Exception as e:
+        # The next change will schedule it; the log just grows meanwhile
+        with _schedule_lock:
+            _last_scheduled = float("-inf")
+        logger.warning("Could not schedule change log compaction: %s", e)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Note change log maintenance")
+    parser.add_argument("--compact", action="store_true", help="Compact the change log now")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.compact:
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            superseded, purged = compact(db)
+            db.commit()
+        finally:
+            db.close()
+        print(f"Removed {superseded} superseded and {purged} expired change log entries")
+    else:
+        parser.print_help()
@@ -66,11 +66,111 @@ PORT = int(os.getenv("PORT", "8000"))
 DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
 DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
 DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "true").lower() in ("1", "true", "yes")  # Postgres; false behind PgBouncer (transaction mode)
+
+# Tuned SQLite mode (file databases only): WAL, pooled read-only connections and one writer
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "false").lower() in ("1", "true", "yes")
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))  # Read-only connections per process
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # Wait for other processes' locks
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # Page cache per connection
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # Bytes of the file read via mmap
+SQLITE_WAL_AUTOCHECKPOINT = int(os.getenv("SQLITE_WAL_AUTOCHECKPOINT", "1000"))  # WAL pages between checkpoints
+
+# Read replicas for the read-only feed and detail endpoints (comma-separated URLs)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))  # Replicas further behind are skipped
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))  # Seconds between health/lag checks
+
+# Counter write-behind buffer (likes, previews, downloads); off writes every
+# change synchronously, a commit per like, preview and download.  On by
+# default: each buffer journals to its own locked file (counters.py), so a
+# crashed worker's deltas are replayed exactly once by a live one
+COUNTER_WRITE_BEHIND = os.getenv("COUNTER_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+COUNTER_FLUSH_INTERVAL = float(os.getenv("COUNTER_FLUSH_INTERVAL", "5"))  # Seconds between flushes
+COUNTER_FLUSH_THRESHOLD = int(os.getenv("COUNTER_FLUSH_THRESHOLD", "1000"))  # Flush early after N events
+COUNTER_JOURNAL_DIR = os.getenv("COUNTER_JOURNAL_DIR", "counter_journal")
+
+# Background job queue
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "true").lower() in ("1", "true", "yes")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # Async workers per process
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))  # First idle poll; doubles while idle
+JOB_IDLE_MAX_INTERVAL = float(os.getenv("JOB_IDLE_MAX_INTERVAL", "30"))  # Longest idle sleep
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))  # Attempts before dead-lettering
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "2"))  # Backoff doubles from here
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "600"))
+JOB_VISIBILITY_TIMEOUT = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))  # Reclaim jobs running longer
+
+# Thumbnails
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "320"))  # Longest edge in pixels
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))  # Render processes
+THUMBNAIL_TIMEOUT = float(os.getenv("THUMBNAIL_TIMEOUT", "30"))  # Seconds per render; slower ones are killed
+THUMBNAIL_MAX_PIXELS = int(os.getenv("THUMBNAIL_MAX_PIXELS", "50000000"))  # Larger images get no thumbnail
+THUMBNAIL_CACHE_MAX_AGE = int(os.getenv("THUMBNAIL_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+
+# Text extraction for content search
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "2"))  # Concurrent extraction processes
+EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", "60"))  # Seconds per file
+EXTRACTION_MAX_CHARS = int(os.getenv("EXTRACTION_MAX_CHARS", "500000"))  # Text kept per note
+
+# Near-duplicate detection
+SIMILARITY_MIN_SCORE = float(os.getenv("SIMILARITY_MIN_SCORE", "0.5"))  # Lowest score listed as similar
+SIMILARITY_DUPLICATE_SCORE = float(os.getenv("SIMILARITY_DUPLICATE_SCORE", "0.85"))  # Marks duplicate_of
+SIMILARITY_MAX_CANDIDATES = int(os.getenv("SIMILARITY_MAX_CANDIDATES", "2000"))  # LSH candidates re-scored
+
+# Related notes (co-like recommendations)
+RELATED_TOP_K = int(os.getenv("RELATED_TOP_K", "20"))  # Neighbours stored per note
+RELATED_REFRESH_INTERVAL = float(os.getenv("RELATED_REFRESH_INTERVAL", "60"))  # Seconds between refreshes
+
+# Trending feed
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))  # Rebuild scores after changing
+
+# Per-user liked-set cache
+LIKED_CACHE_USERS = int(os.getenv("LIKED_CACHE_USERS", "10000"))  # Users kept in memory
+LIKED_CACHE_TTL = float(os.getenv("LIKED_CACHE_TTL", "300"))  # Seconds before a set is reloaded
+
+# Delta feeds (?since=<version>)
+FEED_DELTA_MAX_CHANGES = int(os.getenv("FEED_DELTA_MAX_CHANGES", "500"))  # More changed notes -> client reloads
+FEED_TOMBSTONE_RETENTION_DAYS = float(os.getenv("FEED_TOMBSTONE_RETENTION_DAYS", "7"))  # Deletes kept in the log
+FEED_COMPACT_INTERVAL = float(os.getenv("FEED_COMPACT_INTERVAL", "3600"))  # Seconds between compactions
+
+# Live updates (Server-Sent Events)
+LIVE_BROKER = os.getenv("LIVE_BROKER", "local").lower()  # "local", or "postgres" to fan out across processes
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "64"))  # Events buffered per subscriber before dropping it
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", "20000"))  # Open streams per process
+LIVE_HEARTBEAT_INTERVAL = float(os.getenv("LIVE_HEARTBEAT_INTERVAL", "25"))  # Seconds between keep-alives
+
+# Metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")  # Serve /metrics (Prometheus)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # Bearer token for scrapers; unset = admins only
+
+# SQL instrumentation
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))  # Log statements slower than this; 0 disables
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")  # Postgres only
+DB_STATS_HEADER = os.getenv("DB_STATS_HEADER", "false").lower() in ("1", "true", "yes")  # Dev: X-DB-* headers
+
+# Tracing (Server-Timing headers and OTLP/JSON export)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))  # Fraction of requests traced; 0 = only traceparent
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "").lower()  # "", "file" or "otlp"
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "traces.jsonl")
+TRACE_EXPORT_URL = os.getenv("TRACE_EXPORT_URL", "http://localhost:4318/v1/traces")  # OTLP/HTTP collector
+
+# Profiling (admin-only /api/admin/profile and /api/admin/memory endpoints)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+ADMIN_EMAILS = set(
+    email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()
+)  # Accounts allowed to use admin endpoints
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))  # Longest CPU profile a request may ask for
 
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # "json" (one object per line) or "text"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # Records waiting for the writer thread before dropping
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")  # "route=rate,...": keep that fraction of a route's INFO/DEBUG records
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "20"))  # Warnings per call site per window; 0 disables
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "60"))  # Seconds
 
 # Pagination
 DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "20"))
 MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))
+COMMENTS_PAGE_SIZE = int(os.getenv("COMMENTS_PAGE_SIZE", "20"))  # First page embedded in note details
 
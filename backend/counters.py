@@ -0,0 +1,459 @@
+"""Per-note counters with an optional write-behind buffer.
+
+Like, preview and download counts live in the ``note_stats`` table.  With
+``COUNTER_WRITE_BEHIND`` on (the default), deltas accumulate in memory and
+are flushed in batched multi-row upserts on an interval or once enough
+events have been buffered, so previews and downloads do not commit on the
+request path and a viral note no longer funnels every like and view through
+its own commit.  With it off, every counter change is written synchronously.
+
+A like's other per-note writes go the same way: the note's trending score
+(``note_trending``) and its related-notes dirty flag (``related_dirty``)
+are buffered next to ``like_count`` and written by the same flush, so a
+toggle commits its own ``likes`` row and its change-log entry, and no
+longer updates the note's shared rows.  Scores are merged in log space
+(``trending.logaddexp``), not summed.
+
+Buffered deltas are appended to a small per-buffer journal before they are
+applied in memory, and the journal is rewritten with whatever is still
+pending after each successful flush.  Each buffer holds an ``flock`` on its
+journal's ``.lock`` file while it runs; journals whose lock is free were
+left behind by a crashed worker, and are claimed and replayed by any live
+worker.  Where ``fcntl`` is missing (Windows), a journal is taken for dead
+once its mtime, refreshed on every flush attempt, goes stale.
+Delivery is at-least-once: a crash between a database commit and the journal
+rewrite can replay that batch.
+"""
+import glob
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import trending
+
+try:
+    from config import (
+        COUNTER_WRITE_BEHIND,
+        COUNTER_FLUSH_INTERVAL,
+        COUNTER_FLUSH_THRESHOLD,
+        COUNTER_JOURNAL_DIR,
+    )
+except ImportError:
+    COUNTER_WRITE_BEHIND = True
+    COUNTER_FLUSH_INTERVAL = 5.0
+    COUNTER_FLUSH_THRESHOLD = 1000
+    COUNTER_JOURNAL_DIR = "counter_journal"
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ("like_count", "preview_count", "download_count")
+# Deferred with like_count: the number of like changes, and the log-space
+# scores (trending.event_score) of likes to add to and remove from trending
+RELATED_DIRTY = "related_dirty"
+TRENDING_ADD = "trending_add"
+TRENDING_RETRACT = "trending_retract"
+_SCORE_FIELDS = (TRENDING_ADD, TRENDING_RETRACT)
+DELTA_FIELDS = COUNTER_FIELDS + (RELATED_DIRTY,) + _SCORE_FIELDS
+
+# Rows per multi-row upsert; keeps SQLite well under its bound-parameter limit
+_UPSERT_CHUNK_SIZE = 500
+
+Deltas = Dict[int, Dict[str, float]]
+
+
+def _merge(target: Deltas, note_id: int, field: str, delta: float) -> None:
+    """Add a single counter delta into a delta map."""
+    bucket = target.setdefault(note_id, {})
+    if field in _SCORE_FIELDS and field in bucket:
+        bucket[field] = trending.logaddexp(bucket[field], delta)
+    else:
+        bucket[field] = bucket.get(field, 0) + delta
+
+
+def apply_counter_deltas(db: Session, deltas: Deltas) -> int:
+    """
+    Apply counter deltas with batched multi-row upserts (caller commits).
+
+    Trending scores and related-notes flags in ``deltas`` are written too,
+    additions before retractions.  Deltas for notes that no longer exist are
+    dropped.  Returns the number of ``note_stats`` rows written.
+    """
+    import related
+    from models import Note, NoteStats
+
+    if not deltas:
+        return 0
+
+    existing_ids = set(db.execute(
+        select(Note.id).where(Note.id.in_(list(deltas)))
+    ).scalars())
+    deltas = {note_id: fields for note_id, fields in deltas.items() if note_id in existing_ids}
+    related.mark_dirty(db, [note_id for note_id, fields in deltas.items() if fields.get(RELATED_DIRTY)])
+    for field, apply_scores in ((TRENDING_ADD, trending.add_scores), (TRENDING_RETRACT, trending.retract_scores)):
+        apply_scores(db, {note_id: fields[field] for note_id, fields in deltas.items() if field in fields})
+
+    rows = [
+        {"note_id": note_id, **{field: fields.get(field, 0) for field in COUNTER_FIELDS}}
+        for note_id, fields in deltas.items()
+        if any(field in fields for field in COUNTER_FIELDS)
+    ]
+    if not rows:
+        return 0
+
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    for start in range(0, len(rows), _UPSERT_CHUNK_SIZE):
+        stmt = insert(NoteStats).values(rows[start:start + _UPSERT_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[NoteStats.note_id],
+            set_={
+                field: getattr(NoteStats, field) + getattr(stmt.excluded, field)
+                for field in COUNTER_FIELDS
+            }
+        )
+        db.execute(stmt)
+    return len(rows)
+
+
+def get_note_stats(
+    db: Session, note_ids: Iterable[int], include_pending: bool = False
+) -> Dict[int, Dict[str, int]]:
+    """
+    Get the counters for a set of notes in one query.
+
+    With ``include_pending``, deltas still in this worker's write-behind
+    buffer are added, so a client sees its own recent changes.
+    """
+    from statements import note_stats
+
+    note_ids = list(note_ids)
+    if not note_ids:
+        return {}
+    stats = note_stats(db, note_ids)
+    result = {
+        row.note_id: {field: getattr(row, field) for field in COUNTER_FIELDS}
+        for row in stats
+    }
+    if include_pending and counter_buffer is not None:
+        for note_id in note_ids:
+            for field, delta in counter_buffer.pending(note_id).items():
+                if field not in COUNTER_FIELDS:
+                    continue
+                counts = result.setdefault(note_id, dict.fromkeys(COUNTER_FIELDS, 0))
+                counts[field] = max(0, counts[field] + delta)
+    return result
+
+
+def backfill_like_counts(db: Session) -> None:
+    """Seed ``note_stats.like_count`` from the ``likes`` table (caller commits)."""
+    from models import Like, NoteStats
+    from sqlalchemy import func, insert, literal
+
+    db.execute(
+        insert(NoteStats).from_select(
+            ["note_id", "like_count", "preview_count", "download_count"],
+            select(Like.note_id, func.count(Like.id), literal(0), literal(0))
+            .group_by(Like.note_id)
+        )
+    )
+
+
+def _lock_path(journal_path: str) -> str:
+    """The ``.lock`` file of a journal, or of a journal that has since been claimed."""
+    directory, name = os.path.split(journal_path)
+    return os.path.join(directory, name.split(".log", 1)[0] + ".lock")
+
+
+class CounterJournal:
+    """Append-only journal of one buffer's counter deltas."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # Unique per buffer: a restarted worker often gets its predecessor's
+        # pid (pid 1 in a container) and must not reopen its journal
+        name = f"counters-{os.getpid()}-{uuid.uuid4().hex[:12]}"
+        self.path = os.path.join(directory, f"{name}.log")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        self._lock_file = None
+        if fcntl is not None:
+            # Held until close, or released by the OS when the process dies
+            self._lock_file = open(self.lock_path, "a")
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._claimed = []
+
+    def append(self, note_id: int, field: str, delta: int) -> None:
+        """Record a delta; flushed to the OS so it survives a process crash."""
+        self._file.write(f"{note_id} {field} {delta}\n")
+        self._file.flush()
+
+    def rewrite(self, pending: Deltas) -> None:
+        """Atomically replace the journal with the still-pending deltas."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for note_id, fields in pending.items():
+                for field, delta in fields.items():
+                    f.write(f"{note_id} {field} {delta}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def touch(self) -> None:
+        """Refresh the journal's mtime so other workers know it is alive."""
+        os.utime(self.path)
+
+    @staticmethod
+    def _owner_alive(path: str, max_age: float) -> bool:
+        lock_path = _lock_path(path)
+        if fcntl is not None and os.path.exists(lock_path):
+            with open(lock_path, "a") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return True
+            return False
+        # Journals without a lock: Windows, a claim in progress or older versions
+        return time.time() - os.path.getmtime(path) < max_age
+
+    def claim_stale(self, max_age: float) -> Deltas:
+        """
+        Claim journals from dead workers and return their deltas.
+
+        A journal's owner is dead when nothing holds its lock file, or, for
+        journals without one, when it has not been touched for ``max_age``
+        seconds.  Claiming renames the file first so only one worker replays
+        it; the claimed file is removed by ``release_claimed``.
+        """
+        deltas: Deltas = {}
+        pattern = os.path.join(self.directory, "counters-*.log*")
+        for path in glob.glob(pattern):
+            if path == self.path or path.endswith(".tmp"):
+                continue
+            try:
+                if self._owner_alive(path, max_age):
+                    continue
+                claimed_path = f"{path}.claimed-{os.getpid()}"
+                os.rename(path, claimed_path)
+                os.utime(claimed_path)  # Fresh while this worker replays it
+            except OSError:
+                continue  # Another worker got there first
+            try:
+                os.remove(_lock_path(path))
+            except OSError:
+                pass
+            for note_id, field, delta in self.read(claimed_path):
+                _merge(deltas, note_id, field, delta)
+            self._claimed.append(claimed_path)
+        return deltas
+
+    def release_claimed(self) -> None:
+        """Delete claimed journals once their deltas are in our own journal."""
+        while self._claimed:
+            path = self._claimed.pop()
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning("Could not remove claimed counter journal %s: %s", path, e)
+
+    @staticmethod
+    def read(path: str):
+        """Yield ``(note_id, field, delta)`` entries, skipping torn lines."""
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) != 3 or parts[1] not in DELTA_FIELDS:
+                    continue
+                try:
+                    value = float(parts[2]) if parts[1] in _SCORE_FIELDS else int(parts[2])
+                    yield int(parts[0]), parts[1], value
+                except ValueError:
+                    continue
+
+    def close(self, remove: bool = False) -> None:
+        """Close the journal, removing it if nothing is pending."""
+        self._file.close()
+        if remove:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        if self._lock_file is not None:
+            # Leftover deltas are then claimed by the next worker to look
+            try:
+                os.remove(self.lock_path)
+            except OSError:
+                pass
+            self._lock_file.close()
+
+
+class CounterBuffer:
+    """In-memory counter deltas flushed to the database by a background thread."""
+
+    def __init__(
+        self,
+        session_factory,
+        journal_dir: str = COUNTER_JOURNAL_DIR,
+        flush_interval: float = COUNTER_FLUSH_INTERVAL,
+        flush_threshold: int = COUNTER_FLUSH_THRESHOLD,
+    ):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        # Journals untouched for several intervals belong to dead workers
+        self.stale_after = max(60.0, flush_interval * 6)
+        self._journal = CounterJournal(journal_dir)
+        self._pending: Deltas = {}
+        self._events = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, note_id: int, field: str, delta: float = 1) -> None:
+        """Buffer a counter delta (journaled before it is applied in memory)."""
+        with self._lock:
+            self._journal.append(note_id, field, delta)
+            _merge(self._pending, note_id, field, delta)
+            self._events += 1
+            if self._events >= self.flush_threshold:
+                self._wake.set()
+
+    def pending(self, note_id: int) -> Dict[str, int]:
+        """Deltas for a note that this worker has not flushed yet."""
+        with self._lock:
+            return dict(self._pending.get(note_id, {}))
+
+    def _recover(self) -> None:
+        """Move deltas from stale journals into this worker's buffer."""
+        with self._lock:
+            recovered = self._journal.claim_stale(self.stale_after)
+            for note_id, fields in recovered.items():
+                for field, delta in fields.items():
+                    self._journal.append(note_id, field, delta)
+                    _merge(self._pending, note_id, field, delta)
+            self._journal.release_claimed()
+        if recovered:
+            logger.info("Recovered counter deltas for %d notes from stale journals", len(recovered))
+
+    def flush(self) -> int:
+        """Write all pending deltas to the database. Returns note rows written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._events = 0
+            written = 0
+            if batch:
+                db = self.session_factory()
+                try:
+                    written = apply_counter_deltas(db, batch)
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    logger.error("Counter flush failed, will retry: %s", e)
+                    with self._lock:
+                        for note_id, fields in batch.items():
+                            for field, delta in fields.items():
+                                _merge(self._pending, note_id, field, delta)
+                        # Still alive: through a long outage the journal must
+                        # not look abandoned where liveness goes by mtime
+                        self._journal.touch()
+                    return 0
+                finally:
+                    db.close()
+            with self._lock:
+                if batch:
+                    self._journal.rewrite(self._pending)
+                else:
+                    self._journal.touch()
+            if any(fields.get(RELATED_DIRTY) for fields in batch.values()):
+                # Only now are the notes flagged for the refresh to find
+                import related
+                related.schedule_refresh()
+            return written
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self._recover()
+                self.flush()
+            except Exception as e:
+                logger.error("Counter flusher error: %s", e, exc_info=True)
+
+    def start(self) -> None:
+        """Replay stale journals and start the background flusher."""
+        self._recover()
+        self._thread = threading.Thread(target=self._run, name="counter-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flusher and write out everything still buffered."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        with self._lock:
+            self._journal.close(remove=not self._pending)
+
+
+# Global buffer, only created when write-behind mode is enabled
+counter_buffer: Optional[CounterBuffer] = None
+
+
+def start_counter_buffer() -> Optional[CounterBuffer]:
+    """Start the write-behind buffer if ``COUNTER_WRITE_BEHIND`` is set."""
+    global counter_buffer
+    if COUNTER_WRITE_BEHIND and counter_buffer is None:
+        from database import SessionLocal
+        counter_buffer = CounterBuffer(SessionLocal)
+        counter_buffer.start()
+        logger.info("Counter write-behind enabled (flush every %ss or %d events)",
+                    COUNTER_FLUSH_INTERVAL, COUNTER_FLUSH_THRESHOLD)
+    return counter_buffer
+
+
+def stop_counter_buffer() -> None:
+    """Flush and stop the write-behind buffer."""
+    global counter_buffer
+    if counter_buffer is not None:
+        counter_buffer.stop()
+        counter_buffer = None
+
+
+def record(db: Session, note_id: int, field: str, delta: int = 1) -> None:
+    """
+    Record a counter change for a note.
+
+    Call this after the change it counts has been committed.  With
+    write-behind enabled the delta is buffered; otherwise it is upserted and
+    committed immediately.  Counter failures never fail the request.
+    """
+    if counter_buffer is not None:
+        counter_buffer.add(note_id, field, delta)
+        return
+    try:
+        apply_counter_deltas(db, {note_id: {field: delta}})
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning("Could not update %s for note %s: %s", field, note_id, e)
@@ -1,7 +1,13 @@
 """Database configuration and session management."""
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.expression import TextClause, UpdateBase
 
 # Import config for pool settings
 try:
@@ -12,6 +18,36 @@ except ImportError:
     DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
     DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
 
+try:
+    from config import (
+        SQLITE_TUNED, SQLITE_READ_POOL_SIZE, SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE_KB,
+        SQLITE_MMAP_SIZE, SQLITE_WAL_AUTOCHECKPOINT
+    )
+except ImportError:
+    SQLITE_TUNED = False
+    SQLITE_READ_POOL_SIZE = 4
+    SQLITE_BUSY_TIMEOUT_MS = 5000
+    SQLITE_CACHE_SIZE_KB = 65536
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+    SQLITE_WAL_AUTOCHECKPOINT = 1000
+
+try:
+    from config import DATABASE_REPLICA_URLS
+except ImportError:
+    DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+try:
+    from config import SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN
+except ImportError:
+    SLOW_QUERY_MS = 200.0
+    SLOW_QUERY_EXPLAIN = True
+
+from replicas import ReplicaSet
+from statements import DB_PREPARED_STATEMENTS, install_prepared_statements
+from tracing import KIND_CLIENT, end_span, start_span
+
+logger = logging.getLogger(__name__)
+
 # Database setup
 # Railway provides DATABASE_URL, but also check DATABASE_PUBLIC_URL as fallback
 SQLALCHEMY_DATABASE_URL = os.getenv(
@@ -19,8 +55,44 @@ SQLALCHEMY_DATABASE_URL = os.getenv(
     os.getenv("DATABASE_PUBLIC_URL", "sqlite:///./pennwest_connect.db")
 )
 
+_sqlite_in_memory = ":memory:" in SQLALCHEMY_DATABASE_URL or "mode=memory" in SQLALCHEMY_DATABASE_URL
+if SQLITE_TUNED and "sqlite" in SQLALCHEMY_DATABASE_URL and _sqlite_in_memory:
+    logger.warning("SQLITE_TUNED needs a database file; using the default SQLite settings for an in-memory one")
+
+def _driver_connect_args(url: str) -> dict:
+    # psycopg 3 prepares statements it has run a few times on its own;
+    # psycopg2 ones are prepared by statements.install_prepared_statements
+    if url.startswith("postgresql+psycopg:") and not DB_PREPARED_STATEMENTS:
+        return {"prepare_threshold": None}
+    return {}
+
+# Read-only connections in tuned SQLite mode (see RoutingSession); None otherwise
+read_engine = None
+
 # Create database engine with appropriate settings
-if "sqlite" in SQLALCHEMY_DATABASE_URL:
+if "sqlite" in SQLALCHEMY_DATABASE_URL and SQLITE_TUNED and not _sqlite_in_memory:
+    # Tuned SQLite: WAL lets readers run alongside the one writer.  The writer
+    # pool has a single connection, so this process's writes queue for it
+    # instead of failing on the database lock; readers have their own pool.
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True
+    )
+    read_engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=SQLITE_READ_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True
+    )
+elif "sqlite" in SQLALCHEMY_DATABASE_URL:
     # SQLite configuration for development
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
@@ -31,6 +103,7 @@ else:
     # PostgreSQL or other production database with configurable pool
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
+        connect_args=_driver_connect_args(SQLALCHEMY_DATABASE_URL),
         pool_pre_ping=True,  # Verify connections before using
         pool_size=DB_POOL_SIZE,
         max_overflow=DB_MAX_OVERFLOW,
@@ -39,12 +112,274 @@ else:
         echo=False  # Set to True for SQL query logging
     )
 
+# SQLite only enforces foreign keys (and ON DELETE CASCADE) when asked to,
+# per connection
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+        
+        # Trending score upserts call these (Postgres uses built-in math)
+        from trending import register_sqlite_functions
+        register_sqlite_functions(dbapi_connection)
+
+def _apply_tuned_pragmas(dbapi_connection) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    # In WAL mode NORMAL skips the fsync per commit; checkpoints sync the batch
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+if read_engine is not None:
+    @event.listens_for(engine, "connect")
+    def _tune_sqlite_writer(dbapi_connection, connection_record):
+        _apply_tuned_pragmas(dbapi_connection)
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")  # Persists in the file
+        cursor.execute(f"PRAGMA wal_autocheckpoint={SQLITE_WAL_AUTOCHECKPOINT}")
+        cursor.close()
+        # Transactions are begun below, as BEGIN IMMEDIATE
+        dbapi_connection.isolation_level = None
+    
+    @event.listens_for(engine, "begin")
+    def _begin_immediate(conn):
+        # Take the write lock up front: a deferred transaction that reads and
+        # then writes gets SQLITE_BUSY without waiting if another process
+        # committed in between, while BEGIN IMMEDIATE waits out busy_timeout.
+        # Connections with ``explicit_begin`` issue their own BEGIN, and can
+        # run pragmas that are no-ops inside a transaction before it.
+        if not conn.get_execution_options().get("explicit_begin"):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+    
+    @event.listens_for(read_engine, "connect")
+    def _tune_sqlite_reader(dbapi_connection, connection_record):
+        _apply_tuned_pragmas(dbapi_connection)
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA query_only=ON")  # A misrouted write fails instead of racing the writer
+        cursor.close()
+        
+        from trending import register_sqlite_functions
+        register_sqlite_functions(dbapi_connection)
+
+def _create_replica_engine(url: str):
+    """Engine for one read replica; writes sent to it by mistake are refused."""
+    if "sqlite" in url:
+        # SQLite stand-in, for trying replica routing locally
+        replica = create_engine(url, connect_args={"check_same_thread": False}, pool_pre_ping=True)
+        
+        @event.listens_for(replica, "connect")
+        def _read_only(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA query_only=ON")
+            cursor.close()
+        
+        return replica
+    return create_engine(
+        url,
+        # An unreachable replica fails fast instead of holding up the request
+        connect_args={
+            "connect_timeout": 5,
+            "options": "-c default_transaction_read_only=on",
+            **_driver_connect_args(url)
+        },
+        pool_pre_ping=True,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=3600
+    )
+
+# Read replicas for get_read_db sessions (see replicas.py); None without any
+replicas = ReplicaSet([_create_replica_engine(url) for url in DATABASE_REPLICA_URLS]) if DATABASE_REPLICA_URLS else None
+
+# Per-request SQL instrumentation: every statement is counted and timed into
+# the current request's QueryStats (started by metrics.MetricsMiddleware), and
+# statements slower than SLOW_QUERY_MS are logged, with their plan on Postgres
+class QueryStats:
+    """Statements run and seconds spent in the database by one request."""
+    
+    __slots__ = ("count", "seconds", "scope")
+    
+    def __init__(self, scope: Optional[dict] = None):
+        self.count = 0
+        self.seconds = 0.0
+        self.scope = scope  # The ASGI scope, for the route in slow-query logs
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+def start_query_stats(scope: Optional[dict] = None) -> QueryStats:
+    """Start counting statements for the current request (context)."""
+    stats = QueryStats(scope)
+    _query_stats.set(stats)
+    return stats
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _query_stats.get()
+
+_EXPLAIN_INTERVAL = 300.0  # Seconds before the same slow statement is explained again
+_explained_at: Dict[str, float] = {}
+
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    span = start_span("db", KIND_CLIENT)
+    if span is not None:
+        span.attributes["db.statement"] = statement[:500]
+    conn.info.setdefault("statement_started", []).append((time.perf_counter(), span))
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    started, span = conn.info["statement_started"].pop()
+    end_span(span)
+    elapsed = time.perf_counter() - started
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        _log_slow_statement(cursor, statement, parameters, executemany, elapsed, stats)
+
+def _discard_statement_timer(context) -> None:
+    # A statement that raises never reaches after_cursor_execute
+    conn = context.connection
+    pending = conn.info.get("statement_started") if conn is not None else None
+    if pending:
+        _, span = pending.pop()
+        end_span(span, error=True)
+
+_replica_engines = [replica.engine for replica in replicas.replicas] if replicas else []
+for _instrumented in [engine, read_engine] + _replica_engines:
+    if _instrumented is not None:
+        event.listen(_instrumented, "before_cursor_execute", _start_statement_timer)
+        event.listen(_instrumented, "after_cursor_execute", _record_statement)
+        event.listen(_instrumented, "handle_error", _discard_statement_timer)
+        install_prepared_statements(_instrumented)
+
+def _log_slow_statement(cursor, statement, parameters, executemany, elapsed, stats) -> None:
+    route = getattr((stats.scope or {}).get("route") if stats else None, "path", None)
+    where = f" in {stats.scope['method']} {route}" if route else ""
+    message = f"Slow query ({elapsed * 1000:.0f} ms){where}: {' '.join(statement.split())[:1000]}"
+    if SLOW_QUERY_EXPLAIN and engine.dialect.name == "postgresql" and not executemany:
+        plan = _explain(cursor, statement, parameters)
+        if plan:
+            message += "\n" + plan
+    logger.warning(message)
+
+def _explain(cursor, statement: str, parameters) -> Optional[str]:
+    """EXPLAIN a statement on its connection, at most once per interval per statement.
+    
+    Runs in a savepoint, so a statement that cannot be explained does not
+    abort the caller's transaction.
+    """
+    if statement.lstrip()[:6].upper() not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+        return None
+    now = time.monotonic()
+    if now - _explained_at.get(statement, float("-inf")) < _EXPLAIN_INTERVAL:
+        return None
+    if len(_explained_at) > 1000:
+        _explained_at.clear()
+    _explained_at[statement] = now
+    
+    connection = cursor.connection
+    in_transaction = not getattr(connection, "autocommit", False)
+    explain_cursor = connection.cursor()
+    try:
+        if in_transaction:
+            explain_cursor.execute("SAVEPOINT explain_slow_query")
+        try:
+            explain_cursor.execute("EXPLAIN " + statement, parameters)
+            plan = "\n".join(row[0] for row in explain_cursor.fetchall())
+        except Exception as e:
+            if in_transaction:
+                explain_cursor.execute("ROLLBACK TO SAVEPOINT explain_slow_query")
+            logger.debug("Could not explain slow query: %s", e)
+            return None
+        if in_transaction:
+            explain_cursor.execute("RELEASE SAVEPOINT explain_slow_query")
+        return plan
+    except Exception as e:
+        logger.debug("Could not explain slow query: %s", e)
+        return None
+    finally:
+        explain_cursor.close()
+
+class RoutingSession(Session):
+    """Session that reads through ``read_engine`` until it writes.
+    
+    Flushes and INSERT/UPDATE/DELETE statements go to the writer ``engine``,
+    and the session then stays on the writer until its transaction ends, so
+    it reads its own uncommitted changes.
+    """
+    
+    # Stay on the writer after the transaction ends, too
+    sticky_writes = False
+    
+    def get_bind(self, mapper=None, *, clause=None, **kw):
+        if self.info.get("writing") or self._flushing or _is_write(clause):
+            self.info["writing"] = True
+            return engine
+        return self._read_bind()
+    
+    def _read_bind(self):
+        return read_engine
+
+class ReplicaSession(RoutingSession):
+    """Session whose reads go to a read replica while one is usable.
+    
+    Once it writes, it reads from the primary until closed, since replicas
+    may not have its changes yet.
+    """
+    
+    sticky_writes = True
+    
+    def _read_bind(self):
+        bind = self.info.get("replica")
+        if bind is None:
+            bind = self.info["replica"] = replicas.choose() or read_engine or engine
+        return bind
+
+def read_from_primary(db: Session) -> bool:
+    """Send the rest of a ``get_read_db`` session's reads to the primary.
+    
+    For rows a replica may not have yet, e.g. a note uploaded a moment ago.
+    Returns False if the session was not reading from a replica.
+    """
+    if not isinstance(db, ReplicaSession) or db.info.get("writing"):
+        return False
+    if db.info.get("replica") in (None, engine, read_engine):
+        return False
+    db.info["writing"] = True
+    return True
+
+def _is_write(clause) -> bool:
+    if isinstance(clause, UpdateBase):
+        return True
+    # Raw SQL: anything but a query, e.g. the trending score upserts
+    return isinstance(clause, TextClause) and not clause.text.lstrip()[:6].upper() == "SELECT"
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _return_to_readers(session, transaction):
+    if transaction.parent is None and not session.sticky_writes:
+        session.info.pop("writing", None)
+
 # Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+if read_engine is not None:
+    SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+else:
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Base class for models
 Base = declarative_base()
 
+# Sessions for read-only endpoints: replica reads when DATABASE_REPLICA_URLS is set
+if replicas is not None:
+    ReadSessionLocal = sessionmaker(class_=ReplicaSession, autocommit=False, autoflush=False)
+else:
+    ReadSessionLocal = SessionLocal
+
 def get_db():
     """Dependency for getting database session."""
     db = SessionLocal()
@@ -53,9 +388,51 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    """Dependency for read-only endpoints, whose reads may go to a replica."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 def init_db():
     """Initialize database tables."""
     # Import all models to ensure they're registered with Base
-    from models import User, Note, Like, Comment
+    from models import User, Note, Like, Comment, NoteStats, NoteTrending
+    from sqlalchemy import inspect
+    
+    had_note_stats = inspect(engine).has_table(NoteStats.__tablename__)
+    had_note_trending = inspect(engine).has_table(NoteTrending.__tablename__)
     Base.metadata.create_all(bind=engine)
+    
+    # create_all skips existing tables, so add columns and indexes defined since
+    from changelog import ensure_txid_column
+    ensure_txid_column(engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    
+    from search import ensure_search_index
+    ensure_search_index(engine)
+    
+    # Seed like counters the first time the stats table is created
+    if not had_note_stats:
+        from counters import backfill_like_counts
+        db = SessionLocal()
+        try:
+            backfill_like_counts(db)
+            db.commit()
+        finally:
+            db.close()
+    
+    # Score existing notes the first time the trending table is created
+    if not had_note_trending:
+        from trending import rebuild as rebuild_trending
+        db = SessionLocal()
+        try:
+            rebuild_trending(db)
+            db.commit()
+        finally:
+            db.close()
 
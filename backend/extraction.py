@@ -0,0 +1,292 @@
+"""Text extraction from uploaded files for content search.
+
+After an upload, an ``extract_text`` job streams the stored file from the
+storage backend, extracts its text incrementally (page by page for PDFs,
+paragraph by paragraph for .docx, chunk by chunk for .txt), normalizes it and
+stores it in ``note_contents``, which feeds the search index in search.py.
+
+Extraction runs in separate processes, at most ``EXTRACTION_WORKERS`` at a
+time, and a process that exceeds ``EXTRACTION_TIMEOUT`` is killed so a
+malformed document cannot wedge a worker.
+
+Run ``python extraction.py --backfill`` to extract text for notes uploaded
+before this pipeline existed.
+"""
+import codecs
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unicodedata
+from contextlib import closing
+from typing import Iterator, Optional
+
+try:
+    from config import (
+        EXTRACTION_WORKERS,
+        EXTRACTION_TIMEOUT,
+        EXTRACTION_MAX_CHARS,
+    )
+except ImportError:
+    EXTRACTION_WORKERS = 2
+    EXTRACTION_TIMEOUT = 60.0
+    EXTRACTION_MAX_CHARS = 500_000
+
+logger = logging.getLogger(__name__)
+
+EXTRACTABLE_EXTENSIONS = {".pdf", ".docx", ".txt"}
+
+_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = re.compile(r"\s+")
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def normalize_text(text: str) -> str:
+    """NFKC-normalize text, drop control characters and collapse whitespace."""
+    text = unicodedata.normalize("NFKC", text)
+    text = _CONTROL_CHARS.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _iter_txt(path: str) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+def _iter_pdf(path: str) -> Iterator[str]:
+    import pypdfium2 as pdfium
+
+    # pdfium reads pages from the file on demand
+    pdf = pdfium.PdfDocument(path)
+    try:
+        for index in range(len(pdf)):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            try:
+                yield textpage.get_text_range()
+            finally:
+                textpage.close()
+                page.close()
+    finally:
+        pdf.close()
+
+
+def _iter_docx(path: str) -> Iterator[str]:
+    import zipfile
+    from xml.etree.ElementTree import iterparse
+
+    with zipfile.ZipFile(path) as archive:
+        with archive.open("word/document.xml") as document:
+            paragraph = []
+            for _, element in iterparse(document, events=("end",)):
+                if element.tag == f"{_WORD_NS}t" and element.text:
+                    paragraph.append(element.text)
+                elif element.tag == f"{_WORD_NS}p":
+                    if paragraph:
+                        yield "".join(paragraph)
+                        paragraph = []
+                    element.clear()  # Keep memory flat on long documents
+            if paragraph:
+                yield "".join(paragraph)
+
+
+_EXTRACTORS = {
+    ".txt": _iter_txt,
+    ".pdf": _iter_pdf,
+    ".docx": _iter_docx,
+}
+
+
+def extract_text_from_path(path: str, ext: str, max_chars: int = EXTRACTION_MAX_CHARS) -> str:
+    """Extract normalized text from a local file, stopping at ``max_chars``."""
+    extractor = _EXTRACTORS.get(ext.lower())
+    if extractor is None:
+        return ""
+    pieces = []
+    length = 0
+    for piece in extractor(path):
+        piece = normalize_text(piece)
+        if not piece:
+            continue
+        pieces.append(piece)
+        length += len(piece) + 1
+        if length >= max_chars:
+            break
+    return " ".join(pieces)[:max_chars]
+
+
+def _child_main(conn, path: str, ext: str, max_chars: int) -> None:
+    try:
+        conn.send(("ok", extract_text_from_path(path, ext, max_chars)))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+# Caps the number of extraction processes running at once in this process
+_slots = threading.BoundedSemaphore(EXTRACTION_WORKERS)
+
+
+def run_extraction(path: str, ext: str, timeout: float = EXTRACTION_TIMEOUT) -> str:
+    """Extract text in a child process, killing it after ``timeout`` seconds."""
+    with _slots:
+        parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(
+            target=_child_main,
+            args=(child_conn, path, ext, EXTRACTION_MAX_CHARS),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        try:
+            if not parent_conn.poll(timeout):
+                raise TimeoutError(f"Text extraction timed out after {timeout}s")
+            status, result = parent_conn.recv()
+        except EOFError:
+            raise RuntimeError("Text extraction process exited unexpectedly")
+        finally:
+            parent_conn.close()
+            if process.is_alive():
+                process.kill()
+            process.join()
+    if status != "ok":
+        raise RuntimeError(result)
+    return result
+
+
+def _materialize(storage, file_path: str, ext: str):
+    """
+    Get a local path for a stored file.
+
+    Local files are used in place; remote files are streamed to a temporary
+    file.  Returns ``(path, is_temporary)``.
+    """
+    from storage import LocalStorage
+
+    if isinstance(storage, LocalStorage):
+        return file_path, False
+    with closing(storage.open_file(file_path)) as source, \
+            tempfile.NamedTemporaryFile(suffix=ext, delete=False) as target:
+        shutil.copyfileobj(source, target, _CHUNK_SIZE)
+        return target.name, True
+
+
+def extract_for_note(note_id: int) -> Optional[int]:
+    """
+    Extract and store the text of a note's file.
+
+    Returns the number of characters stored, or ``None`` if the note is gone
+    or its type has no extractable text.  Raises on failure so the job is
+    retried.
+    """
+    from database import SessionLocal
+    from models import Note, NoteContent
+    from storage import storage
+    from sqlalchemy.exc import IntegrityError
+
+    db = SessionLocal()
+    try:
+        note = db.query(Note).filter(Note.id == note_id).first()
+        if note is None:
+            return None
+        ext = os.path.splitext(note.file_path)[1].lower()
+        if ext not in EXTRACTABLE_EXTENSIONS:
+            return None
+        file_path = note.file_path
+        db.rollback()  # Don't hold a transaction open while extracting
+
+        path, is_temporary = _materialize(storage, file_path, ext)
+        try:
+            text = run_extraction(path, ext)
+        finally:
+            if is_temporary:
+                os.remove(path)
+
+        try:
+            content = db.query(NoteContent).filter(NoteContent.note_id == note_id).first()
+            if content is None:
+                db.add(NoteContent(note_id=note_id, content=text, char_count=len(text)))
+            else:
+                content.content = text
+                content.char_count = len(text)
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # The note was deleted while we extracted
+            return None
+        logger.info("Extracted %d characters from note %s", len(text), note_id)
+        return len(text)
+    finally:
+        db.close()
+
+
+def backfill(workers: int = EXTRACTION_WORKERS, batch_size: int = 500) -> int:
+    """Extract text for every note that has none yet, in parallel."""
+    import time
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from database import SessionLocal
+    from models import Note, NoteContent
+
+    global _slots
+    _slots = threading.BoundedSemaphore(workers)
+
+    db = SessionLocal()
+    try:
+        note_ids = [
+            note_id for (note_id,) in db.query(Note.id)
+            .outerjoin(NoteContent, NoteContent.note_id == Note.id)
+            .filter(NoteContent.note_id.is_(None))
+            .order_by(Note.id)
+            .all()
+        ]
+    finally:
+        db.close()
+
+    started = time.perf_counter()
+    extracted = failed = chars = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(note_ids), batch_size):
+            futures = {
+                executor.submit(extract_for_note, note_id): note_id
+                for note_id in note_ids[start:start + batch_size]
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed += 1
+                    logger.warning("Extraction failed for note %s: %s", futures[future], e)
+                    continue
+                if result is not None:
+                    extracted += 1
+                    chars += result
+            elapsed = time.perf_counter() - started
+            done = start + len(futures)
+            logger.info("Backfill: %d/%d notes, %d extracted, %d failures, %.1f notes/s, %.0f KiB text/s",
+                        done, len(note_ids), extracted, failed, done / elapsed, chars / elapsed / 1024)
+    return extracted
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Text extraction maintenance")
+    parser.add_argument("--backfill", action="store_true", help="Extract text for notes missing it")
+    parser.add_argument("--workers", type=int, default=EXTRACTION_WORKERS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.backfill:
+        count = backfill(workers=args.workers)
+        print(f"Extracted text for {count} notes")
+    else:
+        parser.print_help()
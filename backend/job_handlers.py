@@ -0,0 +1,68 @@
+"""Handlers for background jobs (see jobs.py)."""
+import logging
+
+from jobs import enqueue_now, job_handler
+
+logger = logging.getLogger(__name__)
+
+
+@job_handler("delete_file")
+def delete_file(payload: dict) -> None:
+    """Delete a stored file; raises so the job is retried if it is still there."""
+    from storage import storage
+
+    file_path = payload["file_path"]
+    if storage.delete_file(file_path):
+        logger.info("Deleted file: %s", file_path)
+        return
+    if storage.file_exists(file_path):
+        raise RuntimeError(f"Could not delete file {file_path}")
+    logger.info("File %s already removed from storage", file_path)
+
+
+@job_handler("generate_thumbnail")
+def generate_thumbnail(payload: dict) -> None:
+    """Render and store the thumbnail for a newly uploaded note."""
+    from thumbnails import generate_for_note
+
+    generate_for_note(payload["note_id"])
+
+
+@job_handler("extract_text")
+def extract_text(payload: dict) -> None:
+    """Extract a note's text for the content search index."""
+    from extraction import extract_for_note
+
+    if extract_for_note(payload["note_id"]):
+        # Documents are signed from their text, so only once it exists
+        enqueue_now("compute_signature", {"note_id": payload["note_id"]})
+
+
+@job_handler("compute_signature")
+def compute_signature(payload: dict) -> None:
+    """Sign a note for near-duplicate detection and mark it if it is a copy."""
+    from similarity import compute_for_note
+
+    compute_for_note(payload["note_id"])
+
+
+@job_handler("refresh_related")
+def refresh_related(payload: dict) -> None:
+    """Recompute related notes for notes whose likes changed."""
+    from related import refresh_dirty
+
+    refresh_dirty()
+
+
+@job_handler("compact_changes")
+def compact_changes(payload: dict) -> None:
+    """Drop superseded and expired entries from the feed change log."""
+    from changelog import compact
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        compact(db)
+        db.commit()
+    finally:
+        db.close()
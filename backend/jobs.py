@@ -0,0 +1,428 @@
+"""Durable in-process background job queue.
+
+Jobs are rows in the ``jobs`` table, so they are enqueued in the same
+transaction as the change that needs them (deleting a note and deleting its
+file either both happen or neither does) and survive restarts without an
+external broker.  Every API process runs a small pool of asyncio workers that
+claim due jobs (``FOR UPDATE SKIP LOCKED`` on Postgres; SQLite serializes
+writers), run the handler in a thread, and retry failures with exponential
+backoff until ``max_attempts`` is reached, after which the job is
+dead-lettered for inspection.
+
+Idle workers look before they claim: a plain read of the earliest pending
+``run_at`` (no write lock, even on SQLite) tells them whether a claim can
+succeed and how long to sleep.  With nothing pending, the sleep doubles from
+``JOB_POLL_INTERVAL`` up to ``JOB_IDLE_MAX_INTERVAL``; ``wake_workers()``
+cuts it short for jobs enqueued in this process, and jobs enqueued by other
+processes are picked up within ``JOB_IDLE_MAX_INTERVAL``.
+
+Handlers are registered with ``@job_handler("kind")`` and receive the decoded
+payload dict.  A handler signals failure by raising.
+"""
+import asyncio
+import json
+import logging
+import random
+import socket
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+try:
+    from config import (
+        JOB_QUEUE_ENABLED,
+        JOB_WORKERS,
+        JOB_POLL_INTERVAL,
+        JOB_IDLE_MAX_INTERVAL,
+        JOB_MAX_ATTEMPTS,
+        JOB_RETRY_BASE_DELAY,
+        JOB_RETRY_MAX_DELAY,
+        JOB_VISIBILITY_TIMEOUT,
+    )
+except ImportError:
+    JOB_QUEUE_ENABLED = True
+    JOB_WORKERS = 2
+    JOB_POLL_INTERVAL = 1.0
+    JOB_IDLE_MAX_INTERVAL = 30.0
+    JOB_MAX_ATTEMPTS = 5
+    JOB_RETRY_BASE_DELAY = 2.0
+    JOB_RETRY_MAX_DELAY = 600.0
+    JOB_VISIBILITY_TIMEOUT = 300.0
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DEAD = "dead"
+
+_handlers: Dict[str, Callable[[dict], None]] = {}
+
+
+def job_handler(kind: str):
+    """Register a function as the handler for a job kind."""
+    def decorator(func: Callable[[dict], None]) -> Callable[[dict], None]:
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: Optional[dict] = None,
+    delay: float = 0,
+    max_attempts: Optional[int] = None,
+):
+    """
+    Add a job to the caller's session; it becomes visible when they commit.
+
+    Call ``wake_workers()`` after the commit to have it picked up right away
+    instead of on the next poll.
+    """
+    from models import Job
+    import job_handlers  # noqa: F401 - registers handlers
+
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for job kind: {kind}")
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        status=JOB_PENDING,
+        attempts=0,
+        max_attempts=max_attempts or JOB_MAX_ATTEMPTS,
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.add(job)
+    return job
+
+
+def enqueue_now(kind: str, payload: Optional[dict] = None, delay: float = 0) -> None:
+    """Enqueue a job in its own transaction, for callers with nothing to commit it with."""
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        enqueue(db, kind, payload, delay=delay)
+        db.commit()
+    finally:
+        db.close()
+    if not delay:
+        wake_workers()
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter for the given number of failed attempts."""
+    delay = min(JOB_RETRY_MAX_DELAY, JOB_RETRY_BASE_DELAY * (2 ** (attempts - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class JobMetrics:
+    """Per-process counters describing queue throughput and latency."""
+
+    def __init__(self):
+        self.succeeded = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.reclaimed = 0
+        # Time from when a job became due to when a worker started it
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        # Handler execution time
+        self.run_seconds_total = 0.0
+        self.run_seconds_max = 0.0
+
+    def observe(self, wait: float, run: float) -> None:
+        self.wait_seconds_total += wait
+        self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        self.run_seconds_total += run
+        self.run_seconds_max = max(self.run_seconds_max, run)
+
+    def as_dict(self) -> dict:
+        processed = self.succeeded + self.retried + self.dead_lettered
+        return {
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+            "reclaimed": self.reclaimed,
+            "avg_wait_seconds": self.wait_seconds_total / processed if processed else 0.0,
+            "max_wait_seconds": self.wait_seconds_max,
+            "avg_run_seconds": self.run_seconds_total / processed if processed else 0.0,
+            "max_run_seconds": self.run_seconds_max,
+        }
+
+
+class JobQueue:
+    """Pool of asyncio workers processing jobs from the ``jobs`` table."""
+
+    def __init__(
+        self,
+        session_factory,
+        workers: int = JOB_WORKERS,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        visibility_timeout: float = JOB_VISIBILITY_TIMEOUT,
+        max_idle_interval: float = JOB_IDLE_MAX_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_idle_interval = max(poll_interval, max_idle_interval)
+        self.visibility_timeout = visibility_timeout
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.metrics = JobMetrics()
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # Earliest pending run_at seen by the last claim attempt
+        self._next_due: Optional[datetime] = None
+
+    def _claim(self, db: Session):
+        """Atomically move the oldest due job to running and return it."""
+        from models import Job
+
+        now = datetime.utcnow()
+        # Read first, so an idle poll never takes the write lock
+        self._next_due = db.execute(
+            select(func.min(Job.run_at)).where(Job.status == JOB_PENDING)
+        ).scalar()
+        db.rollback()
+        if self._next_due is None or self._next_due > now:
+            return None
+        candidate = (
+            select(Job.id)
+            .where(Job.status == JOB_PENDING, Job.run_at <= now)
+            .order_by(Job.run_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        row = db.execute(
+            update(Job)
+            .where(Job.id == candidate, Job.status == JOB_PENDING)
+            .values(
+                status=JOB_RUNNING,
+                attempts=Job.attempts + 1,
+                started_at=now,
+                locked_by=self.worker_id,
+            )
+            .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts, Job.run_at)
+            .execution_options(synchronize_session=False)
+        ).first()
+        db.commit()
+        return row
+
+    def _finish(self, db: Session, job, error: Optional[str]) -> None:
+        """Delete a finished job, or schedule a retry / dead-letter it."""
+        from models import Job
+
+        if error is None:
+            db.query(Job).filter(Job.id == job.id).delete(synchronize_session=False)
+            self.metrics.succeeded += 1
+        elif job.attempts >= job.max_attempts:
+            db.query(Job).filter(Job.id == job.id).update({
+                "status": JOB_DEAD,
+                "last_error": error,
+                "finished_at": datetime.utcnow(),
+            }, synchronize_session=False)
+            self.metrics.dead_lettered += 1
+            logger.error("Job %s (%s) dead-lettered after %d attempts: %s", job.id, job.kind, job.attempts, error)
+        else:
+            delay = retry_delay(job.attempts)
+            db.query(Job).filter(Job.id == job.id).update({
+                "status": JOB_PENDING,
+                "last_error": error,
+                "run_at": datetime.utcnow() + timedelta(seconds=delay),
+            }, synchronize_session=False)
+            self.metrics.retried += 1
+            logger.warning("Job %s (%s) failed (attempt %d), retrying in %.1fs: %s",
+                           job.id, job.kind, job.attempts, delay, error)
+        db.commit()
+
+    def process_one(self) -> bool:
+        """Claim and run a single job. Returns False if nothing was due."""
+        db = self.session_factory()
+        try:
+            job = self._claim(db)
+            if job is None:
+                return False
+
+            wait = max(0.0, (datetime.utcnow() - job.run_at).total_seconds())
+            started = time.perf_counter()
+            error = None
+            handler = _handlers.get(job.kind)
+            try:
+                if handler is None:
+                    raise RuntimeError(f"No handler registered for job kind: {job.kind}")
+                handler(json.loads(job.payload or "{}"))
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            self.metrics.observe(wait, time.perf_counter() - started)
+            self._finish(db, job, error)
+            return True
+        except Exception as e:
+            db.rollback()
+            logger.error("Job queue error: %s", e, exc_info=True)
+            return False
+        finally:
+            db.close()
+
+    def reclaim_stale(self) -> int:
+        """Return jobs stuck in running (e.g. their worker died) to pending."""
+        from models import Job
+
+        cutoff = datetime.utcnow() - timedelta(seconds=self.visibility_timeout)
+        db = self.session_factory()
+        try:
+            count = db.query(Job).filter(
+                Job.status == JOB_RUNNING,
+                Job.started_at < cutoff
+            ).update({"status": JOB_PENDING, "locked_by": None}, synchronize_session=False)
+            db.commit()
+            if count:
+                self.metrics.reclaimed += count
+                logger.warning("Reclaimed %d stale running jobs", count)
+            return count
+        except Exception as e:
+            db.rollback()
+            logger.error("Could not reclaim stale jobs: %s", e)
+            return 0
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        """Queue depth by status, oldest due job age, and worker metrics."""
+        from models import Job
+
+        db = self.session_factory()
+        try:
+            depth = dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+            oldest_due = db.query(func.min(Job.run_at)).filter(
+                Job.status == JOB_PENDING,
+                Job.run_at <= datetime.utcnow()
+            ).scalar()
+        finally:
+            db.close()
+        return {
+            "pending": depth.get(JOB_PENDING, 0),
+            "running": depth.get(JOB_RUNNING, 0),
+            "dead": depth.get(JOB_DEAD, 0),
+            "oldest_due_seconds": (
+                (datetime.utcnow() - oldest_due).total_seconds() if oldest_due else 0.0
+            ),
+            "workers": self.workers,
+            **self.metrics.as_dict(),
+        }
+
+    def _idle_timeout(self, idle: float) -> float:
+        """Sleep for ``idle`` seconds, or until the next pending job is due if sooner."""
+        next_due = self._next_due
+        if next_due is not None:
+            until_due = (next_due - datetime.utcnow()).total_seconds()
+            if until_due > 0:
+                return min(idle, until_due)
+        return idle
+
+    async def _worker(self) -> None:
+        idle = self.poll_interval
+        while not self._stopping:
+            try:
+                if await asyncio.to_thread(self.process_one):
+                    idle = self.poll_interval
+                    continue
+            except Exception as e:
+                logger.error("Job worker error: %s", e, exc_info=True)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._idle_timeout(idle))
+                idle = self.poll_interval
+            except asyncio.TimeoutError:
+                idle = min(idle * 2, self.max_idle_interval)
+            self._wake.clear()
+
+    async def _reaper(self) -> None:
+        while not self._stopping:
+            await asyncio.to_thread(self.reclaim_stale)
+            await asyncio.sleep(max(self.visibility_timeout / 2, self.poll_interval))
+
+    def start(self) -> None:
+        """Start the worker pool on the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._reaper_task = asyncio.create_task(self._reaper())
+
+    def wake(self) -> None:
+        """Wake idle workers (safe to call from any thread)."""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def stop(self) -> None:
+        """Let in-flight jobs finish, then stop the workers."""
+        self._stopping = True
+        self.wake()
+        if self._reaper_task is not None:
+            self._reaper_task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Global queue, created on application startup
+job_queue: Optional[JobQueue] = None
+
+
+def wake_workers() -> None:
+    """Have idle workers check for new jobs now."""
+    if job_queue is not None:
+        job_queue.wake()
+
+
+async def start_job_queue() -> Optional[JobQueue]:
+    """Start the worker pool if ``JOB_QUEUE_ENABLED`` is set."""
+    global job_queue
+    if JOB_QUEUE_ENABLED and job_queue is None:
+        from database import SessionLocal
+        import job_handlers  # noqa: F401 - registers handlers
+        job_queue = JobQueue(SessionLocal)
+        job_queue.start()
+        logger.info("Job queue started with %d workers", job_queue.workers)
+    return job_queue
+
+
+async def stop_job_queue() -> None:
+    """Stop the worker pool."""
+    global job_queue
+    if job_queue is not None:
+        await job_queue.stop()
+        job_queue = None
+
+
+async def _run_standalone() -> None:
+    """Run only the worker pool, for deployments that process jobs separately."""
+    import signal
+
+    from database import SessionLocal
+    import job_handlers  # noqa: F401 - registers handlers
+
+    queue = JobQueue(SessionLocal)
+    queue.start()
+    logger.info("Standalone job worker started with %d workers", queue.workers)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass  # Windows; Ctrl+C still raises KeyboardInterrupt
+    await stop_event.wait()
+    await queue.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run_standalone())
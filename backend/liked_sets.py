@@ -0,0 +1,97 @@
+"""Per-user cache of liked note ids.
+
+``/api/notes/liked-status`` tells the explore page which notes on a page of
+the public feed the current user has liked.  Instead of querying ``likes``
+for every page, each user's liked note ids are loaded once (an index-only
+scan of ``ix_likes_user_note``) into a sorted ``array('q')`` - 8 bytes per
+like - and pages are answered by binary search.
+
+``toggle_like`` updates a cached set in place after its commit.  Sets are
+evicted least-recently-used beyond ``LIKED_CACHE_USERS`` users and reloaded
+after ``LIKED_CACHE_TTL`` seconds, which bounds how stale a set can be when
+several API processes serve the same user.  That staleness is why the
+feeds and ``/batch`` still read ``is_liked`` from ``likes``: a like served by
+another worker must show on the next page load, not minutes later.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Iterable, Set
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+try:
+    from config import LIKED_CACHE_USERS, LIKED_CACHE_TTL
+except ImportError:
+    LIKED_CACHE_USERS = 10_000
+    LIKED_CACHE_TTL = 300.0
+
+
+def _contains(ids: array, note_id: int) -> bool:
+    position = bisect_left(ids, note_id)
+    return position < len(ids) and ids[position] == note_id
+
+
+class LikedSetCache:
+    """LRU map of user id -> sorted array of liked note ids."""
+
+    def __init__(self, max_users: int = LIKED_CACHE_USERS, ttl: float = LIKED_CACHE_TTL):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._sets: "OrderedDict[int, tuple]" = OrderedDict()  # user_id -> (ids, loaded_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, db: Session, user_id: int) -> array:
+        from models import Like
+
+        ids = array("q", db.execute(
+            select(Like.note_id).where(Like.user_id == user_id).order_by(Like.note_id)
+        ).scalars())
+        with self._lock:
+            self._sets[user_id] = (ids, time.monotonic())
+            self._sets.move_to_end(user_id)
+            while len(self._sets) > self.max_users:
+                self._sets.popitem(last=False)
+        return ids
+
+    def _get(self, db: Session, user_id: int) -> array:
+        with self._lock:
+            entry = self._sets.get(user_id)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._sets.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        return self._load(db, user_id)
+
+    def liked_among(self, db: Session, user_id: int, note_ids: Iterable[int]) -> Set[int]:
+        """The subset of ``note_ids`` that the user has liked."""
+        ids = self._get(db, user_id)
+        with self._lock:  # update() may be inserting into the same array
+            return {note_id for note_id in note_ids if _contains(ids, note_id)}
+
+    def update(self, user_id: int, note_id: int, liked: bool) -> None:
+        """Apply a committed like or unlike to the user's set, if cached."""
+        with self._lock:
+            entry = self._sets.get(user_id)
+            if entry is None:
+                return
+            ids = entry[0]
+            position = bisect_left(ids, note_id)
+            present = position < len(ids) and ids[position] == note_id
+            if liked and not present:
+                ids.insert(position, note_id)
+            elif not liked and present:
+                del ids[position]
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._sets.pop(user_id, None)
+
+
+liked_sets = LikedSetCache()
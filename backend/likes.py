@@ -0,0 +1,166 @@
+"""Atomic like toggling.
+
+Toggling a like used to be a read-modify-write sequence (load the note, load
+the existing like, then delete or insert it).  Concurrent double-clicks raced
+between the read and the write and tripped the ``unique_like`` constraint.
+The helpers here perform the toggle with conflict-tolerant statements so the
+outcome is always consistent, and report the new like count so clients do not
+need to refetch.
+"""
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, func, literal, select, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# (liked, like_count, like_delta, created_at of the removed like)
+ToggleResult = Tuple[bool, int, int, Optional[datetime]]
+
+# Postgres allows data-modifying CTEs, so the whole toggle is one statement:
+# delete the like if present, otherwise insert it (ignoring a concurrent
+# insert of the same row), and report what happened.
+_POSTGRES_TOGGLE_SQL = text("""
+    WITH target AS (
+        SELECT id FROM notes WHERE id = :note_id
+    ),
+    removed AS (
+        DELETE FROM likes
+        WHERE note_id = :note_id AND user_id = :user_id
+        RETURNING id, created_at
+    ),
+    added AS (
+        INSERT INTO likes (note_id, user_id, created_at)
+        SELECT id, :user_id, :created_at FROM target
+        WHERE NOT EXISTS (SELECT 1 FROM removed)
+        ON CONFLICT (note_id, user_id) DO NOTHING
+        RETURNING id
+    )
+    SELECT
+        (SELECT count(*) FROM target) AS note_exists,
+        (SELECT count(*) FROM removed) AS removed,
+        (SELECT count(*) FROM added) AS added,
+        (SELECT max(created_at) FROM removed) AS removed_at,
+        (SELECT count(*) FROM likes WHERE note_id = :note_id) AS previous_count
+""")
+
+
+def _toggle_postgres(db: Session, note_id: int, user_id: int, now: datetime) -> Optional[ToggleResult]:
+    """Toggle a like on Postgres with a single statement.
+
+    Returns ``(liked, like_count, like_delta, removed_like_created_at)`` or
+    ``None`` if the note is missing.
+    """
+    row = db.execute(_POSTGRES_TOGGLE_SQL, {
+        "note_id": note_id,
+        "user_id": user_id,
+        "created_at": now,
+    }).one()
+
+    if not row.note_exists:
+        return None
+
+    # The count subquery sees the snapshot taken before this statement ran,
+    # so adjust it by what the statement itself changed.
+    like_count = row.previous_count - row.removed + row.added
+    # Neither removed nor added means a concurrent request inserted the like
+    # first; the row exists, so the user's like is in place.
+    liked = not row.removed
+    return liked, max(0, like_count), row.added - row.removed, row.removed_at
+
+
+def _toggle_sqlite(db: Session, note_id: int, user_id: int, now: datetime) -> Optional[ToggleResult]:
+    """Toggle a like on SQLite, where writers are serialized by the database lock."""
+    from models import Note, Like
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+    removed = db.execute(
+        delete(Like)
+        .where(Like.note_id == note_id, Like.user_id == user_id)
+        .returning(Like.id, Like.created_at)
+    ).first()
+
+    if removed is not None:
+        liked, delta = False, -1
+    else:
+        added = db.execute(
+            sqlite_insert(Like)
+            .from_select(
+                ["note_id", "user_id", "created_at"],
+                select(Note.id, literal(user_id), literal(now))
+                .where(Note.id == note_id)
+            )
+            .on_conflict_do_nothing(index_elements=["note_id", "user_id"])
+            .returning(Like.id)
+        ).first()
+        if added is None:
+            note_exists = db.execute(
+                select(Note.id).where(Note.id == note_id)
+            ).first()
+            if note_exists is None:
+                return None
+        liked, delta = True, (0 if added is None else 1)
+
+    like_count = db.execute(
+        select(func.count(Like.id)).where(Like.note_id == note_id)
+    ).scalar_one()
+    return liked, like_count, delta, (removed.created_at if removed is not None else None)
+
+
+def toggle_like(db: Session, note_id: int, user_id: int) -> Optional[Tuple[bool, int]]:
+    """
+    Atomically like or unlike a note for a user and commit.
+
+    Returns ``(liked, like_count)`` describing the state after the toggle, or
+    ``None`` if the note does not exist.
+    """
+    import changelog
+    import counters
+    import live
+    import related
+    import trending
+    from liked_sets import liked_sets
+    from models import Note
+
+    dialect = db.get_bind().dialect.name
+    now = datetime.utcnow()
+    effects = {}
+    try:
+        if dialect == "postgresql":
+            result = _toggle_postgres(db, note_id, user_id, now)
+        else:
+            result = _toggle_sqlite(db, note_id, user_id, now)
+        if result is None:
+            db.rollback()
+            return None
+        liked, like_count, delta, removed_at = result
+        if delta:
+            # Writes to the note's shared rows: counter, trending score, related flag
+            effects = {"like_count": delta, counters.RELATED_DIRTY: 1}
+            if delta > 0:
+                effects[counters.TRENDING_ADD] = trending.event_score(trending.LIKE_WEIGHT, now)
+            else:
+                effects[counters.TRENDING_RETRACT] = trending.event_score(trending.LIKE_WEIGHT, removed_at)
+            # Without write-behind, keep them in the same transaction
+            if counters.counter_buffer is None:
+                counters.apply_counter_deltas(db, {note_id: effects})
+            changelog.record(db, note_id, changelog.UPDATED)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if counters.counter_buffer is not None:
+        for field, value in effects.items():
+            counters.counter_buffer.add(note_id, field, value)
+    liked_sets.update(user_id, note_id, liked)
+    if delta:
+        if counters.counter_buffer is None:
+            related.schedule_refresh()  # Otherwise the flush that flags the note does
+        changelog.schedule_compaction()
+        class_name = db.execute(select(Note.class_name).where(Note.id == note_id)).scalar()
+        if class_name is not None:
+            live.publish_like(note_id, class_name, like_count)
+    return liked, like_count
@@ -0,0 +1,318 @@
+"""Live note updates over Server-Sent Events.
+
+``toggle_like`` and ``add_comment`` publish small events (a note's new like
+count, a new comment) to the topics ``note:<id>`` and ``class:<name>``.
+Clients hold an SSE stream open on one topic (routes/live.py) instead of
+polling.
+
+Each API process runs an ``EventHub`` on its event loop.  A publish is
+encoded to an SSE frame once and fanned out to every subscriber of the
+topic with ``put_nowait`` into that subscriber's bounded queue.  A
+subscriber whose queue is full (it stopped reading) is dropped rather than
+allowed to hold up delivery or buffer without limit; its stream ends and
+``EventSource`` reconnects.
+
+Publishes go through a broker so that subscribers connected to other
+processes see them too.  ``LIVE_BROKER=local`` delivers straight to this
+process's hub (single-process deployments).  ``LIVE_BROKER=postgres`` sends
+events with ``pg_notify`` and every process LISTENs for them, so no extra
+service is needed.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+
+try:
+    from config import LIVE_BROKER, LIVE_QUEUE_SIZE, LIVE_MAX_SUBSCRIBERS, LIVE_HEARTBEAT_INTERVAL
+except ImportError:
+    LIVE_BROKER = "local"
+    LIVE_QUEUE_SIZE = 64
+    LIVE_MAX_SUBSCRIBERS = 20_000
+    LIVE_HEARTBEAT_INTERVAL = 25.0
+
+logger = logging.getLogger(__name__)
+
+_KEEP_ALIVE = b": keep-alive\n\n"
+_RETRY = b"retry: 5000\n\n"  # Reconnect delay for EventSource, in ms
+
+
+def note_topic(note_id: int) -> str:
+    return f"note:{note_id}"
+
+
+def class_topic(class_name: str) -> str:
+    return f"class:{class_name}"
+
+
+def encode_event(event: str, data: dict) -> str:
+    """Format an event as an SSE frame."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    """One open stream: the topics it follows and its bounded frame queue."""
+
+    __slots__ = ("topics", "queue")
+
+    def __init__(self, topics: Iterable[str], queue_size: int):
+        self.topics = tuple(topics)
+        # Frames, or None once the subscriber has been dropped
+        self.queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(queue_size)
+
+
+class EventHub:
+    """Per-process fan-out of published frames to subscribers' queues."""
+
+    def __init__(self, queue_size: int = LIVE_QUEUE_SIZE, max_subscribers: int = LIVE_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._heartbeat_task = loop.create_task(self._heartbeat())
+
+    def stop(self) -> None:
+        """End every open stream."""
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        for subscribers in list(self._topics.values()):
+            for subscription in list(subscribers):
+                self._drop(subscription, slow=False)
+        self._loop = None
+
+    async def _heartbeat(self) -> None:
+        """Queue a keep-alive for every subscriber, so idle streams need no timer each."""
+        while True:
+            await asyncio.sleep(LIVE_HEARTBEAT_INTERVAL)
+            subscriptions = {s for subscribers in self._topics.values() for s in subscribers}
+            for subscription in subscriptions:
+                try:
+                    subscription.queue.put_nowait(_KEEP_ALIVE)
+                except asyncio.QueueFull:
+                    self._drop(subscription)
+
+    def subscribe(self, topics: Iterable[str]) -> Optional[Subscription]:
+        """Open a subscription, or return None if this process is at ``max_subscribers``."""
+        if self.subscribers >= self.max_subscribers:
+            return None
+        subscription = Subscription(topics, self.queue_size)
+        for topic in subscription.topics:
+            self._topics.setdefault(topic, set()).add(subscription)
+        self.subscribers += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        removed = False
+        for topic in subscription.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                removed = True
+                if not subscribers:
+                    del self._topics[topic]
+        if removed:
+            self.subscribers -= 1
+
+    def _drop(self, subscription: Subscription, slow: bool = True) -> None:
+        """Unsubscribe and replace whatever is queued with the end-of-stream marker."""
+        self.unsubscribe(subscription)
+        queue = subscription.queue
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+        if slow:
+            self.dropped += 1
+
+    def deliver(self, topic: str, frame: bytes) -> None:
+        """Queue a frame for the topic's subscribers; must run on the hub's loop."""
+        self.published += 1
+        for subscription in list(self._topics.get(topic, ())):
+            try:
+                subscription.queue.put_nowait(frame)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def deliver_threadsafe(self, topic: str, frame: bytes) -> None:
+        """``deliver`` from any thread; a no-op before the hub is started."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self.deliver, topic, frame)
+
+    async def stream(self, subscription: Subscription) -> AsyncIterator[bytes]:
+        """Frames for an SSE response, until the subscriber is dropped."""
+        queue = subscription.queue
+        try:
+            yield _RETRY
+            while True:
+                frame = await queue.get()
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscribers,
+            "topics": len(self._topics),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_slow": self.dropped,
+        }
+
+
+class LocalBroker:
+    """Delivers publishes to this process's hub only."""
+
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def publish(self, topic: str, frame: str) -> None:
+        self.hub.deliver_threadsafe(topic, frame.encode())
+
+
+class PostgresBroker:
+    """Sends publishes through Postgres NOTIFY; a listener thread feeds them to the hub.
+
+    NOTIFY payloads are limited to 8000 bytes, which comfortably fits a
+    comment (1000 characters at most) and its metadata.
+    """
+
+    CHANNEL = "note_events"
+
+    def __init__(self, hub: EventHub, engine):
+        self.hub = hub
+        self.engine = engine
+        self._listen_connection = None
+        self._notify_connection = None
+        self._notify_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def _connect(self):
+        """A dedicated autocommit DBAPI connection, outside the engine's pool."""
+        dialect = self.engine.dialect
+        args, kwargs = dialect.create_connect_args(self.engine.url)
+        connection = dialect.loaded_dbapi.connect(*args, **kwargs)
+        connection.autocommit = True
+        return connection
+
+    def start(self) -> None:
+        self._listen_connection = self._connect()
+        self._listen_connection.cursor().execute(f"LISTEN {self.CHANNEL}")
+        self._notify_connection = self._connect()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._listen, name="live-events-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        for connection in (self._listen_connection, self._notify_connection):
+            if connection is not None:
+                connection.close()
+        self._listen_connection = self._notify_connection = None
+
+    def _listen(self) -> None:
+        connection = self._listen_connection
+        while not self._stopping.is_set():
+            try:
+                if select.select([connection], [], [], 1.0) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    topic, _, frame = notify.payload.partition("\n")
+                    self.hub.deliver_threadsafe(topic, frame.encode())
+            except Exception as e:
+                if self._stopping.is_set():
+                    return
+                logger.error("Live events listener failed, reconnecting: %s", e)
+                self._stopping.wait(1.0)
+                try:
+                    connection = self._listen_connection = self._connect()
+                    connection.cursor().execute(f"LISTEN {self.CHANNEL}")
+                except Exception as reconnect_error:
+                    logger.error("Live events listener could not reconnect: %s", reconnect_error)
+
+    def publish(self, topic: str, frame: str) -> None:
+        with self._notify_lock:
+            try:
+                self._notify_connection.cursor().execute(
+                    "SELECT pg_notify(%s, %s)", (self.CHANNEL, f"{topic}\n{frame}")
+                )
+            except Exception:
+                # One reconnect, e.g. after a database restart
+                self._notify_connection = self._connect()
+                self._notify_connection.cursor().execute(
+                    "SELECT pg_notify(%s, %s)", (self.CHANNEL, f"{topic}\n{frame}")
+                )
+
+
+hub = EventHub()
+broker = None
+
+
+def publish(topics: Iterable[str], event: str, data: dict) -> None:
+    """Publish an event to topics; never raises, since live updates are best effort."""
+    if broker is None:
+        return
+    frame = encode_event(event, data)
+    for topic in topics:
+        try:
+            broker.publish(topic, frame)
+        except Exception as e:
+            logger.warning("Could not publish %s event to %s: %s", event, topic, e)
+
+
+def publish_like(note_id: int, class_name: str, like_count: int) -> None:
+    publish((note_topic(note_id), class_topic(class_name)), "like",
+            {"note_id": note_id, "like_count": like_count})
+
+
+def publish_comment(note_id: int, class_name: str, comment: dict) -> None:
+    publish((note_topic(note_id), class_topic(class_name)), "comment",
+            {"note_id": note_id, "comment": comment})
+
+
+async def start_live_updates() -> None:
+    """Attach the hub to the running loop and start the configured broker."""
+    global broker
+    hub.start(asyncio.get_running_loop())
+    if LIVE_BROKER == "postgres":
+        from database import engine
+        broker = PostgresBroker(hub, engine)
+    else:
+        broker = LocalBroker(hub)
+    try:
+        broker.start()
+    except Exception as e:
+        logger.error("Could not start %s live events broker, using local delivery: %s", LIVE_BROKER, e)
+        broker = LocalBroker(hub)
+    logger.info("Live updates started with %s", type(broker).__name__)
+
+
+def stop_live_updates() -> None:
+    global broker
+    if broker is not None:
+        broker.stop()
+        broker = None
+    hub.stop()
@@ -1,20 +1,20 @@
 """Main FastAPI application."""
 import os
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import get_allowed_origins, HOST, PORT
 from database import init_db
-from routes import auth, notes
+from routes import auth, live, notes
 
-# Configure logging dynamically
+# Configure logging dynamically: records are queued and written by a
+# background thread (logs.py)
 from config import LOG_LEVEL
+from logs import configure_logging, stop_logging, LogContextMiddleware
 log_level = getattr(logging, LOG_LEVEL, logging.INFO)
-logging.basicConfig(
-    level=log_level,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+configure_logging(log_level)
 logger = logging.getLogger(__name__)
 logger.info(f"Logging level set to: {LOG_LEVEL}")
 
@@ -36,11 +36,41 @@ except Exception as e:
     # Don't raise - allow server to start so we can see health check
     # The actual database operations will fail with clear error messages
 
+# Move existing databases to ON DELETE CASCADE foreign keys
+try:
+    from migrate_cascades import migrate as migrate_cascades
+    migrate_cascades()
+except Exception as e:
+    logger.warning(f"Cascade migration failed: {e}. Note deletes may fail until it succeeds.")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background services on startup and drain them on shutdown."""
+    from counters import start_counter_buffer, stop_counter_buffer
+    from jobs import start_job_queue, stop_job_queue
+    from live import start_live_updates, stop_live_updates
+    from replicas import start_replica_monitor, stop_replica_monitor
+    from tracing import start_trace_exporter, stop_trace_exporter
+    
+    start_trace_exporter()
+    start_replica_monitor()
+    start_counter_buffer()
+    await start_job_queue()
+    await start_live_updates()
+    yield
+    stop_live_updates()
+    await stop_job_queue()
+    stop_counter_buffer()
+    stop_replica_monitor()
+    stop_trace_exporter()
+    stop_logging()
+
 # Create FastAPI app
 app = FastAPI(
     title="Pennwest Connect API",
     description="API for Pennwest Connect - A platform for students to share notes",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware - get origins at startup
@@ -63,6 +93,50 @@ app.add_middleware(
 # Include routers
 app.include_router(auth.router)
 app.include_router(notes.router)
+app.include_router(live.router)
+
+# Profiling endpoints are off unless explicitly enabled
+from config import PROFILING_ENABLED
+if PROFILING_ENABLED:
+    from routes import admin
+    app.include_router(admin.router)
+
+# Prometheus metrics and per-request SQL stats (after the routers, so every
+# route gets a latency series)
+from config import METRICS_ENABLED, DB_STATS_HEADER
+if METRICS_ENABLED or DB_STATS_HEADER:
+    import metrics
+    metrics.install(app, db_stats_header=DB_STATS_HEADER)
+
+# Request tracing: sampled requests get spans and a Server-Timing header
+from tracing import TracingMiddleware
+app.add_middleware(TracingMiddleware)
+
+# Request method/route (and trace id) on log records; outermost, so the
+# access log line is covered too
+app.add_middleware(LogContextMiddleware)
+
+if METRICS_ENABLED:
+    import hmac
+    from typing import Optional
+    from fastapi import Depends, Header, HTTPException, status
+    from fastapi.responses import PlainTextResponse
+    from auth import get_admin_user
+    from config import METRICS_TOKEN
+    
+    if METRICS_TOKEN:
+        def metrics_access(authorization: Optional[str] = Header(None)):
+            """Scrapers send ``Authorization: Bearer <METRICS_TOKEN>``."""
+            expected = f"Bearer {METRICS_TOKEN}".encode()
+            if not hmac.compare_digest((authorization or "").encode(), expected):
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    else:
+        metrics_access = get_admin_user
+    
+    @app.get("/metrics", include_in_schema=False, dependencies=[Depends(metrics_access)])
+    def get_metrics():
+        """Request, storage, connection pool and live update metrics for Prometheus."""
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # Root endpoint
 @app.get("/")
@@ -85,17 +159,21 @@ def health_check():
 def health_check_db():
     """Check database connection."""
     try:
-        from database import engine
+        from database import engine, replicas
         from sqlalchemy import text
         
         # Try to connect to database
         with engine.connect() as conn:
             conn.execute(text("SELECT 1"))
         
-        return {
+        result = {
             "status": "healthy",
             "database": "connected"
         }
+        if replicas is not None:
+            # As of the last background check; reads fall back to the primary
+            result["replicas"] = replicas.status()
+        return result
     except Exception as e:
         logger.error(f"Database health check failed: {e}")
         return {
@@ -104,9 +182,26 @@ def health_check_db():
             "error": str(e)
         }, 503
 
+# Background job queue health endpoint
+@app.get("/health/jobs")
+def health_check_jobs():
+    """Report job queue depth, latency and worker metrics."""
+    from jobs import job_queue, JobQueue
+    from database import SessionLocal
+    
+    queue = job_queue or JobQueue(SessionLocal, workers=0)
+    try:
+        return {"status": "healthy", **queue.stats()}
+    except Exception as e:
+        logger.error(f"Job queue health check failed: {e}")
+        return {"status": "unhealthy", "error": str(e)}
+
 if __name__ == "__main__":
     import uvicorn
     # Railway provides PORT environment variable - use it if available
     port = int(os.getenv("PORT", PORT))
-    logger.info(f"Starting server on {HOST}:{port}")
-    uvicorn.run(app, host=HOST, port=port, log_level="info")
+    logger.info("Starting server on %s:%d", HOST, port)
+    # Live update streams stay open until the client leaves, so don't wait
+    # on them forever when shutting down
+    # log_config=None: uvicorn's own loggers go through the root logger's queue
+    uvicorn.run(app, host=HOST, port=port, log_level="info", log_config=None, timeout_graceful_shutdown=30)
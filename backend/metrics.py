@@ -0,0 +1,346 @@
+"""Prometheus metrics, served in the text exposition format at ``/metrics``.
+
+``MetricsMiddleware`` is a plain ASGI middleware (no per-request task or
+``BaseHTTPMiddleware`` body copying) that records, per route template:
+
+- ``http_requests_total{method,route,status}``
+- ``http_request_duration_seconds{method,route}`` (histogram, until the
+  response body is sent, so it covers a whole live update stream)
+- ``http_requests_in_flight``
+- ``http_request_db_queries{method,route}`` and ``http_request_db_seconds``
+  (histograms of the SQL statements each request ran, counted by the engine
+  hooks in database.py)
+
+Storage backends report ``storage_operation_duration_seconds``,
+``storage_operation_errors_total`` and ``storage_bytes_total`` per backend
+and operation (storage.py).  Connection pool and live update gauges are read
+when ``/metrics`` is scraped.
+
+Metrics are kept per process.  With several uvicorn workers, scrape each
+one; the Procfile runs a single process.
+
+Metrics are off unless ``METRICS_ENABLED`` is set.  ``/metrics`` then needs
+``Authorization: Bearer <METRICS_TOKEN>``, or an admin's login when no token
+is configured, since route names, error rates and pool sizes are not public.
+
+The cost is not free.  In ``benchmarks/bench_metrics.py`` (three runs) the
+middleware's own work is 2.4-3.2 us per request, 1.3-1.7% of ``/health``
+and 0.1% of a 20-note ``/api/notes/global`` page.  End to end, the A/B
+throughput loss measured 4.5-4.9% on ``/health``, with one noisy run at
+14%, and between -1.0% and +3.2% on the page.  The end-to-end numbers are
+noisier than the isolated cost; budget about 5% for the cheapest routes.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+STORAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+UNMATCHED_ROUTE = "unmatched"  # 404s and preflights: one series, not one per URL
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """A monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels: tuple = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    """A value per label set that goes up and down."""
+
+    kind = "gauge"
+
+    def dec(self, labels: tuple = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    """Observation counts in cumulative ``le`` buckets, plus their sum, per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (the last is +Inf, not cumulative)..., sum]
+        self._values: Dict[tuple, list] = {}
+
+    def _series(self, labels: tuple) -> list:
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+        return series
+
+    def declare(self, labels: tuple) -> None:
+        """Export a label set at zero before anything is observed."""
+        with self._lock:
+            self._series(labels)
+
+    def observe(self, labels: tuple, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series(labels)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, labels: tuple = ()) -> int:
+        series = self._values.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(labels, list(series)) for labels, series in self._values.items()]
+        lines = self._header()
+        for labels, series in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status"))
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route"))
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests being handled.")
+http_request_queries = Histogram(
+    "http_request_db_queries", "SQL statements run per HTTP request.", ("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS)
+http_request_db_duration = Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per HTTP request.", ("method", "route"))
+
+storage_duration = Histogram(
+    "storage_operation_duration_seconds", "File storage operation latency.", ("backend", "operation"),
+    buckets=STORAGE_BUCKETS)
+storage_errors = Counter(
+    "storage_operation_errors_total", "File storage operations that raised.", ("backend", "operation"))
+storage_bytes = Counter(
+    "storage_bytes_total", "Bytes written to or read from file storage.", ("backend", "direction"))
+
+# The middleware updates all the HTTP metrics of a request under one lock
+_http_lock = threading.Lock()
+for _metric in (http_requests, http_request_duration, http_in_flight, http_request_queries,
+                http_request_db_duration):
+    _metric._lock = _http_lock
+http_in_flight._values[()] = 0
+
+_registry: List[_Metric] = [
+    http_requests, http_request_duration, http_in_flight, http_request_queries, http_request_db_duration,
+    storage_duration, storage_errors, storage_bytes,
+]
+# Gauges computed at scrape time: name -> (help, callable returning {labels: value}, label names)
+_collectors: Dict[str, Tuple[str, Callable[[], Dict[tuple, float]], Tuple[str, ...]]] = {}
+
+
+def register_collector(name: str, documentation: str, collect: Callable[[], Dict[tuple, float]],
+                       labelnames: Iterable[str] = ()) -> None:
+    """Add a gauge whose values ``collect()`` reads when ``/metrics`` is scraped."""
+    _collectors[name] = (documentation, collect, tuple(labelnames))
+
+
+def observe_storage(backend: str, operation: str, seconds: float,
+                    written: int = 0, read: int = 0, error: bool = False) -> None:
+    storage_duration.observe((backend, operation), seconds)
+    if error:
+        storage_errors.inc((backend, operation))
+    if written:
+        storage_bytes.inc((backend, "written"), written)
+    if read:
+        storage_bytes.inc((backend, "read"), read)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for name, (documentation, collect, labelnames) in _collectors.items():
+        try:
+            values = collect()
+        except Exception:
+            continue
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(
+            f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}" for labels, value in values.items()
+        )
+    return "\n".join(lines) + "\n"
+
+
+class _RouteSeries:
+    """One method and route's HTTP series, looked up once and updated in place."""
+
+    __slots__ = ("route", "labels", "duration", "queries", "db_duration", "statuses")
+
+    def __init__(self, method: str, route):
+        self.route = route  # Keeps the id() the middleware caches this under in use
+        self.labels = labels = (method, getattr(route, "path", None) or UNMATCHED_ROUTE)
+        with _http_lock:
+            self.duration = http_request_duration._series(labels)
+            self.queries = http_request_queries._series(labels)
+            self.db_duration = http_request_db_duration._series(labels)
+        self.statuses: Dict[int, tuple] = {}  # Status code -> http_requests labels
+
+    def record(self, status_code: int, elapsed: float, queries: int, db_seconds: float) -> None:
+        status_labels = self.statuses.get(status_code)
+        if status_labels is None:
+            status_labels = self.statuses.setdefault(status_code, self.labels + (str(status_code),))
+        duration_index = bisect_left(http_request_duration.buckets, elapsed)
+        queries_index = bisect_left(http_request_queries.buckets, queries)
+        db_index = bisect_left(http_request_db_duration.buckets, db_seconds)
+        requests = http_requests._values
+        with _http_lock:
+            http_in_flight._values[()] -= 1
+            requests[status_labels] = requests.get(status_labels, 0) + 1
+            self.duration[duration_index] += 1
+            self.duration[-1] += elapsed
+            self.queries[queries_index] += 1
+            self.queries[-1] += queries
+            self.db_duration[db_index] += 1
+            self.db_duration[-1] += db_seconds
+
+
+class MetricsMiddleware:
+    """Records request counts, latency, concurrency and SQL statements per route template.
+
+    With ``db_stats_header``, responses also carry ``X-DB-Queries`` and
+    ``X-DB-Time`` (milliseconds) for the statements run before they started.
+    """
+
+    def __init__(self, app, db_stats_header: bool = False):
+        from database import start_query_stats
+
+        self.app = app
+        self.db_stats_header = db_stats_header
+        self.start_query_stats = start_query_stats
+        self._routes: Dict[tuple, _RouteSeries] = {}  # (method, id(route)) -> its series
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500  # Unless a response starts before an exception
+        query_stats = self.start_query_stats(scope)
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.db_stats_header:
+                    message.setdefault("headers", []).extend([
+                        (b"x-db-queries", str(query_stats.count).encode()),
+                        (b"x-db-time", f"{query_stats.seconds * 1000:.1f}".encode()),
+                    ])
+            await send(message)
+
+        in_flight = http_in_flight._values
+        with _http_lock:
+            in_flight[()] += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            # The router stores the matched route in the shared scope
+            route = scope.get("route")
+            key = (scope["method"], id(route))
+            series = self._routes.get(key)
+            if series is None:
+                series = self._routes[key] = _RouteSeries(scope["method"], route)
+            series.record(status_code, elapsed, query_stats.count, query_stats.seconds)
+
+
+def _pool_gauges(engine) -> Dict[tuple, float]:
+    pool = engine.pool
+    values = {}
+    for state in ("size", "checkedin", "checkedout", "overflow"):
+        read = getattr(pool, state, None)
+        if read is not None:
+            values[(state,)] = read()
+    if ("overflow",) in values:
+        # QueuePool counts overflow up from -size; report connections beyond the pool
+        values[("overflow",)] = max(0, values[("overflow",)])
+    return values
+
+
+def install(app, db_stats_header: bool = False) -> None:
+    """Add the middleware and declare a latency series for every route of ``app``."""
+    from database import engine, read_engine, replicas
+    from live import hub
+
+    app.add_middleware(MetricsMiddleware, db_stats_header=db_stats_header)
+    for route in app.routes:
+        for method in sorted(getattr(route, "methods", None) or ()):
+            if method != "HEAD":
+                http_request_duration.declare((method, route.path))
+
+    register_collector("db_pool_connections", "SQLAlchemy connection pool state.",
+                       lambda: _pool_gauges(engine), ("state",))
+    if read_engine is not None:
+        register_collector("db_read_pool_connections", "Read-only SQLite connection pool state (SQLITE_TUNED).",
+                           lambda: _pool_gauges(read_engine), ("state",))
+    if replicas is not None:
+        register_collector("db_replica_lag_seconds", "Read replica lag at the last check (-1 if unreachable).",
+                           lambda: replicas.gauges("lag"), ("replica",))
+        register_collector("db_replica_healthy", "Whether a read replica is in rotation.",
+                           lambda: replicas.gauges("healthy"), ("replica",))
+    register_collector("live_subscribers", "Open live update streams.",
+                       lambda: {(): hub.subscribers})
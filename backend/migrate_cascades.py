@@ -0,0 +1,149 @@
+"""Migration script to add ON DELETE CASCADE to foreign keys.
+
+Older databases were created with plain foreign keys, relying on the ORM to
+load and delete every like and comment before deleting a note.  The models
+now declare ``ondelete="CASCADE"`` with passive deletes, so the database must
+enforce the cascade itself.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateTable
+
+logger = logging.getLogger(__name__)
+
+
+def _expected_cascades(metadata):
+    """Map table name -> {column: referred table} for cascading foreign keys."""
+    expected = {}
+    for table in metadata.sorted_tables:
+        for fk in table.foreign_keys:
+            if (fk.ondelete or "").upper() == "CASCADE":
+                expected.setdefault(table.name, {})[fk.parent.name] = fk.column.table.name
+    return expected
+
+
+def _sqlite_tables_needing_rebuild(conn, expected, existing_tables):
+    """Find SQLite tables whose foreign keys do not cascade yet."""
+    tables = []
+    for table_name, columns in expected.items():
+        if table_name not in existing_tables:
+            continue
+        rows = conn.execute(text(f"PRAGMA foreign_key_list({table_name})")).mappings().all()
+        cascading = {row["from"] for row in rows if row["on_delete"].upper() == "CASCADE"}
+        if not set(columns) <= cascading:
+            tables.append(table_name)
+    return tables
+
+
+def _rebuild_sqlite_table(conn, table):
+    """
+    Rebuild a SQLite table from its model definition.
+
+    SQLite cannot alter foreign keys, so this follows the documented
+    procedure: create the new table under a temporary name, copy the rows,
+    drop the old table and rename the new one into place.
+    """
+    temp_name = f"_new_{table.name}"
+    existing_columns = {col["name"] for col in inspect(conn).get_columns(table.name)}
+    columns = ", ".join(col.name for col in table.columns if col.name in existing_columns)
+
+    # Index names are global in SQLite, so drop the old ones before recreating
+    for index in inspect(conn).get_indexes(table.name):
+        if index["name"] and not index["name"].startswith("sqlite_autoindex"):
+            conn.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+
+    create_sql = str(CreateTable(table).compile(dialect=conn.dialect))
+    create_sql = create_sql.replace(f"CREATE TABLE {table.name} (", f'CREATE TABLE "{temp_name}" (', 1)
+    conn.execute(text(create_sql))
+    conn.execute(text(f'INSERT INTO "{temp_name}" ({columns}) SELECT {columns} FROM "{table.name}"'))
+    conn.execute(text(f'DROP TABLE "{table.name}"'))
+    conn.execute(text(f'ALTER TABLE "{temp_name}" RENAME TO "{table.name}"'))
+    for index in table.indexes:
+        index.create(conn)
+
+
+def _migrate_sqlite(engine, metadata, expected):
+    existing_tables = set(inspect(engine).get_table_names())
+    # Foreign keys must be off while tables are swapped; the pragma is a
+    # no-op inside a transaction, so set it before BEGIN.  ``explicit_begin``
+    # keeps tuned mode's BEGIN IMMEDIATE hook (database.py) out of the way.
+    with engine.connect() as conn:
+        conn.execution_options(explicit_begin=True)
+        conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        conn.commit()
+        try:
+            with conn.begin():
+                # pysqlite does not open a transaction before DDL on its own
+                conn.exec_driver_sql("BEGIN")
+                tables = _sqlite_tables_needing_rebuild(conn, expected, existing_tables)
+                if not tables:
+                    logger.info("Foreign keys already cascade. Migration not needed.")
+                    return
+                for table_name in tables:
+                    logger.info("Rebuilding %s with ON DELETE CASCADE foreign keys...", table_name)
+                    _rebuild_sqlite_table(conn, metadata.tables[table_name])
+                violations = conn.execute(text("PRAGMA foreign_key_check")).all()
+                if violations:
+                    logger.warning("%d orphaned rows reference deleted records", len(violations))
+        finally:
+            conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+            conn.commit()
+    logger.info("Cascade migration completed successfully!")
+
+
+def _migrate_postgres(engine, expected):
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    alter_statements = []
+    validate_statements = []
+    for table_name, columns in expected.items():
+        if table_name not in existing_tables:
+            continue
+        for fk in inspector.get_foreign_keys(table_name):
+            if len(fk["constrained_columns"]) != 1:
+                continue
+            column = fk["constrained_columns"][0]
+            if column not in columns:
+                continue
+            if (fk["options"].get("ondelete") or "").upper() == "CASCADE":
+                continue
+            name = fk["name"]
+            alter_statements.extend([
+                f'ALTER TABLE "{table_name}" DROP CONSTRAINT "{name}"',
+                f'ALTER TABLE "{table_name}" ADD CONSTRAINT "{name}" '
+                f'FOREIGN KEY ("{column}") REFERENCES "{fk["referred_table"]}" (id) '
+                f'ON DELETE CASCADE NOT VALID',
+            ])
+            validate_statements.append(f'ALTER TABLE "{table_name}" VALIDATE CONSTRAINT "{name}"')
+
+    if not alter_statements:
+        logger.info("Foreign keys already cascade. Migration not needed.")
+        return
+
+    with engine.begin() as conn:
+        for statement in alter_statements:
+            conn.execute(text(statement))
+    # Validating separately checks existing rows without holding the
+    # exclusive lock taken by ALTER TABLE ... ADD CONSTRAINT
+    for statement in validate_statements:
+        with engine.begin() as conn:
+            conn.execute(text(statement))
+    logger.info("Cascade migration completed successfully!")
+
+
+def migrate():
+    """Convert existing foreign keys to ON DELETE CASCADE if needed."""
+    from database import engine, Base
+    import models  # noqa: F401 - registers tables with Base
+
+    expected = _expected_cascades(Base.metadata)
+    if engine.dialect.name == "sqlite":
+        _migrate_sqlite(engine, Base.metadata, expected)
+    elif engine.dialect.name == "postgresql":
+        _migrate_postgres(engine, expected)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    migrate()
@@ -1,5 +1,5 @@
 """Database models."""
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, Float, ForeignKey, UniqueConstraint, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -14,7 +14,7 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
-    notes = relationship("Note", back_populates="author", cascade="all, delete-orphan")
+    notes = relationship("Note", back_populates="author", cascade="all, delete-orphan", passive_deletes=True)
 
 class Note(Base):
     """Note model."""
@@ -25,28 +25,37 @@ class Note(Base):
     class_name = Column(String, index=True, nullable=False)
     description = Column(String)
     file_path = Column(String, nullable=False)
-    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     author = relationship("User", back_populates="notes")
-    likes = relationship("Like", back_populates="note", cascade="all, delete-orphan")
-    comments = relationship("Comment", back_populates="note", cascade="all, delete-orphan")
+    # Likes, comments and stats are removed by ON DELETE CASCADE in the database,
+    # so deleting a note never loads them into the session
+    likes = relationship("Like", back_populates="note", cascade="all, delete-orphan", passive_deletes=True)
+    comments = relationship("Comment", back_populates="note", cascade="all, delete-orphan", passive_deletes=True)
+    stats = relationship("NoteStats", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    thumbnail = relationship("NoteThumbnail", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    content = relationship("NoteContent", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    signature = relationship("NoteSignature", uselist=False, foreign_keys="NoteSignature.note_id",
+                             cascade="all, delete-orphan", passive_deletes=True)
 
 class Like(Base):
     """Like model for notes."""
     __tablename__ = "likes"
     
     id = Column(Integer, primary_key=True, index=True)
-    note_id = Column(Integer, ForeignKey("notes.id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     note = relationship("Note", back_populates="likes")
     user = relationship("User")
     
-    # Ensure one like per user per note
+    # Ensure one like per user per note; the second index serves a user's
+    # liked set (liked_sets.py) from the index alone
     __table_args__ = (
         UniqueConstraint('note_id', 'user_id', name='unique_like'),
+        Index('ix_likes_user_note', 'user_id', 'note_id'),
     )
 
 class Comment(Base):
@@ -54,10 +63,127 @@ class Comment(Base):
     __tablename__ = "comments"
     
     id = Column(Integer, primary_key=True, index=True)
-    note_id = Column(Integer, ForeignKey("notes.id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     content = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     note = relationship("Note", back_populates="comments")
     user = relationship("User")
+    
+    # A note's comment thread is read in pages, oldest first, by keyset on this index
+    __table_args__ = (
+        Index('ix_comments_note_created_id', 'note_id', 'created_at', 'id'),
+    )
+
+class NoteStats(Base):
+    """Denormalized per-note counters, maintained by the counters module."""
+    __tablename__ = "note_stats"
+    
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    like_count = Column(Integer, default=0, nullable=False)
+    preview_count = Column(Integer, default=0, nullable=False)
+    download_count = Column(Integer, default=0, nullable=False)
+
+class NoteThumbnail(Base):
+    """Generated WebP thumbnail for a note, stored through the storage backend."""
+    __tablename__ = "note_thumbnails"
+    
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    file_path = Column(String, nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class NoteContent(Base):
+    """Normalized text extracted from a note's file, indexed for search."""
+    __tablename__ = "note_contents"
+    
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    content = Column(Text, nullable=False)
+    char_count = Column(Integer, nullable=False, default=0)
+    extracted_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+class NoteSignature(Base):
+    """MinHash or image hash of a note, used for near-duplicate detection (similarity.py)."""
+    __tablename__ = "note_signatures"
+    
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    kind = Column(String, nullable=False)  # "text" or "image"
+    signature = Column(LargeBinary, nullable=False)
+    # Earliest near-identical note in the same class; un-hidden if it is deleted
+    duplicate_of = Column(Integer, ForeignKey("notes.id", ondelete="SET NULL"), index=True)
+    computed_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class NoteRelated(Base):
+    """Precomputed co-like neighbour of a note (related.py), top-K per note."""
+    __tablename__ = "note_related"
+    
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    related_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True, index=True)
+    score = Column(Float, nullable=False)
+
+class RelatedDirty(Base):
+    """Note whose likes changed since its related notes were last computed."""
+    __tablename__ = "note_related_dirty"
+    
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+
+class NoteTrending(Base):
+    """Time-decayed trending score of a note in log space (trending.py)."""
+    __tablename__ = "note_trending"
+    
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    class_name = Column(String, nullable=False)  # Copied from the note for the per-class index
+    score = Column(Float, nullable=False)
+    
+    # A trending page, global or per class, is a range scan of one of these
+    __table_args__ = (
+        Index('ix_note_trending_score', 'score'),
+        Index('ix_note_trending_class_score', 'class_name', 'score'),
+    )
+
+class NoteChange(Base):
+    """Change-log entry for the delta feeds (changelog.py): a note was created, changed or deleted."""
+    __tablename__ = "note_changes"
+    
+    # Monotonic change version; AUTOINCREMENT so SQLite never reuses one
+    version = Column(Integer, primary_key=True)
+    # No foreign key: entries outlive deleted notes.  NULL on the compaction marker.
+    note_id = Column(Integer, index=True)
+    author_id = Column(Integer)
+    class_name = Column(String)
+    kind = Column(String, nullable=False)  # "created", "updated", "deleted" or "compacted"
+    changed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Postgres only: id of the writing transaction, which orders the feed there
+    txid = Column(BigInteger)
+    
+    # Delta feeds scan versions after the client's, globally, per class or per author
+    __table_args__ = (
+        Index('ix_note_changes_class_version', 'class_name', 'version'),
+        Index('ix_note_changes_author_version', 'author_id', 'version'),
+        Index('ix_note_changes_txid', 'txid'),
+        {"sqlite_autoincrement": True},
+    )
+
+class Job(Base):
+    """Background job, processed by the queue in jobs.py."""
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False, default="{}")
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    locked_by = Column(String)
+    last_error = Column(Text)
+    
+    # Workers look up the oldest due job by status
+    __table_args__ = (
+        Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
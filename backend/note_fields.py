@@ -0,0 +1,118 @@
+"""Sparse fieldsets and fast JSON encoding for note listings.
+
+List views rarely need a whole ``NoteResponse``.  A ``?fields=`` selection
+such as ``fields=id,title,like_count`` narrows the whole request: only the
+selected ``notes`` columns are loaded, ``users`` is joined only for the
+author fields, and count queries run only for the counts that were asked for.
+
+Listings also skip the Pydantic round trip.  Rows are built as plain dicts
+from values whose types the database already guarantees, and returned as a
+response that FastAPI passes through without validating them against
+``response_model`` a second time.  They are encoded with orjson when it is
+installed; the standard encoder is the fallback.
+"""
+import json
+from datetime import datetime
+from operator import attrgetter
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import joinedload, load_only
+
+from schemas import NoteResponse
+
+
+class _StdlibJSONResponse(JSONResponse):
+    """Compact stdlib encoding that writes datetimes as ISO 8601, like orjson."""
+
+    def render(self, content) -> bytes:
+        return json.dumps(
+            content, default=datetime.isoformat, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+try:
+    import orjson
+
+    class FastJSONResponse(JSONResponse):
+        """orjson encoding, as ``ORJSONResponse``, with the module bound here."""
+
+        def render(self, content) -> bytes:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    FastJSONResponse = _StdlibJSONResponse
+
+NOTE_FIELDS: Tuple[str, ...] = tuple(NoteResponse.model_fields)
+
+# Fields read straight from Note columns of the same name
+_COLUMN_FIELDS = ("title", "class_name", "description", "file_path", "created_at")
+# Response field -> User column attribute, through Note.author
+_AUTHOR_FIELDS = {"author_email": "email", "author_username": "username"}
+COUNT_FIELDS = ("like_count", "is_liked", "comment_count", "preview_count", "download_count")
+
+
+def parse_fields(fields: Optional[str]) -> Optional[FrozenSet[str]]:
+    """
+    Parse a comma-separated ``fields`` parameter.
+
+    Returns ``None`` (every field) when it is not given; ``id`` is always
+    included.  Unknown names are a 400.
+    """
+    if fields is None:
+        return None
+    selected = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = selected.difference(NOTE_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Available: {', '.join(NOTE_FIELDS)}"
+        )
+    selected.add("id")
+    return frozenset(selected)
+
+
+def wants(fields: Optional[FrozenSet[str]], name: str) -> bool:
+    return fields is None or name in fields
+
+
+def note_load_options(fields: Optional[FrozenSet[str]]) -> list:
+    """Loader options for a Note query that load only what ``fields`` needs."""
+    from models import Note, User
+
+    columns = [getattr(Note, name) for name in _COLUMN_FIELDS if wants(fields, name)]
+    options = [load_only(Note.id, Note.author_id, *columns)]
+    author_columns = [getattr(User, column) for name, column in _AUTHOR_FIELDS.items() if wants(fields, name)]
+    if author_columns:
+        options.append(joinedload(Note.author).load_only(*author_columns))
+    return options
+
+
+def note_getters(
+    fields: Optional[FrozenSet[str]], counts: Dict[str, Callable[[int], object]]
+) -> List[Tuple[str, Callable]]:
+    """
+    ``(field, getter)`` pairs, in ``NoteResponse`` order, for the selected fields.
+
+    ``counts`` maps each selected count field to a function of the note id.
+    Getters only touch attributes that ``note_load_options`` loaded, so
+    building a row never triggers a lazy load.
+    """
+    getters = []
+    for name in NOTE_FIELDS:
+        if not wants(fields, name):
+            continue
+        if name in _AUTHOR_FIELDS:
+            getter = attrgetter(f"author.{_AUTHOR_FIELDS[name]}")
+        elif name in counts:
+            count = counts[name]
+            getter = lambda note, count=count: count(note.id)
+        else:
+            getter = attrgetter(name)
+        getters.append((name, getter))
+    return getters
+
+
+def json_response(content, headers: Optional[Dict[str, str]] = None):
+    """A response FastAPI returns as is, encoded with orjson if available."""
+    return FastJSONResponse(content=content, headers=headers)
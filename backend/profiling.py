@@ -0,0 +1,236 @@
+"""On-demand CPU and memory profiling of a live API process.
+
+``SamplingProfiler`` is a statistical profiler: a background thread reads
+every other thread's Python stack with ``sys._current_frames()`` at a fixed
+interval (100 Hz by default) and counts identical stacks.  Nothing is hooked
+into the profiled code, so the cost is the sampling thread's own work, well
+under 1% of a core at that rate.  Profiles are returned in the folded
+("collapsed") stack format that ``flamegraph.pl``, speedscope and inferno
+read: one ``frame;frame;frame count`` line per distinct stack, outermost
+frame first and the thread name as the root.
+
+Memory snapshots use ``tracemalloc``, which is only running between
+``start_memory_tracing()`` and ``stop_memory_tracing()`` because it slows
+every allocation down while it is on.  Allocations are attributed to the most
+recent frame of their traceback in the files of interest (``routes/notes.py``
+and ``storage.py`` by default), so a ``bytes`` buffer created deep inside a
+library still shows up at the line of ours that asked for it.
+
+The endpoints are in routes/admin.py.  Each API process profiles itself, so
+with several workers the one that answers is the one profiled.
+"""
+import fnmatch
+import linecache
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_MEMORY_FILES = ("routes/notes.py", "storage.py")
+
+# Leaf frames of threads that are waiting rather than working (heuristic)
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+}
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another is running."""
+
+
+def _frame_label(frame, lines: bool) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(_BACKEND_DIR):
+        filename = os.path.relpath(filename, _BACKEND_DIR)
+    else:
+        filename = os.path.basename(filename)
+    line = frame.f_lineno if lines else code.co_firstlineno
+    return f"{code.co_name} ({filename}:{line})"
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_FRAMES
+
+
+class SamplingProfiler:
+    """Samples all threads' stacks for a fixed duration; one profile at a time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(self, seconds: float, interval: float = 0.01, lines: bool = False,
+                include_idle: bool = False) -> Tuple[str, int]:
+        """
+        Sample for ``seconds`` (blocking the calling thread) and return
+        ``(folded_stacks, samples)``.
+
+        Raises ``ProfilerBusy`` if another profile is running.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            return self._sample(seconds, interval, lines, include_idle)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float, lines: bool, include_idle: bool) -> Tuple[str, int]:
+        own_id = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        next_sample = time.monotonic()
+        while True:
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (not include_idle and _is_idle(frame)):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame, lines))
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, f"thread-{thread_id}"))
+                stacks[";".join(reversed(stack))] += 1
+            samples += 1
+            next_sample += interval
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            time.sleep(max(0.0, next_sample - now))
+        folded = "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+        return folded + "\n" if folded else "", samples
+
+
+profiler = SamplingProfiler()
+
+_memory_lock = threading.Lock()
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+def start_memory_tracing(frames: int = 25) -> bool:
+    """Start tracemalloc; False if it was already running."""
+    global _last_snapshot
+    with _memory_lock:
+        if tracemalloc.is_tracing():
+            return False
+        tracemalloc.start(frames)
+        _last_snapshot = None
+        return True
+
+
+def stop_memory_tracing() -> bool:
+    """Stop tracemalloc and free its data; False if it was not running."""
+    global _last_snapshot
+    with _memory_lock:
+        if not tracemalloc.is_tracing():
+            return False
+        tracemalloc.stop()
+        _last_snapshot = None
+        return True
+
+
+def _file_filters(files: Iterable[str]) -> List[tracemalloc.Filter]:
+    filters = [tracemalloc.Filter(True, os.path.join(_BACKEND_DIR, name), all_frames=True) for name in files]
+    # Not the snapshots' own bookkeeping
+    filters.append(tracemalloc.Filter(False, __file__, all_frames=True))
+    return filters
+
+
+def _attribute(traceback: tracemalloc.Traceback, patterns: Tuple[str, ...]) -> Optional[Tuple[str, int]]:
+    """The most recent frame of ``traceback`` in a file matching one of ``patterns``."""
+    for frame in reversed(traceback):
+        if any(fnmatch.fnmatch(frame.filename, pattern) for pattern in patterns):
+            return frame.filename, frame.lineno
+    return None
+
+
+def _line_entry(filename: str, lineno: int, size: int, count: int, **extra) -> dict:
+    return {
+        "file": os.path.relpath(filename, _BACKEND_DIR),
+        "line": lineno,
+        "source": linecache.getline(filename, lineno).strip(),
+        "size_kb": round(size / 1024, 1),
+        "count": count,
+        **extra,
+    }
+
+
+def _take_snapshot(files: Iterable[str]) -> Tuple[tracemalloc.Snapshot, Tuple[str, ...]]:
+    files = tuple(files)
+    snapshot = tracemalloc.take_snapshot().filter_traces(_file_filters(files))
+    return snapshot, tuple(os.path.join(_BACKEND_DIR, pattern) for pattern in files)
+
+
+def memory_snapshot(files: Iterable[str] = DEFAULT_MEMORY_FILES, limit: int = 25) -> dict:
+    """
+    Live allocations made from ``files``, by line, largest first.
+
+    ``files`` are paths relative to the backend directory and may be
+    ``fnmatch`` patterns (``*`` is every backend module).
+
+    The snapshot becomes the baseline for the next ``memory_diff``.
+    Raises ``RuntimeError`` if tracing is not running.
+    """
+    global _last_snapshot
+    with _memory_lock:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Memory tracing is not running")
+        snapshot, patterns = _take_snapshot(files)
+        _last_snapshot = snapshot
+
+    by_line: Dict[Tuple[str, int], List[int]] = {}
+    for stat in snapshot.statistics("traceback"):
+        where = _attribute(stat.traceback, patterns)
+        if where is not None:
+            totals = by_line.setdefault(where, [0, 0])
+            totals[0] += stat.size
+            totals[1] += stat.count
+    top = sorted(by_line.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "traced_kb": round(current / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+        "lines": [_line_entry(filename, lineno, size, count) for (filename, lineno), (size, count) in top],
+    }
+
+
+def memory_diff(files: Iterable[str] = DEFAULT_MEMORY_FILES, limit: int = 25) -> dict:
+    """
+    Change in live allocations from ``files`` since the last snapshot or diff, by line.
+
+    Raises ``RuntimeError`` if tracing is not running or there is no earlier snapshot.
+    """
+    global _last_snapshot
+    with _memory_lock:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Memory tracing is not running")
+        if _last_snapshot is None:
+            raise RuntimeError("Take a snapshot first")
+        snapshot, patterns = _take_snapshot(files)
+        previous, _last_snapshot = _last_snapshot, snapshot
+
+    by_line: Dict[Tuple[str, int], List[int]] = {}
+    for stat in snapshot.compare_to(previous, "traceback"):
+        where = _attribute(stat.traceback, patterns)
+        if where is not None:
+            totals = by_line.setdefault(where, [0, 0, 0])
+            totals[0] += stat.size_diff
+            totals[1] += stat.count_diff
+            totals[2] += stat.size
+    top = sorted(by_line.items(), key=lambda item: abs(item[1][0]), reverse=True)[:limit]
+    return {
+        "lines": [
+            _line_entry(filename, lineno, size_diff, count_diff, total_kb=round(size / 1024, 1))
+            for (filename, lineno), (size_diff, count_diff, size) in top
+            if size_diff or count_diff
+        ],
+    }
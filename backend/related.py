@@ -0,0 +1,410 @@
+"""Related-notes recommendations from co-likes.
+
+Two notes are related when the same people like them.  Treating the
+``likes`` table as a binary user x note matrix ``X``, the similarity of
+notes ``i`` and ``j`` is the cosine of their columns,
+
+    sim(i, j) = |likers(i) & likers(j)| / sqrt(|likers(i)| * |likers(j)|)
+
+and the top ``RELATED_TOP_K`` neighbours of every note are kept in
+``note_related``.
+
+``rebuild()`` computes the whole table with SciPy sparse products, a block
+of notes at a time (``X[:, block].T @ X``), so memory stays bounded by a
+block's co-like pairs.  Between rebuilds, ``toggle_like`` marks the note in
+``note_related_dirty`` and schedules a debounced ``refresh_related`` job.
+The refresh recomputes the dirty notes' rows from just their likers' likes
+and rewrites the reverse entries ``(j, i)``, since a like on ``i`` changes
+only the scores of pairs that include ``i``.
+
+Run ``python related.py --rebuild`` for the full batch job.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.orm import Session
+
+try:
+    from config import RELATED_TOP_K, RELATED_REFRESH_INTERVAL
+except ImportError:
+    RELATED_TOP_K = 20
+    RELATED_REFRESH_INTERVAL = 60.0
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    from scipy import sparse
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+    logger.warning("NumPy/SciPy not installed. Related notes will use class popularity only.")
+
+_BLOCK_MAX_PAIRS = 5_000_000  # Co-like pairs per sparse product in rebuild()
+_INSERT_CHUNK_SIZE = 5000
+_MAX_REVERSE_ENTRIES = 5000  # Reverse entries rewritten per refreshed note
+# Users with more likes than this are left out: they add little signal (they
+# like everything) and their likes cost O(n^2) co-like pairs
+_MAX_USER_LIKES = 1000
+
+
+def _like_matrix(user_ids: "np.ndarray", note_ids: "np.ndarray"):
+    """
+    Build the binary CSC like matrix for ``(user_id, note_id)`` pairs.
+
+    Returns ``(matrix, note_index)`` where column ``c`` is note
+    ``note_index[c]``.  Users over ``_MAX_USER_LIKES`` are dropped.
+    """
+    _, rows, user_likes = np.unique(user_ids, return_inverse=True, return_counts=True)
+    keep = user_likes[rows] <= _MAX_USER_LIKES
+    note_ids, user_ids = note_ids[keep], user_ids[keep]
+    note_index, columns = np.unique(note_ids, return_inverse=True)
+    _, rows = np.unique(user_ids, return_inverse=True)
+    matrix = sparse.csc_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+        shape=(rows.max() + 1 if len(rows) else 0, len(note_index)),
+    )
+    return matrix, note_index
+
+
+def _note_degrees(matrix, note_index: "np.ndarray", like_counts: Optional["np.ndarray"]) -> "np.ndarray":
+    """
+    Degrees for the cosine: each note's ``note_stats.like_count``, aligned
+    with ``note_index``, or its likers in ``matrix`` where that is more
+    (counters can trail the likes table).  ``rebuild`` and ``refresh_notes``
+    both score with these, so refreshed rows match a full rebuild.
+    """
+    degrees = np.asarray(matrix.sum(axis=0)).ravel()
+    if like_counts is not None:
+        degrees = np.maximum(degrees, like_counts)
+    return degrees
+
+
+def _load_like_counts(db: Session, note_index: "np.ndarray") -> "np.ndarray":
+    """``note_stats.like_count`` for each of the sorted ``note_index`` (0 without a row)."""
+    from models import NoteStats
+
+    counts = np.zeros(len(note_index), dtype=np.float64)
+    for start in range(0, len(note_index), 500):
+        chunk = note_index[start:start + 500]
+        rows = db.execute(
+            select(NoteStats.note_id, NoteStats.like_count).where(NoteStats.note_id.in_(chunk.tolist()))
+        ).all()
+        if rows:
+            ids, like_counts = np.array(rows, dtype=np.int64).T
+            counts[start + np.searchsorted(chunk, ids)] = like_counts
+    return counts
+
+
+def top_k_neighbours(
+    co_likes,
+    row_degrees: "np.ndarray",
+    col_degrees: "np.ndarray",
+    row_ids: "np.ndarray",
+    col_ids: "np.ndarray",
+    k: int,
+) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """
+    Turn a block of co-like counts into each row's top-``k`` cosine neighbours.
+
+    ``co_likes`` is a sparse ``(rows, cols)`` count matrix.  Returns flat
+    ``(note_ids, related_ids, scores)`` arrays, unordered within a note.
+    Scores are computed for the whole block at once; rows with more than
+    ``k`` entries are cut with ``argpartition``, which is linear in the row.
+    """
+    co_likes = sparse.csr_matrix(co_likes)
+    rows = np.repeat(np.arange(co_likes.shape[0]), np.diff(co_likes.indptr))
+    cols = co_likes.indices
+    keep = row_ids[rows] != col_ids[cols]
+    rows, cols = rows[keep], cols[keep]
+    scores = co_likes.data[keep] / np.sqrt(row_degrees[rows] * col_degrees[cols])
+
+    # rows is still sorted, so each row is a contiguous slice
+    lengths = np.bincount(rows, minlength=co_likes.shape[0])
+    offsets = np.r_[0, np.cumsum(lengths)]
+    selected = [np.flatnonzero(lengths[rows] <= k)]
+    for row in np.flatnonzero(lengths > k):
+        lo, hi = offsets[row], offsets[row + 1]
+        selected.append(lo + np.argpartition(-scores[lo:hi], k - 1)[:k])
+    top = np.concatenate(selected)
+    return row_ids[rows[top]], col_ids[cols[top]], scores[top].astype(np.float32)
+
+
+def compute_related(
+    user_ids: "np.ndarray",
+    note_ids: "np.ndarray",
+    k: int = RELATED_TOP_K,
+    max_pairs: int = _BLOCK_MAX_PAIRS,
+    like_counts: Optional[Callable[["np.ndarray"], "np.ndarray"]] = None,
+) -> Iterable[Tuple["np.ndarray", "np.ndarray", "np.ndarray"]]:
+    """
+    Yield top-``k`` neighbour arrays for every liked note, one block at a time.
+
+    Blocks are sized by work, not note count: a note's row of ``X.T @ X``
+    has at most as many entries as its likers have likes in total, so
+    blocks are cut where that running total crosses ``max_pairs``.  A few
+    popular notes fill a block on their own; thousands of niche notes share
+    one.
+
+    ``like_counts(note_index)`` gives the liked notes' ``note_stats.like_count``
+    for their degrees (see ``_note_degrees``); without it, only the likes
+    passed in are counted.
+    """
+    matrix, note_index = _like_matrix(user_ids, note_ids)
+    if matrix.nnz == 0:
+        return  # No likes, or only from users over _MAX_USER_LIKES
+    degrees = _note_degrees(matrix, note_index, like_counts(note_index) if like_counts else None)
+    by_note = matrix.T.tocsr()  # Notes x users, for slicing blocks of notes
+    all_users = matrix.tocsr()
+    user_degrees = np.asarray(all_users.sum(axis=1)).ravel()
+    row_pairs = np.cumsum(by_note @ user_degrees)
+    bounds = np.searchsorted(row_pairs, np.arange(max_pairs, row_pairs[-1], max_pairs), side="right")
+    bounds = np.unique(np.r_[0, bounds, len(note_index)])
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if start == end:
+            continue
+        co_likes = by_note[start:end] @ all_users
+        yield top_k_neighbours(
+            co_likes, degrees[start:end], degrees, note_index[start:end], note_index, k
+        )
+
+
+def _insert_rows(db: Session, note_ids, related_ids, scores) -> None:
+    from models import NoteRelated
+
+    rows = [
+        {"note_id": int(n), "related_id": int(r), "score": float(s)}
+        for n, r, s in zip(note_ids, related_ids, scores)
+    ]
+    for start in range(0, len(rows), _INSERT_CHUNK_SIZE):
+        db.execute(NoteRelated.__table__.insert(), rows[start:start + _INSERT_CHUNK_SIZE])
+
+
+def _load_likes(db: Session, batch_size: int = 100_000) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Stream the likes table into two int arrays."""
+    from models import Like
+
+    user_chunks, note_chunks = [], []
+    result = db.execute(select(Like.user_id, Like.note_id).execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        pairs = np.array(partition, dtype=np.int64).reshape(-1, 2)
+        user_chunks.append(pairs[:, 0])
+        note_chunks.append(pairs[:, 1])
+    if not user_chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(user_chunks), np.concatenate(note_chunks)
+
+
+def rebuild(db: Session, k: int = RELATED_TOP_K) -> int:
+    """Recompute ``note_related`` for every note from the likes table."""
+    from models import NoteRelated, RelatedDirty
+
+    started = time.perf_counter()
+    user_ids, note_ids = _load_likes(db)
+    loaded = time.perf_counter()
+
+    db.execute(delete(NoteRelated))
+    db.execute(delete(RelatedDirty))
+    written = 0
+    if len(note_ids):
+        for block in compute_related(user_ids, note_ids, k,
+                                     like_counts=lambda note_index: _load_like_counts(db, note_index)):
+            _insert_rows(db, *block)
+            written += len(block[0])
+    db.commit()
+    logger.info("Rebuilt related notes from %d likes: %d rows (load %.1fs, compute+write %.1fs)",
+                len(note_ids), written, loaded - started, time.perf_counter() - loaded)
+    return written
+
+
+def mark_dirty(db: Session, note_ids: Iterable[int]) -> None:
+    """Flag notes whose likes changed for the next refresh (caller commits)."""
+    from models import RelatedDirty
+
+    note_ids = list(note_ids)
+    if not note_ids:
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    for start in range(0, len(note_ids), 500):
+        db.execute(insert(RelatedDirty).values([
+            {"note_id": note_id} for note_id in note_ids[start:start + 500]
+        ]).on_conflict_do_nothing(index_elements=[RelatedDirty.note_id]))
+
+
+_schedule_lock = threading.Lock()
+_last_scheduled = float("-inf")
+
+
+def schedule_refresh() -> None:
+    """Queue a refresh at most once per ``RELATED_REFRESH_INTERVAL`` from this process."""
+    global _last_scheduled
+    from jobs import enqueue_now
+
+    now = time.monotonic()
+    with _schedule_lock:
+        if now - _last_scheduled < RELATED_REFRESH_INTERVAL:
+            return
+        _last_scheduled = now
+    try:
+        enqueue_now("refresh_related", delay=RELATED_REFRESH_INTERVAL)
+    except Exception as e:
+        # The next like will schedule it; dirty notes stay flagged meanwhile
+        with _schedule_lock:
+            _last_scheduled = float("-inf")
+        logger.warning("Could not schedule related notes refresh: %s", e)
+
+
+def _trim(db: Session, note_ids: Sequence[int], k: int) -> None:
+    """Cut the neighbour lists of ``note_ids`` back to their best ``k``."""
+    from models import NoteRelated
+
+    for start in range(0, len(note_ids), 500):
+        rows = db.execute(
+            select(NoteRelated.note_id, NoteRelated.related_id)
+            .where(NoteRelated.note_id.in_(note_ids[start:start + 500]))
+            .order_by(NoteRelated.note_id, NoteRelated.score.desc(), NoteRelated.related_id)
+        ).all()
+        surplus, counts = [], {}
+        for note_id, related_id in rows:
+            counts[note_id] = counts.get(note_id, 0) + 1
+            if counts[note_id] > k:
+                surplus.append((note_id, related_id))
+        for chunk in range(0, len(surplus), 500):
+            db.execute(delete(NoteRelated).where(
+                tuple_(NoteRelated.note_id, NoteRelated.related_id).in_(surplus[chunk:chunk + 500])
+            ))
+
+
+def refresh_notes(db: Session, note_ids: Sequence[int], k: int = RELATED_TOP_K) -> int:
+    """
+    Recompute the neighbours of ``note_ids`` and the reverse entries pointing at them.
+
+    Only the likes of users who liked these notes are read.  Degrees come
+    from ``note_stats.like_count``, as in ``rebuild``.  Caller commits.  Returns the number of
+    rows written.
+    """
+    from models import Like, NoteRelated
+
+    note_ids = sorted(set(note_ids))
+    if not note_ids:
+        return 0
+    likers = db.execute(select(Like.user_id).where(Like.note_id.in_(note_ids)).distinct()).scalars().all()
+    db.execute(delete(NoteRelated).where(NoteRelated.note_id.in_(note_ids)))
+    db.execute(delete(NoteRelated).where(NoteRelated.related_id.in_(note_ids)))
+    if not likers:
+        return 0
+
+    pairs = []
+    for start in range(0, len(likers), 500):
+        pairs.extend(db.execute(
+            select(Like.user_id, Like.note_id).where(Like.user_id.in_(likers[start:start + 500]))
+        ).all())
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    matrix, note_index = _like_matrix(pairs[:, 0], pairs[:, 1])
+
+    col_degrees = _note_degrees(matrix, note_index, _load_like_counts(db, note_index))
+
+    dirty_columns = np.flatnonzero(np.isin(note_index, note_ids))
+    co_likes = matrix[:, dirty_columns].T.tocsr() @ matrix.tocsr()
+    dirty_ids, related_ids, scores = top_k_neighbours(
+        co_likes, col_degrees[dirty_columns], col_degrees,
+        note_index[dirty_columns], note_index, k,
+    )
+    _insert_rows(db, dirty_ids, related_ids, scores)
+
+    # Reverse entries (j, i) for every j co-liked with a dirty note i, then
+    # trim each j back to its top k
+    rev_notes, rev_related, rev_scores = top_k_neighbours(
+        co_likes, col_degrees[dirty_columns], col_degrees,
+        note_index[dirty_columns], note_index, _MAX_REVERSE_ENTRIES,
+    )
+    keep = ~np.isin(rev_related, note_ids)  # Dirty rows were written above
+    _insert_rows(db, rev_related[keep], rev_notes[keep], rev_scores[keep])
+    _trim(db, np.unique(rev_related[keep]).tolist(), k)
+    return len(dirty_ids) + int(keep.sum())
+
+
+def refresh_dirty(batch_size: int = 200) -> int:
+    """Refresh every note flagged by ``mark_dirty``; returns notes refreshed."""
+    from database import SessionLocal
+    from models import RelatedDirty
+
+    if not SCIPY_AVAILABLE:
+        return 0
+    refreshed = 0
+    db = SessionLocal()
+    try:
+        while True:
+            note_ids = db.execute(select(RelatedDirty.note_id).limit(batch_size)).scalars().all()
+            if not note_ids:
+                break
+            # Clear the flags first: a like arriving mid-refresh flags the note again
+            db.execute(delete(RelatedDirty).where(RelatedDirty.note_id.in_(note_ids)))
+            refresh_notes(db, note_ids)
+            db.commit()
+            refreshed += len(note_ids)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    if refreshed:
+        logger.info("Refreshed related notes for %d notes", refreshed)
+    return refreshed
+
+
+def related_note_ids(db: Session, note_id: int, class_name: str, limit: int) -> List[int]:
+    """
+    Related notes for a note, best first.
+
+    Precomputed co-like neighbours come first; notes with too few (cold
+    notes) are filled up with the most liked notes in the same class.
+    """
+    from models import Note, NoteRelated, NoteStats
+
+    ranked = db.execute(
+        select(NoteRelated.related_id)
+        .where(NoteRelated.note_id == note_id)
+        .order_by(NoteRelated.score.desc())
+        .limit(limit)
+    ).scalars().all()
+    if len(ranked) >= limit:
+        return ranked
+
+    exclude = set(ranked) | {note_id}
+    popular = db.execute(
+        select(Note.id)
+        .outerjoin(NoteStats, NoteStats.note_id == Note.id)
+        .where(Note.class_name == class_name, Note.id.notin_(exclude))
+        .order_by(func.coalesce(NoteStats.like_count, 0).desc(), Note.created_at.desc())
+        .limit(limit - len(ranked))
+    ).scalars().all()
+    return ranked + popular
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Related notes maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute related notes from all likes")
+    parser.add_argument("--top-k", type=int, default=RELATED_TOP_K)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.rebuild:
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            count = rebuild(db, args.top_k)
+        finally:
+            db.close()
+        print(f"Wrote {count} related note rows")
+    else:
+        parser.print_help()
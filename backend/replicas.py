@@ -0,0 +1,164 @@
+"""Read replica selection: health checks, replication lag and round-robin.
+
+``DATABASE_REPLICA_URLS`` lists replicas for the read-only feed and detail
+endpoints (the ``database.get_read_db`` dependency).  A monitor thread
+checks every replica each ``REPLICA_CHECK_INTERVAL`` seconds and measures
+how far it is behind the primary.  Replicas that fail the check or lag more
+than ``REPLICA_MAX_LAG_SECONDS`` are left out until a later check passes,
+and with none usable, reads go to the primary.  A dropped connection takes
+a replica out straight away.
+
+Sessions take a replica round-robin at their first read and keep it, so one
+request never mixes an up-to-date replica's rows with a lagging one's.
+"""
+import itertools
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+try:
+    from config import REPLICA_MAX_LAG_SECONDS, REPLICA_CHECK_INTERVAL
+except ImportError:
+    REPLICA_MAX_LAG_SECONDS = 5.0
+    REPLICA_CHECK_INTERVAL = 5.0
+
+logger = logging.getLogger(__name__)
+
+# Seconds since the last replayed transaction, or 0 once everything received
+# is replayed (a quiet primary sends nothing, which is not lag).  A server
+# that is not in recovery, e.g. a stand-in, is never behind.
+_POSTGRES_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica:
+    """A replica's engine and the outcome of its last check."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        url = engine.url
+        self.name = f"{url.host}:{url.port or ''}/{url.database}" if url.host else str(url.database)
+        self.healthy = False  # Until the first check passes
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "replica": self.name,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "error": self.error,
+            "checked_seconds_ago": None if self.checked_at is None else round(time.monotonic() - self.checked_at, 1),
+        }
+
+
+class ReplicaSet:
+    """The configured replicas, with a background thread keeping their health current."""
+
+    def __init__(
+        self,
+        engines: List[Engine],
+        max_lag: float = REPLICA_MAX_LAG_SECONDS,
+        check_interval: float = REPLICA_CHECK_INTERVAL,
+    ):
+        self.replicas = [Replica(engine) for engine in engines]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._turn = itertools.count()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        for replica in self.replicas:
+            event.listen(replica.engine, "handle_error", self._error_listener(replica))
+
+    def _error_listener(self, replica: Replica):
+        def on_error(context) -> None:
+            if context.is_disconnect and replica.healthy:
+                self._update(replica, None, f"Disconnected: {context.original_exception}")
+        return on_error
+
+    def choose(self) -> Optional[Engine]:
+        """The next usable replica's engine, or None to read from the primary."""
+        usable = [replica for replica in self.replicas if replica.healthy]
+        if not usable:
+            return None
+        return usable[next(self._turn) % len(usable)].engine
+
+    def check(self) -> None:
+        """Check every replica now: reachable, and no further behind than ``max_lag``."""
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as conn:
+                    if replica.engine.dialect.name == "postgresql":
+                        lag = float(conn.execute(_POSTGRES_LAG_SQL).scalar())
+                    else:
+                        conn.execute(text("SELECT 1"))
+                        lag = 0.0
+                error = None if lag <= self.max_lag else f"{lag:.1f}s behind the primary"
+            except Exception as e:
+                lag, error = None, f"{type(e).__name__}: {e}"
+            self._update(replica, lag, error)
+
+    def _update(self, replica: Replica, lag: Optional[float], error: Optional[str]) -> None:
+        healthy = error is None
+        if healthy and not replica.healthy:
+            logger.info("Replica %s in rotation (lag %.1fs)", replica.name, lag)
+        elif not healthy and (replica.healthy or replica.checked_at is None):
+            logger.warning("Replica %s out of rotation: %s", replica.name, error)
+        replica.healthy, replica.lag, replica.error = healthy, lag, error
+        replica.checked_at = time.monotonic()
+
+    def status(self) -> List[dict]:
+        return [replica.as_dict() for replica in self.replicas]
+
+    def gauges(self, measure: str) -> Dict[tuple, float]:
+        """Per-replica ``lag`` (-1 when unreachable) or ``healthy`` (1 in rotation), for /metrics."""
+        if measure == "lag":
+            return {(replica.name,): -1.0 if replica.lag is None else replica.lag for replica in self.replicas}
+        return {(replica.name,): 1.0 if replica.healthy else 0.0 for replica in self.replicas}
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error("Replica monitor error: %s", e, exc_info=True)
+
+    def start(self) -> None:
+        """Check the replicas once, then keep checking in the background."""
+        self.check()
+        self._thread = threading.Thread(target=self._run, name="replica-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.check_interval + 5)
+
+
+def start_replica_monitor() -> Optional[ReplicaSet]:
+    """Start checking the replicas if ``DATABASE_REPLICA_URLS`` is set."""
+    from database import replicas
+
+    if replicas is not None and replicas._thread is None:
+        replicas.start()
+        usable = sum(replica.healthy for replica in replicas.replicas)
+        logger.info("Read replicas: %d of %d usable (max lag %gs, checked every %gs)",
+                    usable, len(replicas.replicas), replicas.max_lag, replicas.check_interval)
+    return replicas
+
+
+def stop_replica_monitor() -> None:
+    from database import replicas
+
+    if replicas is not None:
+        replicas.stop()
@@ -0,0 +1,100 @@
+"""Admin-only profiling routes (CPU profiles and memory snapshots of this process)."""
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import asyncio
+import logging
+
+from auth import get_admin_user
+from config import PROFILE_MAX_SECONDS
+import profiling
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+def _memory_files(files: Optional[str]):
+    """Files to attribute allocations to: the defaults, a comma-separated list, or "all"."""
+    if files is None:
+        return profiling.DEFAULT_MEMORY_FILES
+    if files == "all":
+        return ("*",)
+    return tuple(name.strip() for name in files.split(",") if name.strip())
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def cpu_profile(
+    seconds: float = Query(10, gt=0),
+    hz: int = Query(100, ge=1, le=1000),
+    lines: bool = False,
+    idle: bool = False,
+    admin = Depends(get_admin_user)
+):
+    """Sample this worker's stacks for ``seconds`` and return them as folded stacks.
+
+    Feed the output to flamegraph.pl, or open it in speedscope. ``lines``
+    splits frames by line instead of by function; ``idle`` keeps samples of
+    threads that are only waiting.
+    """
+    if seconds > PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Profiles are limited to {PROFILE_MAX_SECONDS:g} seconds"
+        )
+    logger.info("%s started a %gs CPU profile at %s Hz", admin.email, seconds, hz)
+    try:
+        # On a worker thread, so the event loop keeps serving (and is sampled)
+        folded, samples = await asyncio.to_thread(
+            profiling.profiler.profile, seconds, 1 / hz, lines, idle
+        )
+    except profiling.ProfilerBusy:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already running"
+        )
+    return PlainTextResponse(folded, headers={"X-Profile-Samples": str(samples)})
+
+@router.post("/memory/start")
+def start_memory_tracing(
+    frames: int = Query(25, ge=1, le=100),
+    admin = Depends(get_admin_user)
+):
+    """Start tracing allocations; every allocation is slower until ``/memory/stop``."""
+    started = profiling.start_memory_tracing(frames)
+    if started:
+        logger.info("%s started memory tracing (%s frames)", admin.email, frames)
+    return {"tracing": True, "started": started}
+
+@router.post("/memory/stop")
+def stop_memory_tracing(admin = Depends(get_admin_user)):
+    """Stop tracing allocations and free the trace data."""
+    stopped = profiling.stop_memory_tracing()
+    if stopped:
+        logger.info("%s stopped memory tracing", admin.email)
+    return {"tracing": False, "stopped": stopped}
+
+@router.get("/memory/snapshot")
+def memory_snapshot(
+    files: Optional[str] = None,
+    limit: int = Query(25, ge=1, le=500),
+    admin = Depends(get_admin_user)
+):
+    """Live allocations by line in ``files`` (default routes/notes.py and storage.py).
+
+    The snapshot is the baseline for the next ``/memory/diff``.
+    """
+    try:
+        return profiling.memory_snapshot(_memory_files(files), limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+@router.get("/memory/diff")
+def memory_diff(
+    files: Optional[str] = None,
+    limit: int = Query(25, ge=1, le=500),
+    admin = Depends(get_admin_user)
+):
+    """Allocation growth by line since the last snapshot or diff, largest change first."""
+    try:
+        return profiling.memory_diff(_memory_files(files), limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
@@ -5,7 +5,7 @@ from sqlalchemy.exc import IntegrityError
 from datetime import timedelta
 import logging
 
-from database import get_db
+from database import get_db, get_read_db
 from schemas import UserRegister, UserLogin, UserResponse, TokenResponse
 from auth import (
     get_password_hash, 
@@ -49,7 +49,7 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
         try:
             hashed_password = get_password_hash(user_data.password)
         except Exception as e:
-            logger.error(f"Error hashing password: {str(e)}")
+            logger.error("Error hashing password: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error processing password. Please try a shorter password."
@@ -65,7 +65,7 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
         db.commit()
         db.refresh(db_user)
         
-        logger.info(f"User registered successfully: {user_data.email}")
+        logger.info("User registered successfully: %s", user_data.email)
         
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -78,7 +78,7 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
         
     except IntegrityError as e:
         db.rollback()
-        logger.error(f"Database integrity error during registration: {str(e)}")
+        logger.error("Database integrity error during registration: %s", e)
         # Check which constraint was violated
         error_str = str(e).lower()
         if 'email' in error_str or 'unique constraint' in error_str:
@@ -98,7 +98,7 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
             )
     except Exception as e:
         db.rollback()
-        logger.error(f"Unexpected error during registration: {str(e)}")
+        logger.error("Unexpected error during registration: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred during registration. Please try again."
@@ -111,7 +111,7 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == user_data.email).first()
     
     if not user:
-        logger.warning(f"Login attempt with non-existent email: {user_data.email}")
+        logger.warning("Login attempt with non-existent email: %s", user_data.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="EMAIL_NOT_FOUND: No account found with this email. Please check your email or sign up for a new account.",
@@ -119,7 +119,7 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
         )
     
     if not verify_password(user_data.password, user.hashed_password):
-        logger.warning(f"Failed login attempt for email: {user_data.email} - incorrect password")
+        logger.warning("Failed login attempt for email: %s - incorrect password", user_data.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="INVALID_PASSWORD: Incorrect password. Please try again or reset your password.",
@@ -132,11 +132,11 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
         expires_delta=access_token_expires
     )
     
-    logger.info(f"User logged in successfully: {user_data.email}")
+    logger.info("User logged in successfully: %s", user_data.email)
     return TokenResponse(access_token=access_token, token_type="bearer")
 
 @router.get("/check-username")
-def check_username_availability(username: str, db: Session = Depends(get_db)):
+def check_username_availability(username: str, db: Session = Depends(get_read_db)):
     """
     Check if a username is available.
     
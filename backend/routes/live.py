@@ -0,0 +1,70 @@
+"""Live update routes (Server-Sent Events)."""
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+import logging
+
+from database import SessionLocal
+from auth import get_admin_user, get_current_user
+from live import hub, note_topic, class_topic
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/live", tags=["live"])
+
+def _event_stream(topic: str) -> StreamingResponse:
+    """Subscribe to a topic and stream its events, or 503 if this process is full."""
+    subscription = hub.subscribe([topic])
+    if subscription is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live connections, try again later",
+            headers={"Retry-After": "30"}
+        )
+    return StreamingResponse(
+        hub.stream(subscription),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Keep proxies from buffering the stream
+        }
+    )
+
+@router.get("/notes/{note_id}")
+async def note_events(
+    note_id: int,
+    token: str
+):
+    """Stream a note's like-count and new-comment events.
+    
+    EventSource cannot send headers, so the access token is a query parameter.
+    """
+    from statements import note_exists
+    
+    await get_current_user(token)
+    # Not a get_db dependency: that session would stay checked out for as
+    # long as the stream is open
+    db = SessionLocal()
+    try:
+        exists = note_exists(db, note_id)
+    finally:
+        db.close()
+    if not exists:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note not found"
+        )
+    return _event_stream(note_topic(note_id))
+
+@router.get("/classes/{class_name}")
+async def class_events(
+    class_name: str,
+    token: str
+):
+    """Stream like-count and new-comment events for every note in a class."""
+    await get_current_user(token)
+    return _event_stream(class_topic(class_name))
+
+@router.get("/stats")
+async def live_stats(admin = Depends(get_admin_user)):
+    """Subscriber and delivery counters for this process (admins only)."""
+    return hub.stats()
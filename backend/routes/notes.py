@@ -1,24 +1,114 @@
 """Notes routes."""
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, status
+from fastapi.responses import FileResponse, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from datetime import datetime
+from typing import FrozenSet, List, Optional, Tuple, Union
+import base64
+import binascii
 import os
 import shutil
 import uuid
 import logging
 
-from database import get_db
-from schemas import NoteResponse, NoteDetailResponse, CommentCreate, CommentResponse
+from database import get_db, get_read_db, read_from_primary
+from schemas import (
+    NoteResponse, NoteDetailResponse, NoteDeltaResponse, SimilarNoteResponse, CommentCreate, CommentResponse,
+    CommentPageResponse, LikedStatusRequest, LikedStatusResponse, NoteBatchRequest,
+)
 from auth import get_current_user
 from config import ALLOWED_EXTENSIONS, MAX_FILE_SIZE
 from storage import storage
 from content_filter import validate_content
+from counters import get_note_stats, record as record_counter
+from jobs import enqueue, wake_workers
+from changelog import (
+    CREATED, DELETED, UPDATED, changes_since, current_version, record as record_change, schedule_compaction,
+)
+from similarity import IMAGE_EXTENSIONS, similarity_index
+from liked_sets import liked_sets
+from note_fields import json_response, note_getters, note_load_options, parse_fields, wants
+from live import publish_comment
+from trending import COMMENT_WEIGHT, UPLOAD_WEIGHT, record as record_trending
+from statements import comment_counts, has_liked, like_counts, liked_among, note_by_id, note_exists
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/notes", tags=["notes"])
 
+def _build_note_rows(
+    db: Session,
+    notes,
+    current_user_id: Optional[int] = None,
+    fields: Optional[FrozenSet[str]] = None,
+) -> List[dict]:
+    """Plain-dict NoteResponse rows for a page of notes, limited to ``fields``.
+    
+    Counts come from set-based queries, and only the ones selected are run.
+    Notes should be loaded with ``note_load_options(fields)``.
+    """
+    if not notes:
+        return []
+    
+    note_ids = [note.id for note in notes]
+    counts = {}
+    
+    if wants(fields, "like_count"):
+        like_counts_dict = like_counts(db, note_ids)
+        counts["like_count"] = lambda note_id: like_counts_dict.get(note_id, 0)
+    
+    if wants(fields, "is_liked"):
+        user_liked_note_ids = set()
+        if current_user_id is not None:
+            user_liked_note_ids = liked_among(db, current_user_id, note_ids)
+        counts["is_liked"] = user_liked_note_ids.__contains__
+    
+    if wants(fields, "comment_count"):
+        comment_counts_dict = comment_counts(db, note_ids)
+        counts["comment_count"] = lambda note_id: comment_counts_dict.get(note_id, 0)
+    
+    if wants(fields, "preview_count") or wants(fields, "download_count"):
+        stats_dict = get_note_stats(db, note_ids)
+        counts["preview_count"] = lambda note_id: stats_dict.get(note_id, {}).get("preview_count", 0)
+        counts["download_count"] = lambda note_id: stats_dict.get(note_id, {}).get("download_count", 0)
+    
+    getters = note_getters(fields, counts)
+    return [{name: get(note) for name, get in getters} for note in notes]
+
+def _build_note_responses(db: Session, notes, current_user_id: Optional[int] = None) -> List[NoteResponse]:
+    """Build NoteResponses for a page of notes with set-based count queries."""
+    return [NoteResponse(**row) for row in _build_note_rows(db, notes, current_user_id)]
+
+def _build_note_delta(
+    db: Session,
+    since: int,
+    notes_query,
+    author_id: Optional[int] = None,
+    class_name: Optional[str] = None,
+    current_user_id: Optional[int] = None,
+    fields: Optional[FrozenSet[str]] = None,
+):
+    """Answer ``?since=`` for a feed: the current state of notes changed since that version.
+    
+    ``notes_query`` is the feed's query; changed notes it no longer returns
+    are listed as deleted.  Returns a NoteDeltaResponse-shaped response
+    whose notes are limited to ``fields``.
+    """
+    from models import Note
+    
+    version, note_ids = changes_since(db, since, author_id=author_id, class_name=class_name)
+    delta = {"version": version, "reset": note_ids is None, "notes": [], "deleted": []}
+    if not note_ids:
+        return json_response(delta)
+    
+    notes = notes_query.options(*note_load_options(fields)).filter(
+        Note.id.in_(note_ids)
+    ).order_by(Note.created_at.desc()).all()
+    present = {note.id for note in notes}
+    delta["notes"] = _build_note_rows(db, notes, current_user_id, fields)
+    delta["deleted"] = sorted(note_id for note_id in note_ids if note_id not in present)
+    return json_response(delta)
+
 @router.post("/upload", response_model=NoteResponse, status_code=status.HTTP_201_CREATED)
 async def upload_note(
     file: UploadFile = File(...),
@@ -31,6 +121,7 @@ async def upload_note(
     """Upload a new note."""
     from models import Note
     
+    file_path = None
     try:
         # Validate file
         file_ext = os.path.splitext(file.filename)[1].lower()
@@ -85,10 +176,22 @@ async def upload_note(
             author_id=current_user.id
         )
         db.add(db_note)
+        db.flush()
+        record_trending(db, db_note.id, UPLOAD_WEIGHT, db_note.created_at)
+        
+        # Queue post-upload processing in the same transaction as the note
+        enqueue(db, "generate_thumbnail", {"note_id": db_note.id})
+        enqueue(db, "extract_text", {"note_id": db_note.id})
+        if file_ext in IMAGE_EXTENSIONS:
+            # Documents are signed after text extraction; images right away
+            enqueue(db, "compute_signature", {"note_id": db_note.id})
+        record_change(db, db_note.id, CREATED)
         db.commit()
         db.refresh(db_note)
+        wake_workers()
+        schedule_compaction()
         
-        logger.info(f"Note uploaded: {db_note.id} by user {current_user.email}")
+        logger.info("Note uploaded: %s by user %s", db_note.id, current_user.email)
         
         return NoteResponse(
             id=db_note.id,
@@ -109,7 +212,16 @@ async def upload_note(
     except Exception as e:
         db.rollback()
         error_msg = str(e)
-        logger.error(f"Error uploading note: {error_msg}", exc_info=True)
+        logger.error("Error uploading note: %s", error_msg, exc_info=True)
+        # Don't leave the stored file behind if the note was never created
+        if file_path:
+            try:
+                enqueue(db, "delete_file", {"file_path": file_path})
+                db.commit()
+                wake_workers()
+            except Exception as cleanup_error:
+                db.rollback()
+                logger.warning("Could not schedule cleanup of %s: %s", file_path, cleanup_error)
         # Return more specific error messages for common issues
         if "storage" in error_msg.lower() or "file" in error_msg.lower():
             raise HTTPException(
@@ -127,141 +239,216 @@ async def upload_note(
                 detail=f"Upload failed: {error_msg}"
             )
 
-@router.get("", response_model=List[NoteResponse])
+@router.get("", response_model=Union[List[NoteResponse], NoteDeltaResponse])
 async def get_notes(
     current_user = Depends(get_current_user),
     page: int = 1,
     page_size: int = 20,
+    since: Optional[int] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all notes for the authenticated user (their own notes) with pagination."""
-    from models import Note, Like, Comment
-    from sqlalchemy import func
+    """Get all notes for the authenticated user (their own notes) with pagination.
+    
+    The ``X-Feed-Version`` header carries the feed version; pass it back as
+    ``since`` to get only the notes changed after it.  ``fields`` (e.g.
+    ``id,title,like_count``) limits each note to those fields.
+    """
+    from models import Note
     from config import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
     
+    selected = parse_fields(fields)
+    notes_query = db.query(Note).filter(Note.author_id == current_user.id)
+    
+    if since is not None:
+        return _build_note_delta(
+            db, since, notes_query,
+            author_id=current_user.id, current_user_id=current_user.id, fields=selected
+        )
+    
+    # Read the version first: changes racing with the page query are resent
+    headers = {"X-Feed-Version": str(current_version(db))}
+    
     # Validate pagination
     page_size = min(max(1, page_size), MAX_PAGE_SIZE)
     page = max(1, page)
     offset = (page - 1) * page_size
     
-    # Get paginated notes with author info
-    notes = db.query(Note).filter(
-        Note.author_id == current_user.id
-    ).order_by(Note.created_at.desc()).offset(offset).limit(page_size).all()
-    
-    if not notes:
-        return []
-    
-    # Get all note IDs
-    note_ids = [note.id for note in notes]
-    
-    # Get like counts for all notes in one query
-    like_counts = db.query(
-        Like.note_id,
-        func.count(Like.id).label('count')
-    ).filter(Like.note_id.in_(note_ids)).group_by(Like.note_id).all()
-    like_counts_dict = {note_id: count for note_id, count in like_counts}
-    
-    # Get user's likes for all notes in one query
-    user_likes = db.query(Like.note_id).filter(
-        Like.note_id.in_(note_ids),
-        Like.user_id == current_user.id
-    ).all()
-    user_liked_note_ids = {like.note_id for like in user_likes}
-    
-    # Get comment counts for all notes in one query
-    comment_counts = db.query(
-        Comment.note_id,
-        func.count(Comment.id).label('count')
-    ).filter(Comment.note_id.in_(note_ids)).group_by(Comment.note_id).all()
-    comment_counts_dict = {note_id: count for note_id, count in comment_counts}
-    
-    # Build response
-    result = []
-    for note in notes:
-        result.append(NoteResponse(
-            id=note.id,
-            title=note.title,
-            class_name=note.class_name,
-            description=note.description,
-            file_path=note.file_path,
-            author_email=note.author.email,
-            author_username=note.author.username,
-            created_at=note.created_at,
-            like_count=like_counts_dict.get(note.id, 0),
-            is_liked=note.id in user_liked_note_ids,
-            comment_count=comment_counts_dict.get(note.id, 0)
-        ))
+    # Get paginated notes, loading only the columns the selected fields need
+    notes = notes_query.options(*note_load_options(selected)).order_by(
+        Note.created_at.desc()
+    ).offset(offset).limit(page_size).all()
     
-    return result
+    return json_response(_build_note_rows(db, notes, current_user.id, selected), headers=headers)
 
-@router.get("/global", response_model=List[NoteResponse])
+@router.get("/global", response_model=Union[List[NoteResponse], NoteDeltaResponse])
 async def get_global_notes(
     class_name: Optional[str] = None,
     page: int = 1,
     page_size: int = 20,
-    db: Session = Depends(get_db)
+    collapse_duplicates: bool = False,
+    since: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
 ):
-    """Get all notes globally (public endpoint with optional class filter and pagination)."""
-    from models import Note, Like, Comment
-    from sqlalchemy import func
+    """Get all notes globally (public endpoint with optional class filter and pagination).
+    
+    With ``since`` set to an earlier ``X-Feed-Version``, returns only the
+    notes changed after it.  ``fields`` limits each note to those fields.
+    """
+    from models import Note, NoteSignature
     from config import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
     
+    selected = parse_fields(fields)
+    
     # Validate pagination
     page_size = min(max(1, page_size), MAX_PAGE_SIZE)
     page = max(1, page)
     offset = (page - 1) * page_size
     
+    if since is None:
+        # Read the version first: changes racing with the page query are resent
+        headers = {"X-Feed-Version": str(current_version(db))}
+    
     query = db.query(Note)
     
     # Filter by class if provided
     if class_name:
         query = query.filter(Note.class_name == class_name)
     
-    # Get total count for pagination
-    total = query.count()
+    # Hide notes detected as near-duplicates of an earlier note
+    if collapse_duplicates:
+        query = query.outerjoin(NoteSignature, NoteSignature.note_id == Note.id).filter(
+            NoteSignature.duplicate_of.is_(None)
+        )
     
-    # Get paginated notes
-    notes = query.order_by(Note.created_at.desc()).offset(offset).limit(page_size).all()
+    if since is not None:
+        return _build_note_delta(db, since, query, class_name=class_name, fields=selected)
     
-    if not notes:
+    # Get paginated notes, loading only the columns the selected fields need;
+    # is_liked is always false here (the frontend asks /liked-status)
+    notes = query.options(*note_load_options(selected)).order_by(
+        Note.created_at.desc()
+    ).offset(offset).limit(page_size).all()
+    
+    return json_response(_build_note_rows(db, notes, fields=selected), headers=headers)
+
+@router.get("/search", response_model=List[NoteResponse])
+async def search_notes(
+    q: str,
+    class_name: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 20,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Search notes by title, description and file content (public endpoint).
+    
+    ``fields`` limits each note to those fields.
+    """
+    from models import Note
+    from config import MAX_PAGE_SIZE
+    from search import search_content
+    from sqlalchemy import or_
+    
+    selected = parse_fields(fields)
+    q = q.strip()
+    if len(q) < 2:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search query must be at least 2 characters"
+        )
+    
+    # Validate pagination
+    page_size = min(max(1, page_size), MAX_PAGE_SIZE)
+    page = max(1, page)
+    offset = (page - 1) * page_size
+    limit = offset + page_size
+    
+    # Title/description matches rank ahead of matches in the file body
+    pattern = f"%{q}%"
+    metadata_query = db.query(Note.id).filter(
+        or_(Note.title.ilike(pattern), Note.description.ilike(pattern))
+    )
+    if class_name:
+        metadata_query = metadata_query.filter(Note.class_name == class_name)
+    ranked_ids = [
+        row.id for row in metadata_query.order_by(Note.created_at.desc()).limit(limit).all()
+    ]
+    seen = set(ranked_ids)
+    for note_id in search_content(db, q, limit, class_name):
+        if note_id not in seen:
+            ranked_ids.append(note_id)
+            seen.add(note_id)
+    
+    page_ids = ranked_ids[offset:]
+    if not page_ids:
         return []
     
-    # Get all note IDs
-    note_ids = [note.id for note in notes]
+    page_ids = page_ids[:page_size]
+    notes_by_id = {
+        note.id: note
+        for note in db.query(Note).options(*note_load_options(selected)).filter(Note.id.in_(page_ids)).all()
+    }
+    notes = [notes_by_id[note_id] for note_id in page_ids if note_id in notes_by_id]
     
-    # Get like counts for all notes in one query (optimized)
-    like_counts = db.query(
-        Like.note_id,
-        func.count(Like.id).label('count')
-    ).filter(Like.note_id.in_(note_ids)).group_by(Like.note_id).all()
-    like_counts_dict = {note_id: count for note_id, count in like_counts}
-    
-    # Get comment counts for all notes in one query (optimized)
-    comment_counts = db.query(
-        Comment.note_id,
-        func.count(Comment.id).label('count')
-    ).filter(Comment.note_id.in_(note_ids)).group_by(Comment.note_id).all()
-    comment_counts_dict = {note_id: count for note_id, count in comment_counts}
-    
-    # Build response
-    result = []
-    for note in notes:
-        result.append(NoteResponse(
-            id=note.id,
-            title=note.title,
-            class_name=note.class_name,
-            description=note.description,
-            file_path=note.file_path,
-            author_email=note.author.email,
-            author_username=note.author.username,
-            created_at=note.created_at,
-            like_count=like_counts_dict.get(note.id, 0),
-            is_liked=False,  # Will be updated on frontend if user is authenticated
-            comment_count=comment_counts_dict.get(note.id, 0)
-        ))
+    return json_response(_build_note_rows(db, notes, fields=selected))
+
+@router.get("/{note_id}/similar", response_model=List[SimilarNoteResponse])
+async def get_similar_notes(
+    note_id: int,
+    limit: int = 10,
+    db: Session = Depends(get_db)
+):
+    """Get notes with near-identical content (public endpoint)."""
+    from models import Note
+    from config import MAX_PAGE_SIZE
+    from similarity import similar_notes
     
-    return result
+    if not note_exists(db, note_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note not found"
+        )
+    
+    limit = min(max(1, limit), MAX_PAGE_SIZE)
+    matches = similar_notes(db, note_id, limit)
+    if not matches:
+        return []
+    
+    scores = dict(matches)
+    notes_by_id = {note.id: note for note in db.query(Note).filter(Note.id.in_(scores)).all()}
+    notes = [notes_by_id[match_id] for match_id, _ in matches if match_id in notes_by_id]
+    
+    return [
+        SimilarNoteResponse(**response.model_dump(), similarity=round(scores[response.id], 3))
+        for response in _build_note_responses(db, notes)
+    ]
+
+@router.get("/{note_id}/related", response_model=List[NoteResponse])
+async def get_related_notes(
+    note_id: int,
+    limit: int = 10,
+    db: Session = Depends(get_db)
+):
+    """Get notes liked by the same people, or popular notes in the class (public endpoint)."""
+    from models import Note
+    from config import MAX_PAGE_SIZE
+    from related import related_note_ids
+    
+    note = note_by_id(db, note_id)
+    if not note:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note not found"
+        )
+    
+    limit = min(max(1, limit), MAX_PAGE_SIZE)
+    ranked_ids = related_note_ids(db, note_id, note.class_name, limit)
+    notes_by_id = {n.id: n for n in db.query(Note).filter(Note.id.in_(ranked_ids)).all()}
+    notes = [notes_by_id[related_id] for related_id in ranked_ids if related_id in notes_by_id]
+    
+    return _build_note_responses(db, notes)
 
 @router.get("/{note_id}/preview")
 async def preview_note(
@@ -270,33 +457,28 @@ async def preview_note(
     db: Session = Depends(get_db)
 ):
     """Preview a note file (inline viewing)."""
-    from models import Note
     from fastapi.responses import Response
     
-    logger.info(f"Preview endpoint called for note_id: {note_id}, user: {current_user.email}")
-    
     try:
-        note = db.query(Note).filter(Note.id == note_id).first()
+        note = note_by_id(db, note_id)
         if not note:
-            logger.warning(f"Preview requested for non-existent note ID: {note_id} by user {current_user.email}")
+            logger.warning("Preview requested for non-existent note ID: %s by user %s", note_id, current_user.email)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Note not found"
             )
         
-        logger.info(f"Preview requested for note {note_id}, file_path: {note.file_path}")
-        
         # Check if file exists using storage backend
         try:
             file_exists = storage.file_exists(note.file_path)
             if not file_exists:
-                logger.warning(f"File not found for note {note_id}: {note.file_path}")
+                logger.warning("File not found for note %s: %s", note_id, note.file_path)
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=f"File not found: {note.file_path}"
                 )
         except Exception as e:
-            logger.error(f"Error checking file existence for note {note_id}: {str(e)}")
+            logger.error("Error checking file existence for note %s: %s", note_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error accessing file: {str(e)}"
@@ -306,19 +488,19 @@ async def preview_note(
         try:
             file_content = storage.get_file(note.file_path)
             if not file_content:
-                logger.warning(f"File content is empty for note {note_id}: {note.file_path}")
+                logger.warning("File content is empty for note %s: %s", note_id, note.file_path)
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="File is empty"
                 )
         except FileNotFoundError:
-            logger.error(f"File not found when reading: {note.file_path}")
+            logger.error("File not found when reading: %s", note.file_path)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="File not found"
             )
         except Exception as e:
-            logger.error(f"Error reading file for note {note_id}: {str(e)}")
+            logger.error("Error reading file for note %s: %s", note_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error reading file: {str(e)}"
@@ -342,10 +524,11 @@ async def preview_note(
         # Default to octet-stream if type not recognized
         media_type = media_type_map.get(ext_lower, 'application/octet-stream')
         
-        logger.info(f"Serving preview for note {note_id} with media type: {media_type}")
+        logger.info("Serving preview of note %s (%s, %s) to %s", note_id, note.file_path, media_type,
+                    current_user.email)
         
         # Return file content for inline viewing
-        return Response(
+        response = Response(
             content=file_content,
             media_type=media_type,
             headers={
@@ -353,25 +536,117 @@ async def preview_note(
                 "X-Content-Type-Options": "nosniff"
             }
         )
+        record_counter(db, note_id, "preview_count")
+        return response
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Unexpected error in preview endpoint for note {note_id}: {str(e)}", exc_info=True)
+        logger.error("Unexpected error in preview endpoint for note %s: %s", note_id, e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error loading preview: {str(e)}"
         )
 
+@router.get("/{note_id}/thumbnail")
+async def get_thumbnail(
+    note_id: int,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """Get a note's small WebP thumbnail (public, cacheable)."""
+    from models import NoteThumbnail
+    from config import THUMBNAIL_CACHE_MAX_AGE
+    
+    thumbnail = db.query(NoteThumbnail).filter(NoteThumbnail.note_id == note_id).first()
+    if not thumbnail:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Thumbnail not available",
+            headers={"Cache-Control": "no-store"}
+        )
+    
+    # Thumbnails never change once generated, so clients may cache them forever
+    etag = f'"thumb-{note_id}-{int(thumbnail.created_at.timestamp())}"'
+    headers = {
+        "Cache-Control": f"public, max-age={THUMBNAIL_CACHE_MAX_AGE}, immutable",
+        "ETag": etag,
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    try:
+        content = storage.get_file(thumbnail.file_path)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Thumbnail not available",
+            headers={"Cache-Control": "no-store"}
+        )
+    
+    return Response(content=content, media_type="image/webp", headers=headers)
+
+def _encode_comment_cursor(created_at: datetime, comment_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{comment_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_comment_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, comment_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(comment_id)
+    except (ValueError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid comments cursor"
+        )
+
+def _comment_page(db: Session, note_id: int, limit: int, cursor: Optional[str] = None):
+    """One page of a note's comments, oldest first, and the cursor for the next.
+    
+    Keyset pagination on ``(created_at, id)`` reads only the page's entries
+    of ``ix_comments_note_created_id`` however deep the page, and authors
+    come from the same query instead of a lazy load per comment.
+    """
+    from models import Comment, User
+    from sqlalchemy import tuple_
+    
+    query = db.query(
+        Comment.id, Comment.content, Comment.created_at, User.email, User.username
+    ).join(User, User.id == Comment.user_id).filter(Comment.note_id == note_id)
+    if cursor:
+        after_created_at, after_id = _decode_comment_cursor(cursor)
+        query = query.filter(tuple_(Comment.created_at, Comment.id) > tuple_(after_created_at, after_id))
+    rows = query.order_by(Comment.created_at.asc(), Comment.id.asc()).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_comment_cursor(rows[-1].created_at, rows[-1].id)
+    comments = [
+        CommentResponse(
+            id=row.id,
+            content=row.content,
+            author_email=row.email,
+            author_username=row.username,
+            created_at=row.created_at
+        )
+        for row in rows
+    ]
+    return comments, next_cursor
+
 @router.get("/global/{note_id}", response_model=NoteDetailResponse)
 async def get_global_note_detail(
     note_id: int,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Get detailed note with comments (for authenticated users)."""
-    from models import Note, Like, Comment
+    """Get detailed note with its first page of comments (for authenticated users)."""
+    from config import COMMENTS_PAGE_SIZE
     
-    note = db.query(Note).filter(Note.id == note_id).first()
+    note = note_by_id(db, note_id)
+    if not note and read_from_primary(db):
+        # A note this new may not have reached the replica yet
+        note = note_by_id(db, note_id)
     if not note:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -379,16 +654,19 @@ async def get_global_note_detail(
         )
     
     # Count likes
-    like_count = db.query(Like).filter(Like.note_id == note.id).count()
+    like_count = like_counts(db, [note.id]).get(note.id, 0)
     
     # Check if current user liked this note
-    is_liked = db.query(Like).filter(
-        Like.note_id == note.id,
-        Like.user_id == current_user.id
-    ).first() is not None
+    is_liked = has_liked(db, current_user.id, note.id)
     
-    # Get comments
-    comments = db.query(Comment).filter(Comment.note_id == note.id).order_by(Comment.created_at.asc()).all()
+    # First page of comments; the rest come from /{note_id}/comments
+    comments, next_cursor = _comment_page(db, note.id, COMMENTS_PAGE_SIZE)
+    if next_cursor is None:
+        comment_count = len(comments)
+    else:
+        comment_count = comment_counts(db, [note.id]).get(note.id, 0)
+    
+    stats = get_note_stats(db, [note.id]).get(note.id, {})
     
     return NoteDetailResponse(
         id=note.id,
@@ -401,57 +679,127 @@ async def get_global_note_detail(
         created_at=note.created_at,
         like_count=like_count,
         is_liked=is_liked,
-        comment_count=len(comments),
-        comments=[
-            CommentResponse(
-                id=comment.id,
-                content=comment.content,
-                author_email=comment.user.email,
-                author_username=comment.user.username,
-                created_at=comment.created_at
-            )
-            for comment in comments
-        ]
+        comment_count=comment_count,
+        preview_count=stats.get("preview_count", 0),
+        download_count=stats.get("download_count", 0),
+        comments=comments,
+        comments_next_cursor=next_cursor
     )
 
+@router.get("/{note_id}/comments", response_model=CommentPageResponse)
+async def get_comments(
+    note_id: int,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a page of a note's comments, oldest first; pass ``next_cursor`` back as ``cursor``."""
+    from config import MAX_PAGE_SIZE
+    
+    if not note_exists(db, note_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note not found"
+        )
+    
+    limit = min(max(1, limit), MAX_PAGE_SIZE)
+    comments, next_cursor = _comment_page(db, note_id, limit, cursor)
+    return CommentPageResponse(comments=comments, next_cursor=next_cursor)
+
+@router.get("/trending", response_model=List[NoteResponse])
+async def get_trending_notes(
+    class_name: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 20,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get notes ranked by recent likes and comments (public endpoint, optional class filter).
+    
+    ``fields`` limits each note to those fields.
+    """
+    from models import Note
+    from config import MAX_PAGE_SIZE
+    from trending import trending_note_ids
+    
+    selected = parse_fields(fields)
+    
+    # Validate pagination
+    page_size = min(max(1, page_size), MAX_PAGE_SIZE)
+    page = max(1, page)
+    offset = (page - 1) * page_size
+    
+    page_ids = trending_note_ids(db, page_size, offset, class_name)
+    if not page_ids:
+        return []
+    
+    notes_by_id = {
+        note.id: note
+        for note in db.query(Note).options(*note_load_options(selected)).filter(Note.id.in_(page_ids)).all()
+    }
+    notes = [notes_by_id[note_id] for note_id in page_ids if note_id in notes_by_id]
+    
+    return json_response(_build_note_rows(db, notes, fields=selected))
+
 @router.get("/recent", response_model=List[NoteResponse])
 async def get_recent_notes(
     limit: int = 6,
-    db: Session = Depends(get_db)
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
 ):
-    """Get recent notes (public endpoint) with optimized queries."""
-    from models import Note, Like, Comment
-    from sqlalchemy import func
+    """Get recent notes (public endpoint); ``fields`` limits each note to those fields."""
+    from models import Note
+    
+    selected = parse_fields(fields)
     
     # Validate limit
     limit = min(max(1, limit), 50)  # Max 50 recent notes
     
-    # Get recent notes
-    notes = db.query(Note).order_by(Note.created_at.desc()).limit(limit).all()
+    notes = db.query(Note).options(*note_load_options(selected)).order_by(
+        Note.created_at.desc()
+    ).limit(limit).all()
+    
+    return json_response(_build_note_rows(db, notes, fields=selected))
+
+@router.get("/classes")
+async def get_classes(db: Session = Depends(get_read_db)):
+    """Get all unique class names."""
+    from models import Note
+    classes = db.query(Note.class_name).distinct().all()
+    return [cls[0] for cls in classes if cls[0]]
+
+@router.post("/batch", response_model=List[NoteResponse])
+async def get_notes_batch(
+    request: NoteBatchRequest,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get up to 100 notes by id, in the order requested; unknown ids are left out.
+    
+    A fixed number of set-based queries however many ids are asked for:
+    notes with their authors, like and comment counts, liked flags and
+    view counters.  Like counts come from ``likes``, as on the feeds.
+    """
+    from models import Note
+    from sqlalchemy.orm import joinedload
     
+    note_ids = list(dict.fromkeys(request.note_ids))
+    notes = db.query(Note).options(joinedload(Note.author)).filter(Note.id.in_(note_ids)).all()
     if not notes:
         return []
+    notes_by_id = {note.id: note for note in notes}
+    found_ids = [note_id for note_id in note_ids if note_id in notes_by_id]
     
-    # Get all note IDs
-    note_ids = [note.id for note in notes]
+    stats_dict = get_note_stats(db, found_ids, include_pending=True)
+    like_counts_dict = like_counts(db, found_ids)
+    comment_counts_dict = comment_counts(db, found_ids)
+    user_liked_note_ids = liked_among(db, current_user.id, found_ids)
     
-    # Get like counts for all notes in one query (optimized)
-    like_counts = db.query(
-        Like.note_id,
-        func.count(Like.id).label('count')
-    ).filter(Like.note_id.in_(note_ids)).group_by(Like.note_id).all()
-    like_counts_dict = {note_id: count for note_id, count in like_counts}
-    
-    # Get comment counts for all notes in one query (optimized)
-    comment_counts = db.query(
-        Comment.note_id,
-        func.count(Comment.id).label('count')
-    ).filter(Comment.note_id.in_(note_ids)).group_by(Comment.note_id).all()
-    comment_counts_dict = {note_id: count for note_id, count in comment_counts}
-    
-    # Build response
     result = []
-    for note in notes:
+    for note_id in found_ids:
+        note = notes_by_id[note_id]
+        stats = stats_dict.get(note_id, {})
         result.append(NoteResponse(
             id=note.id,
             title=note.title,
@@ -461,19 +809,24 @@ async def get_recent_notes(
             author_email=note.author.email,
             author_username=note.author.username,
             created_at=note.created_at,
-            like_count=like_counts_dict.get(note.id, 0),
-            is_liked=False,
-            comment_count=comment_counts_dict.get(note.id, 0)
+            like_count=like_counts_dict.get(note_id, 0),
+            is_liked=note.id in user_liked_note_ids,
+            comment_count=comment_counts_dict.get(note_id, 0),
+            preview_count=stats.get("preview_count", 0),
+            download_count=stats.get("download_count", 0)
         ))
     
     return result
 
-@router.get("/classes")
-async def get_classes(db: Session = Depends(get_db)):
-    """Get all unique class names."""
-    from models import Note
-    classes = db.query(Note.class_name).distinct().all()
-    return [cls[0] for cls in classes if cls[0]]
+@router.post("/liked-status", response_model=LikedStatusResponse)
+async def get_liked_status(
+    request: LikedStatusRequest,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Report which of up to 500 notes the current user has liked."""
+    liked = liked_sets.liked_among(db, current_user.id, request.note_ids)
+    return LikedStatusResponse(liked=sorted(liked))
 
 @router.post("/{note_id}/like", status_code=status.HTTP_200_OK)
 async def toggle_like(
@@ -481,36 +834,22 @@ async def toggle_like(
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Like or unlike a note."""
-    from models import Note, Like
+    """Like or unlike a note atomically and return the new like count."""
+    from likes import toggle_like as toggle_like_atomic
     
-    note = db.query(Note).filter(Note.id == note_id).first()
-    if not note:
+    result = toggle_like_atomic(db, note_id, current_user.id)
+    if result is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Note not found"
         )
     
-    # Check if user already liked this note
-    existing_like = db.query(Like).filter(
-        Like.note_id == note_id,
-        Like.user_id == current_user.id
-    ).first()
-    
-    if existing_like:
-        # Unlike: remove the like
-        db.delete(existing_like)
-        db.commit()
-        return {"liked": False, "message": "Note unliked"}
-    else:
-        # Like: create new like
-        new_like = Like(
-            note_id=note_id,
-            user_id=current_user.id
-        )
-        db.add(new_like)
-        db.commit()
-        return {"liked": True, "message": "Note liked"}
+    liked, like_count = result
+    return {
+        "liked": liked,
+        "like_count": like_count,
+        "message": "Note liked" if liked else "Note unliked"
+    }
 
 @router.post("/{note_id}/comments", response_model=CommentResponse, status_code=status.HTTP_201_CREATED)
 async def add_comment(
@@ -520,9 +859,9 @@ async def add_comment(
     db: Session = Depends(get_db)
 ):
     """Add a comment to a note."""
-    from models import Note, Comment
+    from models import Comment
     
-    note = db.query(Note).filter(Note.id == note_id).first()
+    note = note_by_id(db, note_id)
     if not note:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -544,18 +883,24 @@ async def add_comment(
     )
     
     db.add(comment)
+    db.flush()
+    record_trending(db, note_id, COMMENT_WEIGHT, comment.created_at)
+    record_change(db, note_id, UPDATED)
     db.commit()
     db.refresh(comment)
+    schedule_compaction()
     
-    logger.info(f"Comment added to note {note_id} by user {current_user.email}")
+    logger.info("Comment added to note %s by user %s", note_id, current_user.email)
     
-    return CommentResponse(
+    response = CommentResponse(
         id=comment.id,
         content=comment.content,
         author_email=current_user.email,
         author_username=current_user.username,
         created_at=comment.created_at
     )
+    publish_comment(note_id, note.class_name, response.model_dump(mode="json"))
+    return response
 
 @router.delete("/{note_id}", status_code=status.HTTP_200_OK)
 async def delete_note(
@@ -564,9 +909,9 @@ async def delete_note(
     db: Session = Depends(get_db)
 ):
     """Delete a note (only by the owner)."""
-    from models import Note
+    from models import NoteThumbnail
     
-    note = db.query(Note).filter(Note.id == note_id).first()
+    note = note_by_id(db, note_id)
     if not note:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -581,24 +926,21 @@ async def delete_note(
         )
     
     try:
-        # Store file path before deletion
-        file_path = note.file_path
-        
-        # Delete the note from database first (cascade will handle likes and comments)
+        # Delete the note (ON DELETE CASCADE removes likes and comments) and
+        # queue the file deletion in the same transaction, so the file is
+        # removed, with retries, exactly when the note is
+        enqueue(db, "delete_file", {"file_path": note.file_path})
+        thumbnail = db.query(NoteThumbnail.file_path).filter(NoteThumbnail.note_id == note_id).first()
+        if thumbnail:
+            enqueue(db, "delete_file", {"file_path": thumbnail.file_path})
+        record_change(db, note_id, DELETED)
         db.delete(note)
         db.commit()
+        wake_workers()
+        similarity_index.remove(note_id)
+        schedule_compaction()
         
-        # Delete the file from storage after successful DB deletion
-        try:
-            if storage.delete_file(file_path):
-                logger.info(f"Deleted file: {file_path}")
-            else:
-                logger.warning(f"File {file_path} not found in storage")
-        except Exception as e:
-            logger.warning(f"Could not delete file {file_path}: {str(e)}")
-            # File deletion failure is not critical if DB deletion succeeded
-        
-        logger.info(f"Note deleted: {note_id} by user {current_user.email}")
+        logger.info("Note deleted: %s by user %s", note_id, current_user.email)
         
         return {"message": "Note deleted successfully", "deleted": True}
         
@@ -606,7 +948,7 @@ async def delete_note(
         raise
     except Exception as e:
         db.rollback()
-        logger.error(f"Error deleting note: {str(e)}")
+        logger.error("Error deleting note: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while deleting the note"
@@ -619,9 +961,8 @@ async def download_note(
     db: Session = Depends(get_db)
 ):
     """Download a note file."""
-    from models import Note
     
-    note = db.query(Note).filter(Note.id == note_id).first()
+    note = note_by_id(db, note_id)
     if not note:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -642,6 +983,8 @@ async def download_note(
     _, ext = os.path.splitext(note.file_path)
     filename = f"{note.title}{ext}" if not note.title.endswith(ext) else note.title
     
+    record_counter(db, note_id, "download_count")
+    
     # Return file content as response
     from fastapi.responses import Response
     return Response(
@@ -1,6 +1,6 @@
 """Pydantic schemas for request/response validation."""
 from pydantic import BaseModel, EmailStr, Field, field_validator
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class UserRegister(BaseModel):
@@ -135,13 +135,52 @@ class NoteResponse(BaseModel):
     like_count: int = 0
     is_liked: bool = False
     comment_count: int = 0
+    preview_count: int = 0
+    download_count: int = 0
     
     class Config:
         from_attributes = True
 
+class SimilarNoteResponse(NoteResponse):
+    """Note response with its similarity to the requested note."""
+    similarity: float
+
+class LikedStatusRequest(BaseModel):
+    """Note ids to check the current user's likes for."""
+    note_ids: List[int] = Field(..., max_length=500)
+
+class NoteBatchRequest(BaseModel):
+    """Ids of the notes to fetch in one request."""
+    note_ids: List[int] = Field(..., min_length=1, max_length=100)
+
+class LikedStatusResponse(BaseModel):
+    """The requested note ids that the current user has liked."""
+    liked: List[int]
+
+class NoteDeltaResponse(BaseModel):
+    """Notes created, changed or deleted since a feed version.
+
+    ``reset`` means the changes since that version are no longer (or too
+    many to be) listed, and the client should reload the feed.
+    """
+    version: int
+    reset: bool = False
+    notes: List[NoteResponse] = []
+    deleted: List[int] = []
+
+class CommentPageResponse(BaseModel):
+    """A page of a note's comments, oldest first."""
+    comments: List[CommentResponse]
+    next_cursor: Optional[str] = None  # Pass as ?cursor= for the next page; None on the last
+
 class NoteDetailResponse(NoteResponse):
-    """Detailed note response with comments."""
+    """Detailed note response with the first page of comments.
+    
+    ``comment_count`` is the total; fetch the rest from
+    ``/api/notes/{id}/comments?cursor=<comments_next_cursor>``.
+    """
     comments: list[CommentResponse] = []
+    comments_next_cursor: Optional[str] = None
 
 class TokenResponse(BaseModel):
     """Token response schema."""
@@ -0,0 +1,108 @@
+"""Full-text search over extracted note content.
+
+``note_contents`` (filled by extraction.py) is indexed with the database's
+own full-text engine: a GIN index on ``to_tsvector`` on Postgres, and an
+external-content FTS5 table kept in sync by triggers on SQLite.  When neither
+is available the search falls back to a LIKE scan.
+"""
+import logging
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_SQLITE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS note_contents_fts USING fts5(
+        content, content='note_contents', content_rowid='note_id',
+        tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS note_contents_fts_ai AFTER INSERT ON note_contents BEGIN
+        INSERT INTO note_contents_fts(rowid, content) VALUES (new.note_id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS note_contents_fts_ad AFTER DELETE ON note_contents BEGIN
+        INSERT INTO note_contents_fts(note_contents_fts, rowid, content)
+        VALUES ('delete', old.note_id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS note_contents_fts_au AFTER UPDATE ON note_contents BEGIN
+        INSERT INTO note_contents_fts(note_contents_fts, rowid, content)
+        VALUES ('delete', old.note_id, old.content);
+        INSERT INTO note_contents_fts(rowid, content) VALUES (new.note_id, new.content);
+    END""",
+]
+
+_POSTGRES_INDEX_DDL = (
+    "CREATE INDEX IF NOT EXISTS ix_note_contents_tsv ON note_contents "
+    "USING GIN (to_tsvector('english', content))"
+)
+
+# Set by ensure_search_index(); False means LIKE fallback
+_fts_available = False
+
+
+def ensure_search_index(engine) -> None:
+    """Create the full-text index for ``note_contents`` if it is missing."""
+    global _fts_available
+    try:
+        with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                conn.execute(text(_POSTGRES_INDEX_DDL))
+            elif engine.dialect.name == "sqlite":
+                for statement in _SQLITE_FTS_DDL:
+                    conn.execute(text(statement))
+            else:
+                return
+        _fts_available = True
+    except Exception as e:
+        # e.g. SQLite built without FTS5
+        _fts_available = False
+        logger.warning("Full-text index unavailable, content search will use LIKE: %s", e)
+
+
+def _fts5_query(query: str) -> str:
+    """Quote each term so user input is never parsed as FTS5 syntax."""
+    terms = [term.replace('"', '""') for term in query.split()]
+    return " ".join(f'"{term}"' for term in terms if term)
+
+
+def search_content(db: Session, query: str, limit: int, class_name: Optional[str] = None) -> List[int]:
+    """Return ids of notes whose extracted content matches, best match first."""
+    from models import Note, NoteContent
+
+    query = query.strip()
+    if not query:
+        return []
+
+    params = {"query": query, "limit": limit, "class_name": class_name}
+    dialect = db.get_bind().dialect.name
+    if _fts_available and dialect == "postgresql":
+        rows = db.execute(text("""
+            SELECT c.note_id FROM note_contents c
+            JOIN notes n ON n.id = c.note_id,
+                 plainto_tsquery('english', :query) AS q
+            WHERE to_tsvector('english', c.content) @@ q
+              AND (CAST(:class_name AS VARCHAR) IS NULL OR n.class_name = :class_name)
+            ORDER BY ts_rank(to_tsvector('english', c.content), q) DESC
+            LIMIT :limit
+        """), params)
+        return [row.note_id for row in rows]
+
+    if _fts_available and dialect == "sqlite":
+        params["query"] = _fts5_query(query)
+        if not params["query"]:
+            return []
+        rows = db.execute(text("""
+            SELECT f.rowid AS note_id FROM note_contents_fts f
+            JOIN notes n ON n.id = f.rowid
+            WHERE note_contents_fts MATCH :query
+              AND (:class_name IS NULL OR n.class_name = :class_name)
+            ORDER BY f.rank
+            LIMIT :limit
+        """), params)
+        return [row.note_id for row in rows]
+
+    fallback = db.query(NoteContent.note_id).filter(NoteContent.content.ilike(f"%{query}%"))
+    if class_name:
+        fallback = fallback.join(Note, Note.id == NoteContent.note_id).filter(Note.class_name == class_name)
+    return [row.note_id for row in fallback.limit(limit).all()]
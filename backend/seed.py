@@ -0,0 +1,324 @@
+"""Synthetic data for reproducing production scale locally.
+
+Bulk-inserts users, notes, likes and comments with the fastest path each
+database has: ``COPY ... FROM STDIN`` on Postgres, and on SQLite (or
+anything else) ``executemany`` over raw DBAPI cursors, one transaction per
+chunk.  Rows are generated in chunks, so memory stays flat however many are
+asked for, and ids continue after the existing rows, so seeding an existing
+database adds to it.
+
+The data is shaped like real usage:
+
+- notes arrive steadily over ``--days``, in id order, spread over
+  ``--classes`` classes, with a few prolific authors
+- likes and comments follow a Zipf-like popularity curve (a few notes get
+  most of them) and come after the note they are on
+- every seeded account's password is ``--password``, so load tests can log
+  in as ``seed<id>@seed.example.edu``
+
+Derived data is written too: ``note_stats`` counters matching the likes,
+one ``created`` feed entry per note, trending scores, and (``--related``)
+co-like recommendations.  Note files are ``--files`` small text files saved
+through ``LocalStorage`` and shared round-robin between notes.
+
+Usage: python seed.py --notes 1000000 --likes 5000000 --comments 1000000
+"""
+import csv
+import io
+import logging
+import math
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Iterable, Iterator, List, Sequence
+
+from sqlalchemy import func, select, text
+
+logger = logging.getLogger(__name__)
+
+EMAIL_DOMAIN = "seed.example.edu"
+CHUNK_SIZE = 50_000
+POPULARITY_SKEW = 1.1  # Zipf exponent for likes and comments per note
+
+_SUBJECTS = ("CS", "MATH", "PHYS", "CHEM", "BIO", "ECON", "HIST", "ENG", "PSY", "NURS", "ACCT", "ART")
+_KINDS = ("Lecture", "Exam review", "Study guide", "Lab", "Homework solutions", "Chapter summary", "Cheat sheet")
+_SENTENCES = (
+    "Covers everything from this week's lectures.",
+    "Worked examples for every problem type on the midterm.",
+    "Definitions and key formulas in one place.",
+    "Includes the practice questions from recitation.",
+    "Cleaned up and typed from my handwritten notes.",
+    "Diagrams redrawn with labels.",
+)
+_COMMENTS = (
+    "Thanks, this helped a lot!", "Is there a part two?", "Great summary.", "The second example has a typo.",
+    "Saved me before the exam.", "Can you upload the slides too?", "Super clear, thank you.",
+    "Does this cover chapter 5?",
+)
+
+
+def _timestamp(at: datetime) -> str:
+    """The ``DateTime`` format SQLAlchemy stores on SQLite, and Postgres reads."""
+    return at.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _chunks(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_insert(engine, table: str, columns: Sequence[str], rows: Iterable[tuple],
+                chunk_size: int = CHUNK_SIZE) -> int:
+    """Insert ``rows`` with ``COPY`` on Postgres, or chunked ``executemany`` elsewhere."""
+    raw = engine.raw_connection()
+    inserted = 0
+    try:
+        cursor = raw.cursor()
+        column_list = ", ".join(columns)
+        if engine.dialect.name == "postgresql":
+            statement = f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT csv)"
+            for chunk in _chunks(rows, chunk_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(chunk)
+                buffer.seek(0)
+                cursor.copy_expert(statement, buffer)
+                inserted += len(chunk)
+            raw.commit()
+        else:
+            marker = "?" if engine.dialect.paramstyle == "qmark" else "%s"
+            statement = f"INSERT INTO {table} ({column_list}) VALUES ({', '.join([marker] * len(columns))})"
+            if engine.dialect.name == "sqlite":
+                # Seeding can be re-run; don't wait for the disk after every chunk
+                synchronous = cursor.execute("PRAGMA synchronous").fetchone()[0]
+                cursor.execute("PRAGMA synchronous=OFF")
+            for chunk in _chunks(rows, chunk_size):
+                cursor.executemany(statement, chunk)
+                raw.commit()
+                inserted += len(chunk)
+            if engine.dialect.name == "sqlite":
+                cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.close()
+    finally:
+        raw.close()
+    return inserted
+
+
+def _next_id(db, model) -> int:
+    return (db.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _zipf_sum(ranks: float) -> float:
+    """Approximately ``sum(1 / r ** POPULARITY_SKEW for r in 1..ranks)`` (Euler-Maclaurin)."""
+    if ranks < 1:
+        return 0.0
+    s = POPULARITY_SKEW
+    return (ranks ** (1 - s) - 1) / (1 - s) + 0.5 * (1 + ranks ** -s) + s / 12 * (1 - ranks ** (-s - 1))
+
+
+def _popularity(count: int, total: int, cap: int, rng: random.Random) -> Iterator[int]:
+    """How many events each of ``count`` items gets: Zipf-like, at most ``cap``, about ``total`` in all.
+
+    The curve is scaled so that it still adds up to ``total`` after the most
+    popular items are capped.  Ranks are scrambled with a multiplicative
+    permutation, so popular items are spread across ids without holding a
+    shuffled list of ``count`` ranks.
+    """
+    if count == 0 or total == 0 or cap == 0:
+        yield from (0 for _ in range(count))
+        return
+
+    def capped_total(scale: float) -> float:
+        capped = min(count, math.floor((scale / cap) ** (1 / POPULARITY_SKEW)))
+        return cap * capped + scale * (_zipf_sum(count) - _zipf_sum(capped))
+
+    low, high = 0.0, cap * count ** POPULARITY_SKEW
+    for _ in range(100):
+        middle = (low + high) / 2
+        low, high = (middle, high) if capped_total(middle) < total else (low, middle)
+    stride = 7919 if math.gcd(7919, count) == 1 else 1
+    for index in range(count):
+        rank = (index * stride) % count + 1
+        expected = min(high / rank ** POPULARITY_SKEW, cap)
+        yield int(expected) + (rng.random() < expected - int(expected))
+
+
+def seed(engine, users: int = 1000, notes: int = 10_000, likes: int = 50_000, comments: int = 10_000,
+         files: int = 200, classes: int = 200, days: int = 365, password: str = "seedpassword",
+         random_seed: int = 1, related: bool = False) -> dict:
+    """Add synthetic data to the database behind ``engine``; returns rows inserted per table."""
+    from sqlalchemy.orm import sessionmaker
+    from auth import get_password_hash
+    from models import User, Note, Like, Comment
+    from storage import get_storage_instance, LocalStorage
+    import trending
+
+    storage = get_storage_instance()
+    if notes and not isinstance(storage, LocalStorage):
+        raise RuntimeError("Seeding writes note files, so it needs STORAGE_TYPE=local")
+
+    rng = random.Random(random_seed)
+    session = sessionmaker(bind=engine)()
+    try:
+        first_user, first_note = _next_id(session, User), _next_id(session, Note)
+        first_like, first_comment = _next_id(session, Like), _next_id(session, Comment)
+    finally:
+        session.close()
+    user_ids = range(first_user, first_user + users) if users else None
+    if notes and not user_ids:
+        raise RuntimeError("Notes need authors; seed at least one user")
+
+    now = datetime.utcnow()
+    start = now - timedelta(days=days)
+    counts = {}
+    started = time.perf_counter()
+
+    def report(table: str, inserted: int) -> None:
+        counts[table] = inserted
+        elapsed = time.perf_counter() - started
+        logger.info("Seeded %d %s (%.1fs so far)", inserted, table, elapsed)
+
+    # Users: one bcrypt hash for everyone, so seeding stays fast
+    hashed_password = get_password_hash(password)
+    report("users", bulk_insert(engine, "users", ("id", "email", "username", "hashed_password", "created_at"), (
+        (user_id, f"seed{user_id}@{EMAIL_DOMAIN}", f"seed_{user_id}", hashed_password,
+         _timestamp(start + timedelta(seconds=rng.uniform(0, days * 86400))))
+        for user_id in (user_ids or ())
+    )))
+
+    # Files: a pool of small text notes shared between the seeded notes
+    file_paths = [
+        storage.save_file(
+            "\n\n".join(rng.choice(_SENTENCES) for _ in range(rng.randint(20, 200))).encode(),
+            f"seed_{random_seed}_{index:05d}.txt",
+        )
+        for index in range(max(1, min(files, notes)) if notes else 0)
+    ]
+    class_names = [f"{_SUBJECTS[index % len(_SUBJECTS)]} {100 + index // len(_SUBJECTS) * 7 % 400}"
+                   for index in range(max(1, classes))]
+    # A fifth of the accounts write the notes, some far more than others
+    authors = list(user_ids)[:max(1, users // 5)] if notes else []
+
+    # Per note, to date its likes and comments after it and write its feed entry
+    note_created = array("d", [0.0]) * notes  # Seconds after ``start``
+    note_class = array("l", [0]) * notes
+    note_author = array("l", [0]) * notes
+
+    def note_rows():
+        for index in range(notes):
+            note_created[index] = (index + rng.random()) / notes * days * 86400
+            note_class[index] = int(rng.paretovariate(1.2)) % len(class_names)
+            note_author[index] = authors[int(rng.paretovariate(1.0)) % len(authors)]
+            yield (
+                first_note + index,
+                f"{rng.choice(_KINDS)} {rng.randint(1, 15)}",
+                class_names[note_class[index]],
+                " ".join(rng.sample(_SENTENCES, rng.randint(1, 3))) if rng.random() < 0.7 else None,
+                file_paths[index % len(file_paths)],
+                note_author[index],
+                _timestamp(start + timedelta(seconds=note_created[index])),
+            )
+
+    report("notes", bulk_insert(engine, "notes", (
+        "id", "title", "class_name", "description", "file_path", "author_id", "created_at"
+    ), note_rows()))
+
+    def event_time(index: int) -> str:
+        after = note_created[index]
+        return _timestamp(start + timedelta(seconds=after + rng.random() * (days * 86400 - after)))
+
+    like_counts = [0] * notes
+
+    def like_rows():
+        like_id = first_like
+        for index, count in enumerate(_popularity(notes, likes, users, rng)):
+            like_counts[index] = count
+            for user_id in rng.sample(user_ids, count):
+                yield like_id, first_note + index, user_id, event_time(index)
+                like_id += 1
+
+    report("likes", bulk_insert(engine, "likes", ("id", "note_id", "user_id", "created_at"), like_rows()))
+
+    def comment_rows():
+        comment_id = first_comment
+        for index, count in enumerate(_popularity(notes, comments, 10 * users, rng)):
+            for _ in range(count):
+                yield (comment_id, first_note + index, rng.choice(user_ids),
+                       " ".join(rng.sample(_COMMENTS, rng.randint(1, 2))), event_time(index))
+                comment_id += 1
+
+    report("comments", bulk_insert(engine, "comments", (
+        "id", "note_id", "user_id", "content", "created_at"
+    ), comment_rows()))
+
+    # Counters the listings read instead of counting likes
+    report("note_stats", bulk_insert(engine, "note_stats", (
+        "note_id", "like_count", "preview_count", "download_count"
+    ), (
+        (first_note + index, count, count * rng.randint(3, 20) + rng.randint(0, 30),
+         count * rng.randint(0, 4) + rng.randint(0, 5))
+        for index, count in enumerate(like_counts)
+    )))
+
+    # One feed entry per note, in upload order
+    report("note_changes", bulk_insert(engine, "note_changes", (
+        "note_id", "author_id", "class_name", "kind", "changed_at"
+    ), (
+        (first_note + index, note_author[index], class_names[note_class[index]], "created",
+         _timestamp(start + timedelta(seconds=note_created[index])))
+        for index in range(notes)
+    )))
+
+    if engine.dialect.name == "postgresql":
+        # Rows were copied with explicit ids; move the sequences past them
+        with engine.begin() as conn:
+            for table in ("users", "notes", "likes", "comments"):
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"
+                ))
+
+    session = sessionmaker(bind=engine)()
+    try:
+        counts["note_trending"] = trending.rebuild(session)
+        session.commit()
+        if related:
+            import related as related_notes
+            counts["note_related"] = related_notes.rebuild(session)
+    finally:
+        session.close()
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    logger.info("Seeded %d rows in %.1fs (%.0f rows/s)", total, elapsed, total / max(elapsed, 1e-9))
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Seed the database with synthetic users, notes, likes and comments")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--notes", type=int, default=10_000)
+    parser.add_argument("--likes", type=int, default=50_000, help="About this many, Zipf-distributed over notes")
+    parser.add_argument("--comments", type=int, default=10_000)
+    parser.add_argument("--files", type=int, default=200, help="Distinct note files to write to local storage")
+    parser.add_argument("--classes", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365, help="Spread uploads over this many days")
+    parser.add_argument("--password", default="seedpassword", help="Password of every seeded account")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument("--related", action="store_true", help="Also rebuild co-like recommendations")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from database import engine, init_db
+
+    init_db()
+    counts = seed(engine, args.users, args.notes, args.likes, args.comments, args.files, args.classes,
+                  args.days, args.password, args.seed, args.related)
+    print(", ".join(f"{count} {table}" for table, count in counts.items()))
@@ -0,0 +1,599 @@
+"""Near-duplicate detection for notes.
+
+Every note gets a compact signature once it has been processed:
+
+* documents: a MinHash signature over word 5-gram shingles of the text
+  extracted by extraction.py, so the fraction of equal positions in two
+  signatures estimates the Jaccard similarity of their shingle sets;
+* images: a 64-bit difference hash (dHash), compared by Hamming distance.
+
+Signatures are stored in ``note_signatures`` and indexed in memory with
+banded locality-sensitive hashing: a signature is cut into bands and each
+band hashed to a bucket key, and only notes sharing at least one bucket are
+compared.  Each band is a pair of sorted NumPy arrays (keys and note ids)
+rather than a dict of lists, so the index costs about 130 bytes per
+document and 40 per image (~130 MiB for 1M documents).  Additions since the
+last compaction live in a small dict and deletions in a tombstone set; both
+are merged into the arrays once they grow.
+
+When a new signature matches an older note in the same class closely enough,
+the new note is marked ``duplicate_of`` it, and ``/api/notes/global`` can
+hide such notes with ``collapse_duplicates=true``.
+
+Run ``python similarity.py --backfill`` to sign notes uploaded before this
+existed.
+"""
+import io
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    from config import SIMILARITY_MIN_SCORE, SIMILARITY_DUPLICATE_SCORE, SIMILARITY_MAX_CANDIDATES
+except ImportError:
+    SIMILARITY_MIN_SCORE = 0.5
+    SIMILARITY_DUPLICATE_SCORE = 0.85
+    SIMILARITY_MAX_CANDIDATES = 2000
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.warning("NumPy not installed. Near-duplicate detection is disabled.")
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+KIND_TEXT = "text"
+KIND_IMAGE = "image"
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+
+# MinHash: 64 permutations in 16 bands of 4 rows.  Two documents become
+# candidates with probability 1 - (1 - J^4)^16: ~50% at J=0.5, ~99% at J=0.8.
+NUM_PERM = 64
+TEXT_BANDS = 16
+TEXT_ROWS = NUM_PERM // TEXT_BANDS
+SHINGLE_WORDS = 5
+MAX_TOKENS = 50_000  # Long documents are signed from their first 50k words
+
+# dHash: four 16-bit bands, so any two hashes within Hamming distance 3 are
+# guaranteed to share a band, and most within 8 do
+IMAGE_BANDS = 4
+HASH_SIZE = 8
+
+_TOKEN = re.compile(r"\w+")
+_HASH_CHUNK = 1 << 15  # Shingles hashed per NumPy pass, bounds temporary memory
+
+if NUMPY_AVAILABLE:
+    _rng = np.random.default_rng(0x5EED)  # Fixed: signatures must be stable across processes
+    _PERM_A = _rng.integers(1, 2**63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+    _PERM_B = _rng.integers(0, 2**63, size=NUM_PERM, dtype=np.uint64)
+    _MIX = np.uint64(0x9E3779B97F4A7C15)
+    _EMPTY_SLOT = np.uint32(0xFFFFFFFF)
+
+
+def shingle_hashes(text: str) -> "np.ndarray":
+    """Hash the distinct word 5-grams of a text to 64-bit integers."""
+    tokens = _TOKEN.findall(text.lower())[:MAX_TOKENS]
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    words = np.fromiter((zlib.crc32(token.encode()) for token in tokens),
+                        dtype=np.uint64, count=len(tokens))
+    width = min(SHINGLE_WORDS, len(words))
+    count = len(words) - width + 1
+    shingles = words[:count].copy()
+    for offset in range(1, width):
+        shingles = shingles * _MIX + words[offset:offset + count]  # Wraps mod 2**64
+    return np.unique(shingles)
+
+
+def minhash_batch(shingle_sets: Sequence["np.ndarray"]) -> "np.ndarray":
+    """
+    Compute MinHash signatures for many shingle sets at once.
+
+    All shingles are concatenated and hashed by every permutation in
+    fixed-size chunks, ``(a * x + b) >> 32`` in wrapping 64-bit arithmetic,
+    and the per-document minimum is taken with ``np.minimum.reduceat``.
+    Returns a ``(len(shingle_sets), NUM_PERM)`` uint32 array; empty sets get
+    all-ones rows.
+    """
+    signatures = np.full((len(shingle_sets), NUM_PERM), _EMPTY_SLOT, dtype=np.uint32)
+    lengths = np.array([len(s) for s in shingle_sets], dtype=np.int64)
+    if not lengths.sum():
+        return signatures
+    values = np.concatenate(shingle_sets)
+    owners = np.repeat(np.arange(len(shingle_sets)), lengths)
+    for start in range(0, len(values), _HASH_CHUNK):
+        x = values[start:start + _HASH_CHUNK]
+        chunk_owners = owners[start:start + _HASH_CHUNK]
+        hashed = ((_PERM_A[:, None] * x[None, :] + _PERM_B[:, None]) >> np.uint64(32)).astype(np.uint32)
+        bounds = np.flatnonzero(np.r_[True, chunk_owners[1:] != chunk_owners[:-1]])
+        minimums = np.minimum.reduceat(hashed, bounds, axis=1).T
+        rows = chunk_owners[bounds]
+        signatures[rows] = np.minimum(signatures[rows], minimums)
+    return signatures
+
+
+def text_band_keys(signatures: "np.ndarray") -> "np.ndarray":
+    """Hash each band of ``(n, NUM_PERM)`` MinHash signatures to a uint32 key."""
+    rows = signatures.reshape(len(signatures), TEXT_BANDS, TEXT_ROWS).astype(np.uint64)
+    keys = rows[:, :, 0]
+    for row in range(1, TEXT_ROWS):
+        keys = keys * _MIX + rows[:, :, row]
+    return (keys ^ (keys >> np.uint64(32))).astype(np.uint32)
+
+
+def image_band_keys(hashes: "np.ndarray") -> "np.ndarray":
+    """Split ``(n,)`` uint64 dHashes into ``(n, IMAGE_BANDS)`` 16-bit keys."""
+    shifts = np.arange(IMAGE_BANDS, dtype=np.uint64) * np.uint64(16)
+    return ((hashes[:, None] >> shifts[None, :]) & np.uint64(0xFFFF)).astype(np.uint32)
+
+
+def image_hash(content: bytes) -> int:
+    """64-bit difference hash of an image: is each pixel brighter than its right neighbour?"""
+    image = Image.open(io.BytesIO(content))
+    image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))  # Fast JPEG downscale
+    image = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def _decode(kind: str, blob: bytes) -> "np.ndarray":
+    if kind == KIND_TEXT:
+        return np.frombuffer(blob, dtype="<u4")
+    return np.frombuffer(blob, dtype="<u8")
+
+
+def _encode(kind: str, signature) -> bytes:
+    if kind == KIND_TEXT:
+        return np.asarray(signature, dtype="<u4").tobytes()
+    return np.array([signature], dtype="<u8").tobytes()
+
+
+def _scores(kind: str, signature: "np.ndarray", others: "np.ndarray") -> "np.ndarray":
+    """Similarity in [0, 1] of one signature against a stack of others."""
+    if kind == KIND_TEXT:
+        return (others == signature[None, :]).mean(axis=1)
+    distance = np.unpackbits((others ^ signature).view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+    return 1.0 - distance / 64.0
+
+
+class LSHIndex:
+    """
+    Banded LSH index over note ids with one sorted key array per band.
+
+    Lookups binary-search each band; ``add``/``remove`` touch only the
+    pending dict and tombstone set until ``compact`` merges them.  Adding
+    an id that is already indexed (a re-sign, or a reused id) compacts its
+    old keys away first.
+    """
+
+    def __init__(self, bands: int):
+        self.bands = bands
+        self._keys = [np.empty(0, dtype=np.uint32) for _ in range(bands)]
+        self._ids = [np.empty(0, dtype=np.int32) for _ in range(bands)]
+        self._members = np.empty(0, dtype=np.int32)  # Sorted ids in the arrays
+        self._pending: Dict[Tuple[int, int], List[int]] = {}
+        self._pending_ids: Set[int] = set()
+        self._removed: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._members) + len(self._pending_ids) - len(self._removed)
+
+    def __contains__(self, note_id: int) -> bool:
+        return note_id not in self._removed and self._has_entries(note_id)
+
+    def _has_entries(self, note_id: int) -> bool:
+        """Whether ``note_id`` has keys in the arrays or pending, tombstoned or not."""
+        if note_id in self._pending_ids:
+            return True
+        position = np.searchsorted(self._members, note_id)
+        return position < len(self._members) and self._members[position] == note_id
+
+    def add_many(self, note_ids: "np.ndarray", keys: "np.ndarray") -> None:
+        """Bulk-insert ``(n,)`` ids with their ``(n, bands)`` keys and re-sort."""
+        if not len(note_ids):
+            return
+        note_ids = np.asarray(note_ids, dtype=np.int32)
+        with self._lock:
+            # Re-added ids replace their old keys, which must not come back
+            stale = [note_id for note_id in note_ids.tolist() if self._has_entries(note_id)]
+            if stale:
+                self._removed.update(stale)
+                self._compact()
+            for band in range(self.bands):
+                band_keys = np.concatenate([self._keys[band], keys[:, band]])
+                band_ids = np.concatenate([self._ids[band], note_ids])
+                order = np.argsort(band_keys, kind="stable")
+                self._keys[band] = band_keys[order]
+                self._ids[band] = band_ids[order]
+            self._members = np.union1d(self._members, note_ids)
+
+    def add(self, note_id: int, keys: "np.ndarray") -> None:
+        with self._lock:
+            if self._has_entries(note_id):
+                self._removed.add(note_id)
+                self._compact()
+            self._pending_ids.add(note_id)
+            for band in range(self.bands):
+                self._pending.setdefault((band, int(keys[band])), []).append(note_id)
+            needs_compaction = len(self._pending_ids) > max(1024, len(self._members) // 64)
+        if needs_compaction:
+            self.compact()
+
+    def remove(self, note_id: int) -> None:
+        with self._lock:
+            # Deletes reach both indexes; only tombstone ids this one has
+            if not self._has_entries(note_id):
+                return
+            self._removed.add(note_id)
+            needs_compaction = len(self._removed) > max(1024, len(self._members) // 64)
+        if needs_compaction:
+            self.compact()
+
+    def candidates(self, keys: "np.ndarray", limit: int) -> Set[int]:
+        """Ids sharing at least one band key, up to ``limit`` of them."""
+        found: Set[int] = set()
+        with self._lock:
+            for band in range(self.bands):
+                key = keys[band]
+                lo = np.searchsorted(self._keys[band], key, side="left")
+                hi = np.searchsorted(self._keys[band], key, side="right")
+                found.update(self._ids[band][lo:min(hi, lo + limit)].tolist())
+                found.update(self._pending.get((band, int(key)), ()))
+                if len(found) >= limit:
+                    break
+            found.difference_update(self._removed)
+        return found
+
+    def compact(self) -> None:
+        """Merge pending additions into the sorted arrays and drop tombstones."""
+        with self._lock:
+            self._compact()
+
+    def _compact(self) -> None:
+        removed = np.fromiter(self._removed, dtype=np.int32, count=len(self._removed))
+        for band in range(self.bands):
+            pending = [(key, note_id) for (b, key), ids in self._pending.items() if b == band
+                       for note_id in ids]
+            band_keys = np.concatenate([self._keys[band],
+                                        np.array([k for k, _ in pending], dtype=np.uint32)])
+            band_ids = np.concatenate([self._ids[band],
+                                       np.array([i for _, i in pending], dtype=np.int32)])
+            if len(removed):
+                keep = ~np.isin(band_ids, removed)
+                band_keys, band_ids = band_keys[keep], band_ids[keep]
+            order = np.argsort(band_keys, kind="stable")
+            self._keys[band] = band_keys[order]
+            self._ids[band] = band_ids[order]
+        members = np.union1d(self._members, np.fromiter(self._pending_ids, dtype=np.int32))
+        self._members = np.setdiff1d(members, removed, assume_unique=True)
+        self._pending.clear()
+        self._pending_ids.clear()
+        self._removed.clear()
+
+    def nbytes(self) -> int:
+        return sum(k.nbytes + i.nbytes for k, i in zip(self._keys, self._ids)) + self._members.nbytes
+
+
+class SimilarityIndex:
+    """
+    Per-process LSH indexes for document and image signatures.
+
+    Loaded from ``note_signatures`` on first use and then kept current by
+    this process's own signing and deletes, plus a periodic catch-up query
+    for signatures written by other processes.  Notes deleted elsewhere are
+    dropped at query time, when their signatures are no longer found.
+    """
+
+    SYNC_INTERVAL = 5.0  # Seconds between catch-up queries
+    SYNC_OVERLAP = timedelta(minutes=5)  # Re-read window for late commits
+
+    def __init__(self):
+        self.text = LSHIndex(TEXT_BANDS)
+        self.image = LSHIndex(IMAGE_BANDS)
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._synced_at: Optional[datetime] = None
+        self._last_sync = 0.0
+
+    def _index(self, kind: str) -> LSHIndex:
+        return self.text if kind == KIND_TEXT else self.image
+
+    def add(self, note_id: int, kind: str, signature: "np.ndarray") -> None:
+        if kind == KIND_TEXT:
+            keys = text_band_keys(signature[None, :])[0]
+        else:
+            keys = image_band_keys(signature.reshape(1))[0]
+        self._index(kind).add(note_id, keys)
+
+    def remove(self, note_id: int) -> None:
+        self.text.remove(note_id)
+        self.image.remove(note_id)
+
+    def _load_rows(self, rows: Iterable, skip_known: bool) -> int:
+        text_ids, text_sigs, image_ids, image_sigs = [], [], [], []
+        for note_id, kind, blob in rows:
+            if skip_known and note_id in self._index(kind):
+                continue
+            if kind == KIND_TEXT:
+                text_ids.append(note_id)
+                text_sigs.append(_decode(kind, blob))
+            else:
+                image_ids.append(note_id)
+                image_sigs.append(_decode(kind, blob)[0])
+        if text_ids:
+            self.text.add_many(np.array(text_ids), text_band_keys(np.vstack(text_sigs)))
+        if image_ids:
+            self.image.add_many(np.array(image_ids), image_band_keys(np.array(image_sigs, dtype=np.uint64)))
+        return len(text_ids) + len(image_ids)
+
+    def ensure_loaded(self, db, batch_size: int = 50_000) -> None:
+        """Build the indexes from the database, once per process."""
+        from models import NoteSignature
+
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            started = time.perf_counter()
+            self._synced_at = datetime.utcnow()
+            query = db.query(NoteSignature.note_id, NoteSignature.kind, NoteSignature.signature)
+            batch, total = [], 0
+            for row in query.yield_per(batch_size):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    total += self._load_rows(batch, skip_known=False)
+                    batch = []
+            total += self._load_rows(batch, skip_known=False)
+            self._last_sync = time.monotonic()
+            self._loaded = True
+            logger.info("Loaded %d note signatures into the similarity index in %.1fs (%.1f MiB)",
+                        total, time.perf_counter() - started,
+                        (self.text.nbytes() + self.image.nbytes()) / 1024 / 1024)
+
+    def sync(self, db) -> None:
+        """Pick up signatures other processes have written since the last sync."""
+        from models import NoteSignature
+
+        self.ensure_loaded(db)
+        if time.monotonic() - self._last_sync < self.SYNC_INTERVAL:
+            return
+        now = datetime.utcnow()
+        rows = db.query(NoteSignature.note_id, NoteSignature.kind, NoteSignature.signature).filter(
+            NoteSignature.computed_at >= self._synced_at - self.SYNC_OVERLAP
+        ).all()
+        self._load_rows(rows, skip_known=True)
+        self._synced_at = now
+        self._last_sync = time.monotonic()
+
+    def find_similar(
+        self,
+        db,
+        kind: str,
+        signature: "np.ndarray",
+        min_score: float = SIMILARITY_MIN_SCORE,
+        exclude: Optional[int] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Return ``(note_id, score)`` pairs at or above ``min_score``, best first.
+
+        LSH candidates are re-scored against their stored signatures, which
+        also filters out notes deleted by other processes.
+        """
+        from models import NoteSignature
+
+        if kind == KIND_TEXT:
+            keys = text_band_keys(signature[None, :])[0]
+        else:
+            keys = image_band_keys(signature.reshape(1))[0]
+        candidates = self._index(kind).candidates(keys, SIMILARITY_MAX_CANDIDATES)
+        candidates.discard(exclude)
+        if not candidates:
+            return []
+
+        ids, stored = [], []
+        candidate_list = list(candidates)
+        for start in range(0, len(candidate_list), 500):
+            rows = db.query(NoteSignature.note_id, NoteSignature.signature).filter(
+                NoteSignature.note_id.in_(candidate_list[start:start + 500]),
+                NoteSignature.kind == kind,
+            ).all()
+            for note_id, blob in rows:
+                ids.append(note_id)
+                stored.append(_decode(kind, blob))
+        if not ids:
+            return []
+        scores = _scores(kind, signature, np.vstack(stored) if kind == KIND_TEXT else np.concatenate(stored))
+        order = np.argsort(-scores, kind="stable")
+        return [(ids[i], float(scores[i])) for i in order if scores[i] >= min_score]
+
+
+similarity_index = SimilarityIndex()
+
+
+def _signature_for_note(db, note) -> Tuple[Optional[str], Optional["np.ndarray"]]:
+    """Compute a note's signature from its extracted text or image file."""
+    from models import NoteContent
+    from storage import storage
+
+    ext = os.path.splitext(note.file_path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        if not PIL_AVAILABLE:
+            return None, None
+        return KIND_IMAGE, np.array(image_hash(storage.get_file(note.file_path)), dtype=np.uint64)
+    content = db.query(NoteContent.content).filter(NoteContent.note_id == note.id).scalar()
+    shingles = shingle_hashes(content or "")
+    if not len(shingles):
+        return None, None
+    return KIND_TEXT, minhash_batch([shingles])[0]
+
+
+def _find_original(db, note, kind: str, signature: "np.ndarray") -> Optional[int]:
+    """The earliest near-identical note in the same class, if any."""
+    from models import Note, NoteSignature
+
+    matches = similarity_index.find_similar(db, kind, signature, SIMILARITY_DUPLICATE_SCORE, exclude=note.id)
+    if not matches:
+        return None
+    original = db.query(Note.id, NoteSignature.duplicate_of).join(
+        NoteSignature, NoteSignature.note_id == Note.id
+    ).filter(
+        Note.id.in_([note_id for note_id, _ in matches]),
+        Note.class_name == note.class_name,
+        Note.id < note.id,
+    ).order_by(Note.id).first()
+    if original is None:
+        return None
+    return original.duplicate_of or original.id
+
+
+def _store_signature(db, note, kind: str, signature: "np.ndarray") -> bool:
+    """Save a note's signature and duplicate marker; False if the note was deleted."""
+    from models import NoteSignature
+    from sqlalchemy.exc import IntegrityError
+
+    duplicate_of = _find_original(db, note, kind, signature)
+    try:
+        row = db.query(NoteSignature).filter(NoteSignature.note_id == note.id).first()
+        if row is None:
+            row = NoteSignature(note_id=note.id)
+            db.add(row)
+        row.kind = kind
+        row.signature = _encode(kind, signature)
+        row.duplicate_of = duplicate_of
+        row.computed_at = datetime.utcnow()
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    similarity_index.add(note.id, kind, signature)
+    if duplicate_of:
+        logger.info("Note %s is a near-duplicate of note %s", note.id, duplicate_of)
+    return True
+
+
+def compute_for_note(note_id: int) -> bool:
+    """
+    Sign a note and check it against the index.
+
+    Returns False when the note is gone or has nothing to sign (no extracted
+    text, unsupported type).  Raises on storage errors so the job is retried.
+    """
+    from database import SessionLocal
+    from models import Note
+
+    if not NUMPY_AVAILABLE:
+        return False
+    db = SessionLocal()
+    try:
+        note = db.query(Note).filter(Note.id == note_id).first()
+        if note is None:
+            return False
+        kind, signature = _signature_for_note(db, note)
+        if kind is None:
+            return False
+        similarity_index.sync(db)
+        return _store_signature(db, note, kind, signature)
+    finally:
+        db.close()
+
+
+def similar_notes(db, note_id: int, limit: int) -> List[Tuple[int, float]]:
+    """Notes most similar to ``note_id``, from its stored signature."""
+    from models import NoteSignature
+
+    if not NUMPY_AVAILABLE:
+        return []
+    row = db.query(NoteSignature.kind, NoteSignature.signature).filter(
+        NoteSignature.note_id == note_id
+    ).first()
+    if row is None:
+        return []
+    similarity_index.sync(db)
+    return similarity_index.find_similar(db, row.kind, _decode(row.kind, row.signature), exclude=note_id)[:limit]
+
+
+def backfill(batch_size: int = 256) -> int:
+    """
+    Sign every note that has no signature yet.
+
+    Document signatures are computed a batch at a time with one vectorized
+    MinHash pass; notes are processed oldest first so the earliest copy of a
+    duplicate stays the original.
+    """
+    from database import SessionLocal
+    from models import Note, NoteContent, NoteSignature
+
+    db = SessionLocal()
+    try:
+        similarity_index.ensure_loaded(db)
+        note_ids = [
+            note_id for (note_id,) in db.query(Note.id)
+            .outerjoin(NoteSignature, NoteSignature.note_id == Note.id)
+            .filter(NoteSignature.note_id.is_(None))
+            .order_by(Note.id)
+            .all()
+        ]
+        started = time.perf_counter()
+        signed = failed = 0
+        for start in range(0, len(note_ids), batch_size):
+            notes = db.query(Note).filter(Note.id.in_(note_ids[start:start + batch_size])).order_by(Note.id).all()
+            contents = dict(db.query(NoteContent.note_id, NoteContent.content).filter(
+                NoteContent.note_id.in_([note.id for note in notes])
+            ).all())
+            documents = [note for note in notes if note.id in contents]
+            shingle_sets = [shingle_hashes(contents[note.id]) for note in documents]
+            signatures = dict(zip((note.id for note in documents), minhash_batch(shingle_sets)))
+            shingle_counts = dict(zip((note.id for note in documents), map(len, shingle_sets)))
+            for note in notes:
+                try:
+                    if note.id in signatures:
+                        if not shingle_counts[note.id]:
+                            continue
+                        kind, signature = KIND_TEXT, signatures[note.id]
+                    else:
+                        kind, signature = _signature_for_note(db, note)
+                        if kind is None:
+                            continue
+                    signed += _store_signature(db, note, kind, signature)
+                except Exception as e:
+                    db.rollback()
+                    failed += 1
+                    logger.warning("Signature failed for note %s: %s", note.id, e)
+            elapsed = time.perf_counter() - started
+            done = start + len(notes)
+            logger.info("Backfill: %d/%d notes, %d signed, %d failures, %.1f notes/s",
+                        done, len(note_ids), signed, failed, done / elapsed)
+        return signed
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Near-duplicate signature maintenance")
+    parser.add_argument("--backfill", action="store_true", help="Sign notes missing a signature")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.backfill:
+        count = backfill()
+        print(f"Signed {count} notes")
+    else:
+        parser.print_help()
@@ -0,0 +1,196 @@
+"""Prebuilt statements for the hottest queries, and Postgres prepared statements.
+
+Every authenticated request looks its user up by email, most note routes
+load a note by id, and every page of notes counts likes and comments.
+Building those through ``db.query(...)`` takes more Python time than
+running them, so they are built here once, with bound parameters, and a
+request only supplies the values; SQLAlchemy's compiled cache then has the
+SQL string ready.
+
+On Postgres the same statements are prepared on the server as well, so it
+skips parsing and planning them: with psycopg2 through ``PREPARE`` /
+``EXECUTE``, done by ``install_prepared_statements``, and with psycopg 3
+(``postgresql+psycopg://``) by the driver itself.  Set
+``DB_PREPARED_STATEMENTS=false`` behind a transaction-pooling proxy such as
+PgBouncer in transaction mode, where the next transaction may run on a
+server connection that never saw the ``PREPARE``.
+"""
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Set
+
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.orm import Session
+
+try:
+    from config import DB_PREPARED_STATEMENTS
+except ImportError:
+    DB_PREPARED_STATEMENTS = True
+
+logger = logging.getLogger(__name__)
+
+# Server-side statements per connection; each IN-list length is its own
+_MAX_PREPARED = 64
+
+
+# Statements are built on first use, since models are imported lazily
+
+@lru_cache(maxsize=None)
+def _user_by_email():
+    from models import User
+    return select(User).where(User.email == bindparam("email")).limit(1).execution_options(prepare=True)
+
+
+@lru_cache(maxsize=None)
+def _note_by_id():
+    from models import Note
+    return select(Note).where(Note.id == bindparam("note_id")).limit(1).execution_options(prepare=True)
+
+
+@lru_cache(maxsize=None)
+def _note_exists():
+    from models import Note
+    return select(Note.id).where(Note.id == bindparam("note_id")).limit(1).execution_options(prepare=True)
+
+
+@lru_cache(maxsize=None)
+def _like_counts():
+    from models import Like
+    return (
+        select(Like.note_id, func.count(Like.id))
+        .where(Like.note_id.in_(bindparam("note_ids", expanding=True)))
+        .group_by(Like.note_id)
+        .execution_options(prepare=True)
+    )
+
+
+@lru_cache(maxsize=None)
+def _comment_counts():
+    from models import Comment
+    return (
+        select(Comment.note_id, func.count(Comment.id))
+        .where(Comment.note_id.in_(bindparam("note_ids", expanding=True)))
+        .group_by(Comment.note_id)
+        .execution_options(prepare=True)
+    )
+
+
+@lru_cache(maxsize=None)
+def _has_liked():
+    from models import Like
+    return (
+        select(Like.id)
+        .where(Like.note_id == bindparam("note_id"), Like.user_id == bindparam("user_id"))
+        .limit(1)
+        .execution_options(prepare=True)
+    )
+
+
+@lru_cache(maxsize=None)
+def _liked_among():
+    from models import Like
+    return (
+        select(Like.note_id)
+        .where(Like.user_id == bindparam("user_id"), Like.note_id.in_(bindparam("note_ids", expanding=True)))
+        .execution_options(prepare=True)
+    )
+
+
+@lru_cache(maxsize=None)
+def _note_stats():
+    from models import NoteStats
+    return (
+        select(NoteStats)
+        .where(NoteStats.note_id.in_(bindparam("note_ids", expanding=True)))
+        .execution_options(prepare=True)
+    )
+
+
+def user_by_email(db: Session, email: str):
+    return db.execute(_user_by_email(), {"email": email}).scalars().first()
+
+
+def note_by_id(db: Session, note_id: int):
+    return db.execute(_note_by_id(), {"note_id": note_id}).scalars().first()
+
+
+def note_exists(db: Session, note_id: int) -> bool:
+    return db.execute(_note_exists(), {"note_id": note_id}).first() is not None
+
+
+def like_counts(db: Session, note_ids: Iterable[int]) -> Dict[int, int]:
+    """Likes per note, for the notes that have any."""
+    return dict(db.execute(_like_counts(), {"note_ids": list(note_ids)}).all())
+
+
+def comment_counts(db: Session, note_ids: Iterable[int]) -> Dict[int, int]:
+    """Comments per note, for the notes that have any."""
+    return dict(db.execute(_comment_counts(), {"note_ids": list(note_ids)}).all())
+
+
+def has_liked(db: Session, user_id: int, note_id: int) -> bool:
+    return db.execute(_has_liked(), {"note_id": note_id, "user_id": user_id}).first() is not None
+
+
+def liked_among(db: Session, user_id: int, note_ids: Iterable[int]) -> Set[int]:
+    """The notes among ``note_ids`` that the user has liked."""
+    return set(db.execute(_liked_among(), {"user_id": user_id, "note_ids": list(note_ids)}).scalars())
+
+
+def note_stats(db: Session, note_ids: List[int]):
+    """``NoteStats`` rows of the given notes."""
+    return db.execute(_note_stats(), {"note_ids": note_ids}).scalars().all()
+
+
+# psycopg2 has no prepared statements of its own, so statements marked
+# ``prepare`` are rewritten: the first run on a connection PREPAREs the SQL
+# with $n placeholders, and every run becomes an EXECUTE of it.  Prepared
+# statements live as long as the server connection.
+
+_PYFORMAT_PARAM = re.compile(r"%\((\w+)\)s")
+
+# The server does not have the statement (26000), or a schema change made its
+# plan stale (0A000)
+_STALE_PREPARED_CODES = {"26000", "0A000"}
+
+
+def _prepare_hot_statement(conn, cursor, statement, parameters, context, executemany):
+    if executemany or context is None or not context.execution_options.get("prepare"):
+        return statement, parameters
+    prepared = conn.info.setdefault("prepared_statements", {})
+    entry = prepared.get(statement)
+    if entry is None:
+        if len(prepared) >= _MAX_PREPARED:
+            return statement, parameters
+        positions: Dict[str, int] = {}
+        for name in _PYFORMAT_PARAM.findall(statement):
+            positions.setdefault(name, len(positions) + 1)
+        body = _PYFORMAT_PARAM.sub(lambda match: f"${positions[match.group(1)]}", statement)
+        entry = (f"hot_statement_{len(prepared)}", list(positions))
+        # Not passed through psycopg2's parameter substitution, so unescape %%
+        cursor.execute(f"PREPARE {entry[0]} AS {body.replace('%%', '%')}")
+        prepared[statement] = entry
+    name, param_names = entry
+    if not param_names:
+        return f"EXECUTE {name}", parameters
+    return f"EXECUTE {name} ({', '.join(f'%({param})s' for param in param_names)})", parameters
+
+
+def install_prepared_statements(engine) -> None:
+    """Prepare statements marked ``prepare`` on the server, for psycopg2 engines."""
+    if DB_PREPARED_STATEMENTS and engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2":
+        from sqlalchemy import event
+        event.listen(engine, "before_cursor_execute", _prepare_hot_statement, retval=True)
+        event.listen(engine, "handle_error", _replace_stale_connection)
+
+
+def _replace_stale_connection(context) -> None:
+    execution = context.execution_context
+    if execution is None or not execution.execution_options.get("prepare"):
+        return
+    if getattr(context.original_exception, "pgcode", None) in _STALE_PREPARED_CODES:
+        # Rather than work out what the server still has, start over on a new
+        # connection; the request fails, the next one prepares afresh
+        logger.warning("Discarding a connection with stale prepared statements: %s", context.original_exception)
+        context.is_disconnect = True
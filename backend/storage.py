@@ -1,17 +1,48 @@
 """File storage abstraction for local and cloud storage."""
+import functools
+import io
 import os
 import logging
-from typing import Optional
+import time
+from typing import BinaryIO, Optional
 try:
     from config import UPLOAD_DIR
 except ImportError:
     UPLOAD_DIR = "uploads"
 
+from metrics import observe_storage
+from tracing import KIND_CLIENT, end_span, start_span
+
 logger = logging.getLogger(__name__)
 
+def _instrumented(operation: str):
+    """Report a backend method's latency, errors and bytes moved to the storage metrics, and trace it."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            span = start_span(f"storage.{operation}", KIND_CLIENT, {"storage.backend": self.name})
+            start = time.perf_counter()
+            try:
+                result = method(self, *args, **kwargs)
+            except Exception:
+                observe_storage(self.name, operation, time.perf_counter() - start, error=True)
+                end_span(span, error=True)
+                raise
+            end_span(span)
+            observe_storage(
+                self.name, operation, time.perf_counter() - start,
+                written=len(args[0]) if operation == "save" else 0,
+                read=len(result) if operation == "get" else 0,
+            )
+            return result
+        return wrapper
+    return decorator
+
 class StorageBackend:
     """Abstract base class for storage backends."""
     
+    name = "base"  # Backend label in the storage metrics
+    
     def save_file(self, file_content: bytes, filename: str) -> str:
         """Save file and return the path/URL."""
         raise NotImplementedError
@@ -20,6 +51,10 @@ class StorageBackend:
         """Retrieve file content."""
         raise NotImplementedError
     
+    def open_file(self, file_path: str) -> BinaryIO:
+        """Open a file for streaming reads (caller closes it)."""
+        return io.BytesIO(self.get_file(file_path))
+    
     def delete_file(self, file_path: str) -> bool:
         """Delete a file."""
         raise NotImplementedError
@@ -31,10 +66,13 @@ class StorageBackend:
 class LocalStorage(StorageBackend):
     """Local filesystem storage backend."""
     
+    name = "local"
+    
     def __init__(self, base_dir: str = UPLOAD_DIR):
         self.base_dir = base_dir
         os.makedirs(self.base_dir, exist_ok=True)
     
+    @_instrumented("save")
     def save_file(self, file_content: bytes, filename: str) -> str:
         """Save file to local filesystem."""
         file_path = os.path.join(self.base_dir, filename)
@@ -42,11 +80,18 @@ class LocalStorage(StorageBackend):
             f.write(file_content)
         return file_path
     
+    @_instrumented("get")
     def get_file(self, file_path: str) -> bytes:
         """Read file from local filesystem."""
         with open(file_path, 'rb') as f:
             return f.read()
     
+    @_instrumented("open")
+    def open_file(self, file_path: str) -> BinaryIO:
+        """Open file on local filesystem for streaming reads."""
+        return open(file_path, 'rb')
+    
+    @_instrumented("delete")
     def delete_file(self, file_path: str) -> bool:
         """Delete file from local filesystem."""
         try:
@@ -58,6 +103,7 @@ class LocalStorage(StorageBackend):
             logger.error(f"Error deleting file {file_path}: {e}")
             return False
     
+    @_instrumented("exists")
     def file_exists(self, file_path: str) -> bool:
         """Check if file exists."""
         return os.path.exists(file_path)
@@ -65,6 +111,8 @@ class LocalStorage(StorageBackend):
 class CloudinaryStorage(StorageBackend):
     """Cloudinary storage backend (easier alternative to S3)."""
     
+    name = "cloudinary"
+    
     def __init__(self, cloud_name: str, api_key: str, api_secret: str):
         import cloudinary
         import cloudinary.uploader
@@ -76,6 +124,7 @@ class CloudinaryStorage(StorageBackend):
         self.cloudinary = cloudinary
         self.uploader = cloudinary.uploader
     
+    @_instrumented("save")
     def save_file(self, file_content: bytes, filename: str) -> str:
         """Upload file to Cloudinary and return the public_id."""
         import io
@@ -92,6 +141,7 @@ class CloudinaryStorage(StorageBackend):
         # Return the public_id with folder path
         return result['public_id']
     
+    @_instrumented("get")
     def get_file(self, file_path: str) -> bytes:
         """Download file from Cloudinary."""
         import requests
@@ -105,6 +155,19 @@ class CloudinaryStorage(StorageBackend):
         response.raise_for_status()
         return response.content
     
+    @_instrumented("open")
+    def open_file(self, file_path: str) -> BinaryIO:
+        """Stream file from Cloudinary without buffering it in memory."""
+        import requests
+        from cloudinary.utils import cloudinary_url
+        
+        url, _ = cloudinary_url(file_path, resource_type="auto")
+        response = requests.get(url, stream=True)
+        response.raise_for_status()
+        response.raw.decode_content = True
+        return response.raw
+    
+    @_instrumented("delete")
     def delete_file(self, file_path: str) -> bool:
         """Delete file from Cloudinary."""
         try:
@@ -115,6 +178,7 @@ class CloudinaryStorage(StorageBackend):
             logger.error(f"Error deleting file {file_path} from Cloudinary: {e}")
             return False
     
+    @_instrumented("exists")
     def file_exists(self, file_path: str) -> bool:
         """Check if file exists in Cloudinary."""
         try:
@@ -127,11 +191,14 @@ class CloudinaryStorage(StorageBackend):
 class S3Storage(StorageBackend):
     """AWS S3 storage backend."""
     
+    name = "s3"
+    
     def __init__(self, bucket_name: str, region: str = "us-east-1"):
         import boto3
         self.bucket_name = bucket_name
         self.s3_client = boto3.client('s3', region_name=region)
     
+    @_instrumented("save")
     def save_file(self, file_content: bytes, filename: str) -> str:
         """Upload file to S3 and return the S3 key."""
         key = f"uploads/{filename}"
@@ -142,6 +209,7 @@ class S3Storage(StorageBackend):
         )
         return key
     
+    @_instrumented("get")
     def get_file(self, file_path: str) -> bytes:
         """Download file from S3."""
         response = self.s3_client.get_object(
@@ -150,6 +218,16 @@ class S3Storage(StorageBackend):
         )
         return response['Body'].read()
     
+    @_instrumented("open")
+    def open_file(self, file_path: str) -> BinaryIO:
+        """Stream file from S3 without buffering it in memory."""
+        response = self.s3_client.get_object(
+            Bucket=self.bucket_name,
+            Key=file_path
+        )
+        return response['Body']
+    
+    @_instrumented("delete")
     def delete_file(self, file_path: str) -> bool:
         """Delete file from S3."""
         try:
@@ -162,6 +240,7 @@ class S3Storage(StorageBackend):
             logger.error(f"Error deleting file {file_path} from S3: {e}")
             return False
     
+    @_instrumented("exists")
     def file_exists(self, file_path: str) -> bool:
         """Check if file exists in S3."""
         try:
@@ -0,0 +1,42 @@
+"""Point the app at a throwaway SQLite file before any backend module is imported.
+
+Settings are read at import time, so tests that need other settings (such
+as SQLITE_TUNED) run their code in a subprocess with ``run_backend``.
+
+Run from backend/: python -m pytest tests
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_workdir = tempfile.mkdtemp(prefix="backend_tests_")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(_workdir, "uploads")
+os.environ["STORAGE_TYPE"] = "local"
+os.environ["COUNTER_JOURNAL_DIR"] = os.path.join(_workdir, "counter_journal")
+os.environ["JOB_QUEUE_ENABLED"] = "false"
+os.environ["SQLITE_TUNED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, BACKEND_DIR)
+
+
+def run_backend(code: str, **env) -> subprocess.CompletedProcess:
+    """Run ``code`` in a fresh interpreter in backend/, with ``env`` on top of the test settings."""
+    return subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=dict(os.environ, **env),
+        capture_output=True, text=True, timeout=120,
+    )
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,68 @@
+"""Comment pages: keyset cursors over (created_at, id)."""
+from datetime import datetime
+
+from test_likes import _register
+
+
+def _pages(client, headers: dict, note_id: int, limit: int) -> list:
+    pages, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get(f"/api/notes/{note_id}/comments", headers=headers, params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        pages.append([comment["id"] for comment in page["comments"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_pages_cover_tied_timestamps_once_in_order(client):
+    from sqlalchemy import update
+    from database import SessionLocal
+    from models import Comment
+
+    headers = _register(client, "commenter")
+    response = client.post("/api/notes/upload", headers=headers, files={"file": ("a.txt", b"notes")},
+                           data={"title": "Discussed note", "class_name": "CS101"})
+    assert response.status_code == 201, response.text
+    note_id = response.json()["id"]
+    ids = []
+    for i in range(7):
+        response = client.post(f"/api/notes/{note_id}/comments", headers=headers, json={"content": f"Comment {i}"})
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+
+    # Five comments in one instant, between an earlier and a later one
+    db = SessionLocal()
+    tied = datetime(2024, 5, 1, 12, 0, 0, 123456)
+    db.execute(update(Comment).where(Comment.id == ids[0]).values(created_at=datetime(2024, 5, 1, 11)))
+    db.execute(update(Comment).where(Comment.id.in_(ids[1:6])).values(created_at=tied))
+    db.execute(update(Comment).where(Comment.id == ids[6]).values(created_at=datetime(2024, 5, 1, 13)))
+    db.commit()
+    db.close()
+
+    for limit in (1, 2, 3):
+        pages = _pages(client, headers, note_id, limit)
+        assert [comment_id for page in pages for comment_id in page] == ids
+        assert all(len(page) == limit for page in pages[:-1])
+
+
+def test_cursor_round_trips():
+    from routes.notes import _decode_comment_cursor, _encode_comment_cursor
+
+    created_at = datetime(2024, 5, 1, 12, 0, 0, 123456)
+    cursor = _encode_comment_cursor(created_at, 42)
+    assert "=" not in cursor
+    assert _decode_comment_cursor(cursor) == (created_at, 42)
+
+
+def test_malformed_cursor_is_rejected(client):
+    headers = _register(client, "cursorprober")
+    response = client.post("/api/notes/upload", headers=headers, files={"file": ("a.txt", b"notes")},
+                           data={"title": "Probed note", "class_name": "CS101"})
+    note_id = response.json()["id"]
+    for cursor in ("not a cursor", "bm90LWEtZGF0ZXwx", "MjAyNC0wNS0wMVQxMjowMDowMA"):
+        response = client.get(f"/api/notes/{note_id}/comments", headers=headers, params={"cursor": cursor})
+        assert response.status_code == 400, (cursor, response.text)
+        assert response.json()["detail"] == "Invalid comments cursor"
@@ -0,0 +1,72 @@
+"""Counter journals: unique names, and claims only from dead owners."""
+import os
+import time
+
+import pytest
+
+import counters
+from counters import CounterJournal
+
+
+def _crash(journal: CounterJournal) -> None:
+    """Drop a journal's handles the way a killed process would, leaving its files."""
+    journal._file.close()
+    if journal._lock_file is not None:
+        journal._lock_file.close()
+
+
+def test_journals_in_one_process_do_not_share_a_file(tmp_path):
+    first = CounterJournal(str(tmp_path))
+    second = CounterJournal(str(tmp_path))
+    assert first.path != second.path
+    first.close(remove=True)
+    second.close(remove=True)
+
+
+def test_dead_journal_is_claimed_once(tmp_path):
+    dead = CounterJournal(str(tmp_path))
+    dead.append(1, "like_count", 2)
+    dead.append(1, "like_count", 1)
+    _crash(dead)
+
+    live = CounterJournal(str(tmp_path))
+    assert live.claim_stale(max_age=3600) == {1: {"like_count": 3}}
+    live.release_claimed()
+    assert live.claim_stale(max_age=0) == {}
+    live.close(remove=True)
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.skipif(counters.fcntl is None, reason="liveness goes by mtime without fcntl")
+def test_live_journal_is_not_claimed_however_old(tmp_path):
+    owner = CounterJournal(str(tmp_path))
+    owner.append(1, "like_count", 1)
+    long_ago = time.time() - 3600
+    os.utime(owner.path, (long_ago, long_ago))
+
+    other = CounterJournal(str(tmp_path))
+    assert other.claim_stale(max_age=60) == {}
+    owner.close(remove=True)
+    other.close(remove=True)
+
+
+def test_failed_flush_keeps_the_journal_fresh(tmp_path, monkeypatch):
+    class BrokenSession:
+        def execute(self, *args, **kwargs):
+            raise RuntimeError("database is down")
+
+        def rollback(self):
+            pass
+
+        def close(self):
+            pass
+
+    buffer = counters.CounterBuffer(BrokenSession, str(tmp_path), flush_interval=60, flush_threshold=1000)
+    buffer.add(1, "like_count", 1)
+    long_ago = time.time() - 3600
+    os.utime(buffer._journal.path, (long_ago, long_ago))
+
+    assert buffer.flush() == 0
+    assert time.time() - os.path.getmtime(buffer._journal.path) < 60
+    assert buffer.pending(1) == {"like_count": 1}
+    buffer._journal.close()
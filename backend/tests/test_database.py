@@ -0,0 +1,25 @@
+"""Per-statement instrumentation in database.py."""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+
+def test_failed_statement_clears_its_timer_and_ends_its_span():
+    import tracing
+    from database import engine
+
+    trace = tracing.Trace()
+    token = tracing._current_trace.set(trace)
+    try:
+        with engine.connect() as conn:
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    conn.execute(text("SELECT * FROM no_such_table"))
+            conn.execute(text("SELECT 1"))
+            assert conn.connection.info["statement_started"] == []
+    finally:
+        tracing._current_trace.reset(token)
+
+    failed = [span for span in trace.spans if span.error]
+    assert len(failed) == 3
+    assert all(span.name == "db" and span.end is not None for span in failed)
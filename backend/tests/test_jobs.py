@@ -0,0 +1,77 @@
+"""Job workers while idle: read-only polls and a growing sleep."""
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import delete, event
+
+import jobs
+
+
+@pytest.fixture
+def queue():
+    from database import SessionLocal, init_db
+    from models import Job
+
+    init_db()
+    db = SessionLocal()
+    db.execute(delete(Job))
+    db.commit()
+    db.close()
+    yield jobs.JobQueue(SessionLocal, workers=1, poll_interval=0.01, max_idle_interval=0.08)
+    db = SessionLocal()
+    db.execute(delete(Job))
+    db.commit()
+    db.close()
+
+
+def test_idle_poll_only_reads(queue):
+    from database import engine
+
+    statements = []
+
+    def collect(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", collect)
+    try:
+        assert queue.process_one() is False
+    finally:
+        event.remove(engine, "before_cursor_execute", collect)
+    assert statements and all(statement.lstrip().upper().startswith("SELECT") for statement in statements)
+
+
+def test_idle_sleep_ends_when_a_delayed_job_is_due(queue):
+    jobs.enqueue_now("refresh_related", delay=5)
+    assert queue.process_one() is False
+    assert 4 < queue._idle_timeout(30) <= 5
+    assert queue._idle_timeout(1) == 1
+
+
+def test_idle_workers_back_off():
+    calls = []
+
+    class IdleQueue(jobs.JobQueue):
+        def process_one(self):
+            calls.append(time.monotonic())
+            return False
+
+        def reclaim_stale(self):
+            return 0
+
+    async def run():
+        queue = IdleQueue(None, workers=1, poll_interval=0.01, max_idle_interval=0.08)
+        queue.start()
+        await asyncio.sleep(0.5)
+        idle_polls = len(calls)
+        queue.wake()
+        await asyncio.sleep(0.05)
+        woken_polls = len(calls) - idle_polls
+        await queue.stop()
+        return idle_polls, woken_polls
+
+    idle_polls, woken_polls = asyncio.run(run())
+    # 0.5 s at a fixed 0.01 s would be about 50 polls
+    assert idle_polls < 15
+    # The wake-up reset the interval to 0.01 s
+    assert woken_polls >= 2
@@ -0,0 +1,107 @@
+"""Concurrent like toggling on one note."""
+from concurrent.futures import ThreadPoolExecutor
+
+CLIENTS = 12
+TOGGLES_PER_CLIENT = 15
+
+
+def _register(client, name: str) -> dict:
+    response = client.post("/api/auth/register", json={
+        "email": f"{name}@example.edu", "password": "secret123", "username": name,
+    })
+    assert response.status_code == 201, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_concurrent_toggles_keep_like_count_exact(client):
+    from sqlalchemy import func
+    import counters
+    from database import SessionLocal
+    from models import Like, NoteStats
+
+    author = _register(client, "likeauthor")
+    response = client.post("/api/notes/upload", headers=author, files={"file": ("a.txt", b"notes")},
+                           data={"title": "Busy note", "class_name": "CS101"})
+    assert response.status_code == 201, response.text
+    note_id = response.json()["id"]
+    # Two clients per user, so the same like is toggled from both at once
+    users = [_register(client, f"liker{i}") for i in range(CLIENTS // 2)] * 2
+
+    def hammer(headers: dict) -> list:
+        return [client.post(f"/api/notes/{note_id}/like", headers=headers).status_code
+                for _ in range(TOGGLES_PER_CLIENT)]
+
+    with ThreadPoolExecutor(max_workers=CLIENTS) as pool:
+        statuses = [status for result in pool.map(hammer, users) for status in result]
+    assert statuses == [200] * (CLIENTS * TOGGLES_PER_CLIENT)
+
+    if counters.counter_buffer is not None:
+        counters.counter_buffer.flush()
+    db = SessionLocal()
+    try:
+        likes = db.query(func.count(Like.id)).filter(Like.note_id == note_id).scalar()
+        like_count = db.query(NoteStats.like_count).filter(NoteStats.note_id == note_id).scalar()
+    finally:
+        db.close()
+    assert (like_count or 0) == likes
+
+
+def test_buffered_like_defers_trending_and_related_writes(client):
+    import counters
+    from database import SessionLocal
+    from models import NoteTrending, RelatedDirty
+
+    author = _register(client, "trendauthor")
+    response = client.post("/api/notes/upload", headers=author, files={"file": ("b.txt", b"notes")},
+                           data={"title": "Quiet note", "class_name": "CS101"})
+    assert response.status_code == 201, response.text
+    note_id = response.json()["id"]
+    liker = _register(client, "trendliker")
+
+    def state():
+        db = SessionLocal()
+        try:
+            score = db.query(NoteTrending.score).filter(NoteTrending.note_id == note_id).scalar()
+            dirty = db.query(RelatedDirty).filter(RelatedDirty.note_id == note_id).count()
+        finally:
+            db.close()
+        return score, dirty
+
+    counters.counter_buffer.flush()
+    uploaded, _ = state()
+    assert client.post(f"/api/notes/{note_id}/like", headers=liker).json()["liked"] is True
+    assert state() == (uploaded, 0)
+
+    counters.counter_buffer.flush()
+    liked, dirty = state()
+    assert liked > uploaded and dirty == 1
+
+    assert client.post(f"/api/notes/{note_id}/like", headers=liker).json()["liked"] is False
+    counters.counter_buffer.flush()
+    assert abs(state()[0] - uploaded) < 1e-9
+
+
+def test_feeds_show_likes_from_other_workers(client):
+    from database import SessionLocal
+    from models import Like
+
+    author = _register(client, "staleauthor")
+    response = client.post("/api/notes/upload", headers=author, files={"file": ("c.txt", b"notes")},
+                           data={"title": "Shared note", "class_name": "CS101"})
+    note_id = response.json()["id"]
+    user_id = client.get("/api/auth/me", headers=author).json()["id"]
+
+    # Warm this process's liked set, then like as another worker would
+    assert client.post("/api/notes/liked-status", headers=author, json={"note_ids": [note_id]}).json() == {"liked": []}
+    db = SessionLocal()
+    try:
+        db.add(Like(note_id=note_id, user_id=user_id))
+        db.commit()
+    finally:
+        db.close()
+
+    assert client.get("/api/notes", headers=author).json()[0]["is_liked"] is True
+    batch = client.post("/api/notes/batch", headers=author, json={"note_ids": [note_id]}).json()
+    assert batch[0]["is_liked"] is True
+    # Written behind the counters' back, so only a count of likes sees it
+    assert batch[0]["like_count"] == 1
@@ -0,0 +1,42 @@
+"""The queued log writer: uvicorn's loggers and failed writes."""
+import logging
+from collections import deque
+
+from conftest import run_backend
+
+import logs
+
+
+def test_uvicorn_cli_loggers_go_through_the_queue():
+    # As the uvicorn CLI does, apply its logging config before the app configures its own
+    result = run_backend("""
+import io, logging, logging.config
+from uvicorn.config import LOGGING_CONFIG
+import logs
+
+logging.config.dictConfig(LOGGING_CONFIG)
+stream = io.StringIO()
+logs.configure_logging(log_format="json", stream=stream)
+logging.getLogger("uvicorn.access").info('%s - "%s %s HTTP/%s" %d', "127.0.0.1", "GET", "/", "1.1", 200)
+logging.getLogger("uvicorn.error").info("Application startup complete.")
+handlers = [h for name in ("uvicorn", "uvicorn.error", "uvicorn.access") for h in logging.getLogger(name).handlers]
+logs.stop_logging()
+print(len(handlers), len([line for line in stream.getvalue().splitlines() if line.startswith("{")]))
+""")
+    assert result.stdout.split() == ["0", "2"], result.stderr
+
+
+def test_failed_writes_are_counted(monkeypatch):
+    class BrokenStream:
+        def write(self, text):
+            raise OSError("Broken pipe")
+
+        def flush(self):
+            pass
+
+    monkeypatch.setattr(logging, "raiseExceptions", False)
+    records = deque(logging.LogRecord("test", logging.INFO, __file__, 1, "line %d", (i,), None) for i in range(3))
+    writer = logs.LogWriter(records, logs._output_handler("text", BrokenStream()))
+    writer._write()
+    assert (writer.failed_writes, writer.lost) == (1, 3)
+    assert not records
@@ -0,0 +1,36 @@
+"""Access to /metrics and the other operational endpoints."""
+from conftest import run_backend
+
+_SCRAPE = """
+from fastapi.testclient import TestClient
+import main
+
+with TestClient(main.app) as client:
+    print(client.get("/metrics").status_code,
+          client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code,
+          client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code)
+"""
+
+
+def test_metrics_are_off_by_default():
+    result = run_backend(_SCRAPE)
+    assert result.stdout.splitlines()[-1].split() == ["404", "404", "404"], result.stderr
+
+
+def test_metrics_need_the_token():
+    result = run_backend(_SCRAPE, METRICS_ENABLED="true", METRICS_TOKEN="s3cret")
+    assert result.stdout.splitlines()[-1].split() == ["401", "401", "200"], result.stderr
+
+
+def test_metrics_without_a_token_need_an_admin():
+    result = run_backend(_SCRAPE, METRICS_ENABLED="true")
+    assert result.stdout.splitlines()[-1].split()[0] in ("401", "403"), result.stderr
+
+
+def test_live_stats_are_for_admins(client):
+    response = client.post("/api/auth/register", json={
+        "email": "livestats@example.edu", "password": "secret123", "username": "livestats",
+    })
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/api/live/stats").status_code in (401, 403)
+    assert client.get("/api/live/stats", headers=headers).status_code == 403
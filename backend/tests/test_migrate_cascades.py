@@ -0,0 +1,48 @@
+"""The ON DELETE CASCADE migration of databases created before the models cascaded."""
+import shutil
+import sqlite3
+
+import pytest
+
+from conftest import run_backend
+
+MIGRATE = "import logging; logging.basicConfig(); import migrate_cascades; migrate_cascades.migrate()"
+
+
+def _old_database(tmp_path) -> str:
+    """A database with today's tables but plain foreign keys, holding one liked note."""
+    current = tmp_path / "current.db"
+    result = run_backend("from database import init_db; init_db()", DATABASE_URL=f"sqlite:///{current}")
+    assert result.returncode == 0, result.stderr
+
+    old = tmp_path / "old.db"
+    shutil.copy(current, old)
+    with sqlite3.connect(old) as target:
+        for table in ("likes", "comments"):
+            (sql,) = target.execute("SELECT sql FROM sqlite_master WHERE name = ?", (table,)).fetchone()
+            target.execute(f"DROP TABLE {table}")
+            target.execute(sql.replace(" ON DELETE CASCADE", ""))
+        target.execute("INSERT INTO users (id, email, username, hashed_password, created_at) "
+                       "VALUES (1, 'a@example.edu', 'alice', 'x', '2024-01-01')")
+        target.execute("INSERT INTO notes (id, title, class_name, file_path, author_id, created_at) "
+                       "VALUES (1, 'Notes', 'CS101', 'a.txt', 1, '2024-01-01')")
+        target.execute("INSERT INTO likes (note_id, user_id, created_at) VALUES (1, 1, '2024-01-01')")
+    return str(old)
+
+
+@pytest.mark.parametrize("tuned", ["false", "true"])
+def test_migration_adds_cascades(tmp_path, tuned):
+    path = _old_database(tmp_path)
+
+    result = run_backend(MIGRATE, DATABASE_URL=f"sqlite:///{path}", SQLITE_TUNED=tuned)
+    assert result.returncode == 0, result.stderr
+    assert "transaction" not in result.stderr
+
+    with sqlite3.connect(path) as conn:
+        for table in ("likes", "comments"):
+            on_delete = {row[3]: row[6] for row in conn.execute(f"PRAGMA foreign_key_list({table})")}
+            assert on_delete["note_id"] == "CASCADE", table
+        assert conn.execute("SELECT count(*) FROM likes").fetchone() == (1,)
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute("DELETE FROM notes WHERE id = 1")
+        assert conn.execute("SELECT count(*) FROM likes").fetchone() == (0,)
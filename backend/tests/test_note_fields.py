@@ -0,0 +1,39 @@
+"""Sparse fieldsets: parsing ``?fields=`` and what listings return for it."""
+import pytest
+from fastapi import HTTPException
+
+from note_fields import NOTE_FIELDS, parse_fields
+
+
+def test_no_selection_means_every_field():
+    assert parse_fields(None) is None
+
+
+def test_selection_always_includes_id():
+    assert parse_fields(" title , like_count,,") == frozenset({"id", "title", "like_count"})
+    assert parse_fields("") == frozenset({"id"})
+
+
+def test_unknown_field_is_a_400():
+    with pytest.raises(HTTPException) as error:
+        parse_fields("title,secret,Title")
+    assert error.value.status_code == 400
+    assert error.value.detail.startswith("Unknown fields: Title, secret.")
+    assert all(name in error.value.detail for name in NOTE_FIELDS)
+
+
+def test_listing_returns_only_the_selected_fields(client):
+    from test_likes import _register
+
+    headers = _register(client, "fieldpicker")
+    response = client.post("/api/notes/upload", headers=headers, files={"file": ("a.txt", b"notes")},
+                           data={"title": "Sparse note", "class_name": "CS101"})
+    assert response.status_code == 201, response.text
+
+    response = client.get("/api/notes/recent", params={"fields": "title,like_count"})
+    assert response.status_code == 200, response.text
+    assert response.json() and all(set(note) == {"id", "title", "like_count"} for note in response.json())
+
+    response = client.get("/api/notes/recent", params={"fields": "title,bogus"})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Unknown fields: bogus.")
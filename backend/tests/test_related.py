@@ -0,0 +1,88 @@
+"""Co-like related notes: full rebuilds and incremental refreshes."""
+import numpy as np
+import pytest
+
+import related
+
+# user -> liked notes; user 6 likes more than the cap below, so is left out
+LIKES = {
+    1: [1, 2, 3],
+    2: [1, 2],
+    3: [2, 3, 4],
+    4: [1, 4],
+    5: [3, 4],
+    6: [1, 2, 3, 4, 5],
+}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    from sqlalchemy import delete
+    from database import SessionLocal, init_db
+    from models import Like, Note, NoteRelated, NoteStats, RelatedDirty, User
+
+    monkeypatch.setattr(related, "_MAX_USER_LIKES", 4)
+    init_db()
+    session = SessionLocal()
+    for table in (NoteRelated, RelatedDirty, Like, NoteStats):
+        session.execute(delete(table))
+    users = [User(email=f"related{u}@example.edu", username=f"related{u}", hashed_password="x") for u in LIKES]
+    session.add_all(users)
+    session.flush()
+    notes = [Note(title=f"Note {n}", class_name="CS101", file_path="a.txt", author_id=users[0].id)
+             for n in range(1, 6)]
+    session.add_all(notes)
+    session.flush()
+    session.info["users"] = {u: user.id for u, user in zip(LIKES, users)}
+    session.info["notes"] = {n: note.id for n, note in enumerate(notes, 1)}
+    for u, liked in LIKES.items():
+        for n in liked:
+            _like(session, u, n)
+    session.commit()
+    yield session
+    session.rollback()
+    for table in (NoteRelated, RelatedDirty, Like, NoteStats):
+        session.execute(delete(table))
+    session.execute(delete(Note).where(Note.id.in_(list(session.info["notes"].values()))))
+    session.execute(delete(User).where(User.id.in_(list(session.info["users"].values()))))
+    session.commit()
+    session.close()
+
+
+def _like(session, user: int, note: int) -> None:
+    import counters
+    from models import Like
+
+    note_id = session.info["notes"][note]
+    session.add(Like(user_id=session.info["users"][user], note_id=note_id))
+    counters.apply_counter_deltas(session, {note_id: {"like_count": 1}})
+
+
+def _related_rows(session) -> dict:
+    from models import NoteRelated
+
+    return {(row.note_id, row.related_id): round(row.score, 5) for row in session.query(NoteRelated)}
+
+
+def test_compute_related_without_usable_likes():
+    empty = np.empty(0, dtype=np.int64)
+    assert list(related.compute_related(empty, empty)) == []
+    heavy = np.arange(related._MAX_USER_LIKES + 1, dtype=np.int64)
+    assert list(related.compute_related(np.zeros_like(heavy), heavy)) == []
+
+
+def test_rebuild_with_only_heavy_likers(db, monkeypatch):
+    monkeypatch.setattr(related, "_MAX_USER_LIKES", 1)
+    assert related.rebuild(db) == 0
+
+
+def test_refresh_matches_rebuild(db):
+    related.rebuild(db)
+    _like(db, 5, 1)
+    db.commit()
+
+    related.refresh_notes(db, [db.info["notes"][1]])
+    db.commit()
+    refreshed = _related_rows(db)
+    related.rebuild(db)
+    assert refreshed == _related_rows(db)
@@ -0,0 +1,116 @@
+"""Read replica routing, with two SQLite files standing in for replicas."""
+import json
+import sqlite3
+
+import pytest
+
+from conftest import run_backend
+
+# Each database says which one it is; the primary also gets the model tables
+_SETUP = """
+import json
+from sqlalchemy import text
+from database import ReadSessionLocal, init_db, read_from_primary, replicas
+
+init_db()
+replicas.check()
+
+def origin(db):
+    return db.execute(text("SELECT name FROM origin")).scalar()
+
+def read_once():
+    db = ReadSessionLocal()
+    try:
+        return origin(db)
+    finally:
+        db.close()
+"""
+
+
+@pytest.fixture
+def databases(tmp_path):
+    paths = {name: str(tmp_path / f"{name}.db") for name in ("primary", "r1", "r2")}
+    for name, path in paths.items():
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE origin (name TEXT)")
+            conn.execute("INSERT INTO origin VALUES (?)", (name,))
+    return {
+        "DATABASE_URL": f"sqlite:///{paths['primary']}",
+        "DATABASE_REPLICA_URLS": f"sqlite:///{paths['r1']},sqlite:///{paths['r2']}",
+    }
+
+
+def _run(databases, scenario: str):
+    result = run_backend(_SETUP + scenario, **databases)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_reads_rotate_across_healthy_replicas(databases):
+    reads = _run(databases, "print(json.dumps([read_once() for _ in range(4)]))")
+    assert sorted(reads[:2]) == ["r1", "r2"]
+    assert reads[2:] == reads[:2]
+
+
+def test_one_session_stays_on_its_replica(databases):
+    reads = _run(databases, """
+db = ReadSessionLocal()
+print(json.dumps([origin(db) for _ in range(3)]))
+""")
+    assert reads[0] in ("r1", "r2") and len(set(reads)) == 1
+
+
+def test_primary_serves_reads_without_a_usable_replica(databases):
+    reads = _run(databases, """
+reads = {}
+replicas._update(replicas.replicas[0], None, "down")
+reads["one_down"] = [read_once() for _ in range(2)]
+replicas.max_lag = -1  # Every replica is now too far behind
+replicas.check()
+reads["lagging"] = [read_once() for _ in range(2)]
+replicas.max_lag = 5
+replicas.check()
+reads["recovered"] = sorted(read_once() for _ in range(2))
+print(json.dumps(reads))
+""")
+    assert reads["one_down"] == ["r2", "r2"]
+    assert reads["lagging"] == ["primary", "primary"]
+    assert reads["recovered"] == ["r1", "r2"]
+
+
+def test_writes_keep_the_session_on_the_primary(databases):
+    reads = _run(databases, """
+db = ReadSessionLocal()
+before = origin(db)
+db.rollback()
+db.execute(text("INSERT INTO origin VALUES ('written')"))
+during = db.execute(text("SELECT count(*) FROM origin")).scalar()
+db.commit()
+after = origin(db)
+print(json.dumps([before, during, after]))
+""")
+    before, during, after = reads
+    assert before in ("r1", "r2")
+    assert during == 2  # Its own write, on the primary
+    assert after == "primary"  # Still there after the commit
+
+
+def test_read_from_primary_after_a_replica_miss(databases):
+    reads = _run(databases, """
+db = ReadSessionLocal()
+before = origin(db)
+missed = db.execute(text("SELECT count(*) FROM origin WHERE name = 'primary'")).scalar()
+switched = read_from_primary(db)
+again = read_from_primary(db)
+db.rollback()
+after = origin(db)
+replicas.max_lag = -1
+replicas.check()
+unrouted = ReadSessionLocal()
+print(json.dumps([before, missed, switched, again, after, read_from_primary(unrouted)]))
+""")
+    before, missed, switched, again, after, unrouted = reads
+    assert before in ("r1", "r2") and missed == 0
+    assert switched is True and again is False
+    assert after == "primary"
+    assert unrouted is False  # Not on a replica to begin with
@@ -0,0 +1,75 @@
+"""The banded LSH index: adds, removes and compaction."""
+import pytest
+
+import similarity
+
+pytestmark = pytest.mark.skipif(not similarity.NUMPY_AVAILABLE, reason="NumPy is not installed")
+
+
+def _keys(*values):
+    import numpy as np
+
+    return np.array(values, dtype=np.uint32)
+
+
+@pytest.fixture
+def index():
+    return similarity.LSHIndex(bands=2)
+
+
+def test_candidates_share_a_band_key(index):
+    index.add(1, _keys(10, 20))
+    index.add(2, _keys(10, 30))
+    index.add(3, _keys(11, 31))
+    for compacted in (False, True):
+        assert index.candidates(_keys(10, 99), limit=10) == {1, 2}
+        assert index.candidates(_keys(99, 31), limit=10) == {3}
+        assert index.candidates(_keys(99, 99), limit=10) == set()
+        assert len(index) == 3 and 2 in index and 4 not in index
+        index.compact()
+
+
+def test_removed_ids_are_not_candidates(index):
+    index.add_many(_keys(1, 2), _keys(10, 20, 10, 30).reshape(2, 2))
+    index.add(3, _keys(10, 40))
+    index.remove(1)
+    index.remove(3)
+    assert index.candidates(_keys(10, 99), limit=10) == {2}
+    assert len(index) == 1 and 1 not in index and 3 not in index
+    index.compact()
+    assert index.candidates(_keys(10, 99), limit=10) == {2}
+    assert len(index) == 1 and index.nbytes() == 2 * (4 + 4) + 4
+
+
+def test_removing_an_unknown_id_changes_nothing(index):
+    index.add(1, _keys(10, 20))
+    index.remove(2)  # Deletes reach the text and image indexes alike
+    index.remove(1)
+    index.remove(1)
+    assert len(index) == 0
+    index.add(3, _keys(10, 20))
+    assert len(index) == 1
+
+
+@pytest.mark.parametrize("compact_first", [False, True])
+def test_re_added_id_keeps_only_its_new_keys(index, compact_first):
+    index.add(1, _keys(10, 20))
+    index.remove(1)
+    if compact_first:
+        index.compact()
+    index.add(1, _keys(11, 21))  # A reused id
+    index.add(2, _keys(12, 22))
+    index.add(2, _keys(13, 23))  # A re-signed note
+    index.add_many(_keys(2), _keys(14, 24).reshape(1, 2))
+    for _ in range(2):
+        assert index.candidates(_keys(10, 20), limit=10) == set()
+        assert index.candidates(_keys(11, 99), limit=10) == {1}
+        assert index.candidates(_keys(12, 23), limit=10) == set()
+        assert index.candidates(_keys(14, 99), limit=10) == {2}
+        assert len(index) == 2
+        index.compact()
+
+
+def test_candidates_stop_at_the_limit(index):
+    index.add_many(_keys(*range(1, 11)), _keys(*[10, 20] * 10).reshape(10, 2))
+    assert len(index.candidates(_keys(10, 20), limit=4)) == 4
@@ -0,0 +1,40 @@
+"""Thumbnail rendering in killable child processes."""
+import io
+import time
+
+import pytest
+
+import thumbnails
+
+pytestmark = pytest.mark.skipif(not thumbnails.PIL_AVAILABLE, reason="Pillow is not installed")
+
+
+def _png(width: int, height: int) -> bytes:
+    from PIL import Image
+
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(output, format="PNG")
+    return output.getvalue()
+
+
+def test_render_in_child_process():
+    webp, width, height = thumbnails.run_render(_png(640, 480), ".png")
+    assert webp[:4] == b"RIFF" and (width, height) == (320, 240)
+
+
+def test_oversized_image_is_not_decoded(monkeypatch):
+    monkeypatch.setattr(thumbnails, "THUMBNAIL_MAX_PIXELS", 100 * 100)
+    assert thumbnails.render_thumbnail(_png(101, 100), ".png") is None
+    assert thumbnails.render_thumbnail(_png(100, 100), ".png") is not None
+
+
+def test_slow_render_is_killed_and_frees_its_slot(monkeypatch):
+    monkeypatch.setattr(thumbnails, "_slots", thumbnails.threading.BoundedSemaphore(1))
+    # Children are forked, so they run the patched renderer
+    monkeypatch.setattr(thumbnails, "render_thumbnail", lambda content, ext: time.sleep(60))
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        thumbnails.run_render(b"", ".png", timeout=0.5)
+    assert time.monotonic() - started < 10
+    assert thumbnails._slots.acquire(blocking=False)
@@ -0,0 +1,54 @@
+"""W3C traceparent parsing, and which requests it makes traced."""
+import pytest
+
+from tracing import _parse_traceparent
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+def test_sampled_flag():
+    assert _parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+    assert _parse_traceparent(f" 00-{TRACE_ID}-{PARENT_ID}-00 ") == (TRACE_ID, PARENT_ID, False)
+    # Only the lowest bit means sampled
+    assert _parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-02")[2] is False
+    assert _parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-03")[2] is True
+
+
+@pytest.mark.parametrize("value", [
+    "",
+    f"00-{TRACE_ID}-{PARENT_ID}",
+    f"00-{TRACE_ID}-{PARENT_ID}-01-extra",
+    f"0-{TRACE_ID}-{PARENT_ID}-01",
+    f"00-{TRACE_ID[:-1]}-{PARENT_ID}-01",
+    f"00-{TRACE_ID}-{PARENT_ID}0-01",
+    f"00-{TRACE_ID}-{PARENT_ID}-1",
+    f"00-{TRACE_ID[:-1]}g-{PARENT_ID}-01",
+    f"00-{TRACE_ID.upper()}-{PARENT_ID}-01",
+    f"00-+{TRACE_ID[1:]}-{PARENT_ID}-01",
+    f"00-{TRACE_ID[:-2]}_6-{PARENT_ID}-01",
+    f"00-{TRACE_ID}-{PARENT_ID}- 1",
+    f"ff-{TRACE_ID}-{PARENT_ID}-01",
+])
+def test_malformed_header_is_ignored(value):
+    assert _parse_traceparent(value) is None
+
+
+@pytest.mark.parametrize("value", [
+    f"00-{'0' * 32}-{PARENT_ID}-01",
+    f"00-{TRACE_ID}-{'0' * 16}-01",
+])
+def test_all_zero_ids_are_invalid(value):
+    assert _parse_traceparent(value) is None
+
+
+def test_only_a_valid_sampled_header_traces_the_request(client):
+    def traced(traceparent: str) -> bool:
+        response = client.get("/health", headers={"traceparent": traceparent})
+        assert response.status_code == 200
+        return "server-timing" in response.headers
+
+    assert traced(f"00-{TRACE_ID}-{PARENT_ID}-01")
+    assert not traced(f"00-{TRACE_ID}-{PARENT_ID}-00")
+    assert not traced(f"00-{'0' * 32}-{PARENT_ID}-01")
+    assert not traced(f"00-{TRACE_ID.upper()}-{PARENT_ID}-01")
@@ -0,0 +1,122 @@
+"""Trending scores kept in log space: the math, and record/retract on stored rows."""
+import itertools
+import math
+from datetime import datetime, timedelta
+
+import pytest
+
+import trending
+from trending import FLOOR, event_score, logaddexp, logsubexp
+
+HALF_LIFE = timedelta(hours=trending.TRENDING_HALF_LIFE_HOURS)
+_fixtures = itertools.count()
+
+
+def _decayed(events, now: datetime) -> float:
+    """The score as defined: each weight halved every half-life since its event."""
+    return sum(weight * 2 ** -((now - at) / HALF_LIFE) for weight, at in events)
+
+
+def test_log_space_helpers_match_direct_computation():
+    for a, b in ((0.0, 0.0), (1.5, -2.0), (-3.0, 4.0)):
+        assert logaddexp(a, b) == pytest.approx(math.log(math.exp(a) + math.exp(b)))
+    assert logsubexp(2.0, 1.0) == pytest.approx(math.log(math.exp(2.0) - math.exp(1.0)))
+    # Far past where exp() overflows
+    assert logaddexp(5000.0, 5000.0) == pytest.approx(5000.0 + math.log(2))
+    assert logsubexp(logaddexp(5000.0, 4999.0), 4999.0) == pytest.approx(5000.0)
+
+
+def test_subtracting_everything_leaves_the_floor():
+    assert logsubexp(3.0, 3.0) == FLOOR
+    assert logsubexp(3.0, 3.0 + 1e-13) == FLOOR
+    assert logsubexp(3.0, 4.0) == FLOOR
+    assert math.exp(FLOOR) == 0.0
+
+
+def test_event_score_halves_every_half_life():
+    at = datetime(2025, 3, 1, 9)
+    assert event_score(1.0, at + HALF_LIFE) - event_score(1.0, at) == pytest.approx(math.log(2))
+    assert event_score(2.0, at) - event_score(1.0, at) == pytest.approx(math.log(2))
+    assert event_score(1.0, trending.EPOCH) == 0.0
+
+
+def test_summed_scores_rank_like_the_decayed_sum():
+    now = datetime(2025, 3, 10, 12)
+    histories = [
+        [(1.0, now - timedelta(hours=1)), (1.0, now - timedelta(hours=2))],
+        [(1.0, now - timedelta(days=3))] * 6 + [(2.0, now - timedelta(days=2))],
+        [(2.0, now - timedelta(hours=30)), (1.0, now - timedelta(minutes=5))],
+    ]
+    stored = []
+    for events in histories:
+        score = FLOOR
+        for weight, at in events:
+            score = logaddexp(score, event_score(weight, at))
+        stored.append(score)
+        # Shifting back to now gives the decayed sum itself
+        assert math.exp(score - event_score(1.0, now)) == pytest.approx(_decayed(events, now))
+    assert sorted(range(3), key=stored.__getitem__) == sorted(range(3), key=lambda i: _decayed(histories[i], now))
+
+
+@pytest.fixture
+def trending_notes(client):
+    """Three uploaded notes in a class of their own, with their trending rows cleared."""
+    from sqlalchemy import delete
+    from test_likes import _register
+    from database import SessionLocal
+    from models import NoteTrending
+
+    number = next(_fixtures)
+    headers = _register(client, f"trendsetter{number}")
+    ids = []
+    for i in range(3):
+        response = client.post("/api/notes/upload", headers=headers, files={"file": ("a.txt", b"notes")},
+                               data={"title": f"Trending {i}", "class_name": f"TREND{number}"})
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+    db = SessionLocal()
+    db.execute(delete(NoteTrending).where(NoteTrending.note_id.in_(ids)))
+    db.commit()
+    yield db, ids, f"TREND{number}"
+    db.close()
+
+
+def _score(db, note_id: int) -> float:
+    from models import NoteTrending
+
+    return db.get(NoteTrending, note_id, populate_existing=True).score
+
+
+def test_retract_undoes_record(trending_notes):
+    db, (note_id, _, _), _ = trending_notes
+    uploaded = datetime(2025, 3, 1, 9)
+    liked = uploaded + timedelta(hours=5)
+    trending.record(db, note_id, trending.UPLOAD_WEIGHT, uploaded)
+    db.commit()
+    before = _score(db, note_id)
+
+    trending.record(db, note_id, trending.LIKE_WEIGHT, liked)
+    db.commit()
+    assert _score(db, note_id) == pytest.approx(logaddexp(before, event_score(trending.LIKE_WEIGHT, liked)))
+    trending.retract(db, note_id, trending.LIKE_WEIGHT, liked)
+    db.commit()
+    assert _score(db, note_id) == pytest.approx(before)
+
+    trending.retract(db, note_id, trending.UPLOAD_WEIGHT, uploaded)
+    db.commit()
+    assert _score(db, note_id) == FLOOR
+
+
+def test_trending_page_orders_by_decayed_score(trending_notes):
+    db, (old, busy, recent), class_name = trending_notes
+    now = datetime(2025, 3, 10, 12)
+    trending.add_scores(db, {
+        old: event_score(1.0, now - timedelta(days=4)),
+        busy: event_score(1.0, now - timedelta(days=1)),
+        recent: event_score(1.0, now - timedelta(hours=6)),
+    })
+    # Eight likes two days ago outweigh one event six hours ago
+    for _ in range(8):
+        trending.record(db, busy, trending.LIKE_WEIGHT, now - timedelta(days=2))
+    db.commit()
+    assert trending.trending_note_ids(db, 10, class_name=class_name) == [busy, recent, old]
@@ -0,0 +1,267 @@
+"""Thumbnail and first-page preview generation.
+
+After an upload, a ``generate_thumbnail`` job renders a small WebP image of
+the note: a downscaled copy for images and a render of the first page for
+PDFs and text files.  Thumbnails are saved through the storage backend and
+served by ``/api/notes/{id}/thumbnail`` so listings never download the
+original file.
+
+Each render runs in its own process, at most ``THUMBNAIL_WORKERS`` at a
+time, to keep CPU-heavy image work off the API's threads; a render that
+exceeds ``THUMBNAIL_TIMEOUT`` is killed (as in extraction.py), so a
+malformed file cannot hold a render slot.  Images larger than
+``THUMBNAIL_MAX_PIXELS`` after JPEG draft downscaling are not decoded at all.
+
+Run ``python thumbnails.py --backfill`` to generate thumbnails for notes
+uploaded before this pipeline existed.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Tuple
+
+try:
+    from config import THUMBNAIL_SIZE, THUMBNAIL_WORKERS, THUMBNAIL_TIMEOUT, THUMBNAIL_MAX_PIXELS
+except ImportError:
+    THUMBNAIL_SIZE = 320
+    THUMBNAIL_WORKERS = 2
+    THUMBNAIL_TIMEOUT = 30.0
+    THUMBNAIL_MAX_PIXELS = 50_000_000
+
+logger = logging.getLogger(__name__)
+
+# Pillow is needed for every thumbnail; pypdfium2 only for PDFs
+try:
+    from PIL import Image, ImageDraw, ImageFont, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    logger.warning("Pillow not installed. Thumbnails will not be generated.")
+
+try:
+    import pypdfium2 as pdfium
+    PDFIUM_AVAILABLE = True
+except ImportError:
+    PDFIUM_AVAILABLE = False
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+THUMBNAIL_EXTENSIONS = IMAGE_EXTENSIONS | {".pdf", ".txt"}
+
+# Text previews render at most this much of the file
+_TEXT_PREVIEW_BYTES = 4096
+_TEXT_PREVIEW_LINES = 24
+
+
+def _to_webp(image) -> Tuple[bytes, int, int]:
+    """Downscale an image to fit the thumbnail box and encode it as WebP."""
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format="WEBP", quality=80, method=4)
+    return output.getvalue(), image.width, image.height
+
+
+def _render_pdf(content: bytes):
+    """Render the first page of a PDF at roughly thumbnail resolution."""
+    pdf = pdfium.PdfDocument(content)
+    try:
+        page = pdf[0]
+        width, height = page.get_size()
+        # Render just large enough for the thumbnail, not at full resolution
+        scale = max(THUMBNAIL_SIZE / max(width, height, 1), 0.1) * 2
+        return page.render(scale=scale).to_pil()
+    finally:
+        pdf.close()
+
+
+def _render_text(content: bytes):
+    """Draw the first lines of a text file onto a page-shaped canvas."""
+    text = content[:_TEXT_PREVIEW_BYTES].decode("utf-8", errors="replace")
+    lines = text.splitlines()[:_TEXT_PREVIEW_LINES]
+    width, height = THUMBNAIL_SIZE * 2, int(THUMBNAIL_SIZE * 2 * 1.29)  # Letter aspect
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    line_height = max(12, height // (_TEXT_PREVIEW_LINES + 2))
+    for i, line in enumerate(lines):
+        draw.text((16, 16 + i * line_height), line[:80], fill="black", font=font)
+    return image
+
+
+def render_thumbnail(content: bytes, ext: str) -> Optional[Tuple[bytes, int, int]]:
+    """
+    Render a WebP thumbnail for a file's content.
+
+    Returns ``(webp_bytes, width, height)``, or ``None`` when the file type is
+    not supported or the needed libraries are missing.  Runs in a worker
+    process, so it must not touch the database or storage.
+    """
+    if not PIL_AVAILABLE:
+        return None
+    ext = ext.lower()
+    if ext in IMAGE_EXTENSIONS:
+        try:
+            # Reads only the header; Pillow refuses twice its MAX_IMAGE_PIXELS
+            image = Image.open(io.BytesIO(content))
+        except Image.DecompressionBombError:
+            return None
+        image.draft("RGB", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))  # Fast JPEG downscale
+        if image.width * image.height > THUMBNAIL_MAX_PIXELS:
+            return None  # Still too large to decode, e.g. a PNG bomb
+    elif ext == ".pdf" and PDFIUM_AVAILABLE:
+        image = _render_pdf(content)
+    elif ext == ".txt":
+        image = _render_text(content)
+    else:
+        return None
+    return _to_webp(image)
+
+
+def _child_main(conn, content: bytes, ext: str) -> None:
+    try:
+        conn.send(("ok", render_thumbnail(content, ext)))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+# Caps the number of render processes running at once in this process
+_slots = threading.BoundedSemaphore(THUMBNAIL_WORKERS)
+
+
+def run_render(content: bytes, ext: str, timeout: float = THUMBNAIL_TIMEOUT) -> Optional[Tuple[bytes, int, int]]:
+    """``render_thumbnail`` in a child process, killing it after ``timeout`` seconds."""
+    with _slots:
+        parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_child_main, args=(child_conn, content, ext), daemon=True)
+        process.start()
+        child_conn.close()
+        try:
+            if not parent_conn.poll(timeout):
+                raise TimeoutError(f"Thumbnail render timed out after {timeout}s")
+            status, result = parent_conn.recv()
+        except EOFError:
+            raise RuntimeError("Thumbnail render process exited unexpectedly")
+        finally:
+            parent_conn.close()
+            if process.is_alive():
+                process.kill()
+            process.join()
+    if status != "ok":
+        raise RuntimeError(result)
+    return result
+
+
+def thumbnail_filename(file_path: str) -> str:
+    """Storage filename for a note's thumbnail, derived from its file name."""
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return f"{stem}_thumb.webp"
+
+
+def generate_for_note(note_id: int) -> bool:
+    """
+    Render and store the thumbnail for a note.
+
+    Returns True if a thumbnail was stored, False if the note is gone or its
+    type has no thumbnail.  Raises on storage or rendering errors so the job
+    is retried.
+    """
+    from database import SessionLocal
+    from models import Note, NoteThumbnail
+    from storage import storage
+    from sqlalchemy.exc import IntegrityError
+
+    db = SessionLocal()
+    try:
+        note = db.query(Note).filter(Note.id == note_id).first()
+        if note is None:
+            return False
+        ext = os.path.splitext(note.file_path)[1].lower()
+        if ext not in THUMBNAIL_EXTENSIONS:
+            return False
+        if db.query(NoteThumbnail).filter(NoteThumbnail.note_id == note_id).first():
+            return True
+
+        content = storage.get_file(note.file_path)
+        rendered = run_render(content, ext)
+        if rendered is None:
+            return False
+        webp, width, height = rendered
+
+        thumb_path = storage.save_file(webp, thumbnail_filename(note.file_path))
+        try:
+            db.add(NoteThumbnail(note_id=note_id, file_path=thumb_path, width=width, height=height))
+            db.commit()
+        except IntegrityError:
+            # The note was deleted (or thumbnailed) while we rendered
+            db.rollback()
+            if not db.query(NoteThumbnail).filter(NoteThumbnail.file_path == thumb_path).first():
+                storage.delete_file(thumb_path)
+            return False
+        logger.info("Generated %dx%d thumbnail for note %s", width, height, note_id)
+        return True
+    finally:
+        db.close()
+
+
+def backfill(workers: int = THUMBNAIL_WORKERS * 2, batch_size: int = 500) -> int:
+    """Generate thumbnails for every note that lacks one, in parallel."""
+    import time
+    from database import SessionLocal
+    from models import Note, NoteThumbnail
+
+    global _slots
+    _slots = threading.BoundedSemaphore(workers)
+
+    db = SessionLocal()
+    try:
+        note_ids = [
+            note_id for (note_id,) in db.query(Note.id)
+            .outerjoin(NoteThumbnail, NoteThumbnail.note_id == Note.id)
+            .filter(NoteThumbnail.note_id.is_(None))
+            .order_by(Note.id)
+            .all()
+        ]
+    finally:
+        db.close()
+
+    started = time.perf_counter()
+    generated = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(note_ids), batch_size):
+            futures = {
+                executor.submit(generate_for_note, note_id): note_id
+                for note_id in note_ids[start:start + batch_size]
+            }
+            for future in as_completed(futures):
+                try:
+                    generated += bool(future.result())
+                except Exception as e:
+                    failed += 1
+                    logger.warning("Thumbnail failed for note %s: %s", futures[future], e)
+            elapsed = time.perf_counter() - started
+            logger.info("Backfill: %d/%d notes, %d thumbnails, %d failures, %.1f notes/s",
+                        min(start + batch_size, len(note_ids)), len(note_ids), generated, failed,
+                        (start + len(futures)) / elapsed)
+    return generated
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Thumbnail maintenance")
+    parser.add_argument("--backfill", action="store_true", help="Generate missing thumbnails")
+    parser.add_argument("--workers", type=int, default=THUMBNAIL_WORKERS * 2)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.backfill:
+        count = backfill(workers=args.workers)
+        print(f"Generated {count} thumbnails")
+    else:
+        parser.print_help()
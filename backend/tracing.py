@@ -0,0 +1,352 @@
+"""Lightweight request tracing: spans, ``Server-Timing`` headers and trace export.
+
+``TracingMiddleware`` decides per request whether to trace it: a fraction
+``TRACE_SAMPLE_RATE`` of requests are sampled, and so is any request whose
+W3C ``traceparent`` header has the sampled flag set (the trace then
+continues the caller's trace id).  Untraced requests cost one random draw.
+
+Within a traced request the current trace and span live in context
+variables, so spans nest across ``await`` and into threadpool calls without
+being passed around.  Spans come from:
+
+- ``span("auth")`` around token checks in ``get_current_user``
+- one ``db`` span per SQL statement (engine hooks in database.py)
+- ``storage.<operation>`` spans around file storage calls (storage.py)
+- ``response``: from the response start to its last body chunk
+
+Traced responses get a ``Server-Timing`` header with the total time of each
+top-level phase (nested spans are included in their parent), plus ``app``,
+the time until the response started; response writing happens after the
+header is sent, so it appears only in the exported trace.
+
+With ``TRACE_EXPORT=file`` traces are appended to ``TRACE_EXPORT_FILE`` as
+OTLP/JSON, one ``ExportTraceServiceRequest`` per line; with
+``TRACE_EXPORT=otlp`` they are POSTed to an OTLP/HTTP collector at
+``TRACE_EXPORT_URL``.  Export runs on a background thread and drops traces
+when it falls behind.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+try:
+    from config import TRACE_SAMPLE_RATE, TRACE_EXPORT, TRACE_EXPORT_FILE, TRACE_EXPORT_URL
+except ImportError:
+    TRACE_SAMPLE_RATE = 0.0
+    TRACE_EXPORT = ""
+    TRACE_EXPORT_FILE = "traces.jsonl"
+    TRACE_EXPORT_URL = "http://localhost:4318/v1/traces"
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "pennwest-connect-api"
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+# version-trace_id-parent_id-flags, lowercase hex; version ff is invalid
+_TRACEPARENT = re.compile(r"(?!ff)([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent", "kind", "start", "end", "attributes", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"], kind: int = KIND_INTERNAL,
+                 attributes: Optional[dict] = None):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.kind = kind
+        self.start = time.perf_counter_ns()
+        self.end: Optional[int] = None
+        self.attributes = attributes or {}
+        self.error = False
+
+
+class Trace:
+    """The spans of one request; ``root`` is the request itself."""
+
+    __slots__ = ("trace_id", "remote_parent_id", "spans", "root", "_wall_offset")
+
+    def __init__(self, trace_id: Optional[str] = None, remote_parent_id: Optional[str] = None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.remote_parent_id = remote_parent_id
+        self.spans: List[Span] = []
+        self.root: Optional[Span] = None
+        # perf_counter_ns -> Unix time in nanoseconds
+        self._wall_offset = time.time_ns() - time.perf_counter_ns()
+
+    def server_timing(self, until: int) -> str:
+        """``Server-Timing`` value for the root's direct children, and ``app`` up to ``until``."""
+        totals: Dict[str, List[float]] = {}
+        for span in self.spans:
+            if span.parent is self.root and span.end is not None:
+                total = totals.setdefault(span.name, [0.0, 0])
+                total[0] += (span.end - span.start) / 1e6
+                total[1] += 1
+        entries = []
+        for name, (duration, count) in totals.items():
+            entry = f"{name};dur={duration:.2f}"
+            if count > 1:
+                entry += f';desc="{count} calls"'
+            entries.append(entry)
+        entries.append(f"app;dur={(until - self.root.start) / 1e6:.2f}")
+        return ", ".join(entries)
+
+    def to_otlp(self) -> dict:
+        """The trace as an OTLP/JSON ``ExportTraceServiceRequest``."""
+        spans = []
+        for span in self.spans:
+            parent_id = span.parent.span_id if span.parent else (self.remote_parent_id or "")
+            otlp_span = {
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": parent_id,
+                "name": span.name,
+                "kind": span.kind,
+                "startTimeUnixNano": str(span.start + self._wall_offset),
+                "endTimeUnixNano": str((span.end or span.start) + self._wall_offset),
+                "attributes": [_otlp_attribute(key, value) for key, value in span.attributes.items()],
+            }
+            if span.error:
+                otlp_span["status"] = {"code": 2}
+            spans.append(otlp_span)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]}
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_trace_id() -> Optional[str]:
+    """The trace id of the request being handled, if it is traced."""
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def start_span(name: str, kind: int = KIND_INTERNAL, attributes: Optional[dict] = None) -> Optional[Span]:
+    """Open a child of the current span, or return None when the request is not traced.
+
+    The span does not become the current span; use ``span()`` for phases
+    that contain other spans.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    new_span = Span(name, _current_span.get(), kind, attributes)
+    trace.spans.append(new_span)
+    return new_span
+
+
+def end_span(span: Optional[Span], error: bool = False) -> None:
+    if span is not None:
+        span.end = time.perf_counter_ns()
+        span.error = error
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Trace a phase of the request; spans opened inside it become its children."""
+    new_span = start_span(name, attributes=attributes)
+    if new_span is None:
+        yield None
+        return
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException:
+        new_span.error = True
+        raise
+    finally:
+        _current_span.reset(token)
+        new_span.end = time.perf_counter_ns()
+
+
+def _parse_traceparent(value: str):
+    """``(trace_id, parent_id, sampled)`` from a W3C traceparent, or None if malformed."""
+    match = _TRACEPARENT.fullmatch(value.strip())
+    if match is None:
+        return None
+    _, trace_id, parent_id, flags = match.groups()
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+class TracingMiddleware:
+    """Starts a trace for sampled requests and adds their ``Server-Timing`` header."""
+
+    def __init__(self, app, sample_rate: float = TRACE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        trace = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                parsed = _parse_traceparent(value.decode("latin-1"))
+                if parsed and parsed[2]:
+                    trace = Trace(parsed[0], parsed[1])
+                break
+        if trace is None:
+            if not self.sample_rate or random.random() >= self.sample_rate:
+                return await self.app(scope, receive, send)
+            trace = Trace()
+
+        root = Span(f"{scope['method']} {scope['path']}", None, KIND_SERVER, {
+            "http.request.method": scope["method"],
+            "url.path": scope["path"],
+        })
+        trace.root = root
+        trace.spans.append(root)
+        response_span = None
+
+        async def send_with_timing(message):
+            nonlocal response_span
+            if message["type"] == "http.response.start":
+                now = time.perf_counter_ns()
+                root.attributes["http.response.status_code"] = message["status"]
+                root.error = message["status"] >= 500
+                message.setdefault("headers", []).append(
+                    (b"server-timing", trace.server_timing(now).encode())
+                )
+                response_span = Span("response", root)
+                response_span.start = now
+                trace.spans.append(response_span)
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body") and response_span:
+                response_span.end = time.perf_counter_ns()
+
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except BaseException:
+            root.error = True
+            raise
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            root.end = time.perf_counter_ns()
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{scope['method']} {route.path}"
+                root.attributes["http.route"] = route.path
+            export(trace)
+
+
+class TraceExporter:
+    """Writes finished traces to a file or an OTLP/HTTP collector from a background thread."""
+
+    def __init__(self, target: str, max_queued: int = 1000, batch_size: int = 100):
+        self.target = target
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Optional[Trace]]" = queue.Queue(max_queued)
+        self._thread: Optional[threading.Thread] = None
+        self.exported = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Export what is queued, then stop."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def add(self, trace: Trace) -> None:
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = None in batch
+            traces = [trace for trace in batch if trace is not None]
+            if traces:
+                try:
+                    self._write(traces)
+                    self.exported += len(traces)
+                except Exception as e:
+                    self.dropped += len(traces)
+                    logger.warning("Could not export %d traces to %s: %s", len(traces), self.target, e)
+            if stopping:
+                return
+
+    def _write(self, traces: List[Trace]) -> None:
+        if self.target == "otlp":
+            import requests
+
+            resource_spans = [rs for trace in traces for rs in trace.to_otlp()["resourceSpans"]]
+            response = requests.post(TRACE_EXPORT_URL, json={"resourceSpans": resource_spans}, timeout=5)
+            response.raise_for_status()
+        else:
+            with open(TRACE_EXPORT_FILE, "a") as f:
+                for trace in traces:
+                    f.write(json.dumps(trace.to_otlp(), separators=(",", ":")) + "\n")
+
+
+trace_exporter: Optional[TraceExporter] = None
+
+
+def export(trace: Trace) -> None:
+    if trace_exporter is not None:
+        trace_exporter.add(trace)
+
+
+def start_trace_exporter() -> Optional[TraceExporter]:
+    """Start exporting traces if ``TRACE_EXPORT`` is ``file`` or ``otlp``."""
+    global trace_exporter
+    if TRACE_EXPORT in ("file", "otlp") and trace_exporter is None:
+        trace_exporter = TraceExporter(TRACE_EXPORT)
+        trace_exporter.start()
+        destination = TRACE_EXPORT_FILE if TRACE_EXPORT == "file" else TRACE_EXPORT_URL
+        logger.info("Exporting traces to %s (sampling %.0f%% of requests)", destination, TRACE_SAMPLE_RATE * 100)
+    elif TRACE_EXPORT:
+        logger.warning("Unknown TRACE_EXPORT %r; use 'file' or 'otlp'", TRACE_EXPORT)
+    return trace_exporter
+
+
+def stop_trace_exporter() -> None:
+    global trace_exporter
+    if trace_exporter is not None:
+        trace_exporter.stop()
+        trace_exporter = None
@@ -0,0 +1,186 @@
+"""Trending scores with exponential time decay.
+
+A note's trending score is the sum of its events (upload, likes, comments),
+each weighted and halved every ``TRENDING_HALF_LIFE_HOURS``:
+
+    score(now) = sum(weight * 2 ** -((now - at) / half_life))
+
+Every score decays by the same factor as time passes, so the ranking only
+changes when events happen.  ``note_trending`` therefore stores the
+time-independent form ``ln(sum(weight * e ** (rate * (at - EPOCH))))``:
+recording an event is a single log-add-exp upsert, and a trending page is
+an index range scan over ``score`` (or ``class_name, score``) instead of an
+aggregate over every like and comment.  Keeping the sum in log space keeps
+the values small however far ``at`` is from ``EPOCH``.
+
+Changing the half-life changes every score: run
+``python trending.py --rebuild`` afterwards to recompute them.
+"""
+import logging
+import math
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.orm import Session
+
+try:
+    from config import TRENDING_HALF_LIFE_HOURS
+except ImportError:
+    TRENDING_HALF_LIFE_HOURS = 24.0
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(2024, 1, 1)
+UPLOAD_WEIGHT = 1.0
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 2.0
+
+# Score of a note whose events have all been retracted; e ** FLOOR is 0.0
+FLOOR = -1e6
+
+_RATE = math.log(2) / (TRENDING_HALF_LIFE_HOURS * 3600)  # Per second
+_INSERT_CHUNK_SIZE = 5000
+
+
+def event_score(weight: float, at: datetime) -> float:
+    """Log-space contribution of an event of ``weight`` at time ``at``."""
+    return math.log(weight) + _RATE * (at - EPOCH).total_seconds()
+
+
+def logaddexp(a: float, b: float) -> float:
+    """``ln(e**a + e**b)`` without overflow."""
+    if a < b:
+        a, b = b, a
+    return a + math.log1p(math.exp(b - a))
+
+
+def logsubexp(a: float, b: float) -> float:
+    """``ln(e**a - e**b)``, or ``FLOOR`` once nothing is left."""
+    if b >= a - 1e-12:
+        return FLOOR
+    return a + math.log1p(-math.exp(b - a))
+
+
+def register_sqlite_functions(dbapi_connection) -> None:
+    """Make ``logaddexp``/``logsubexp`` callable from SQL on a SQLite connection."""
+    dbapi_connection.create_function("logaddexp", 2, logaddexp, deterministic=True)
+    dbapi_connection.create_function("logsubexp", 2, logsubexp, deterministic=True)
+
+
+# The upsert reads the note's class so the row can be indexed by it; notes
+# never change class.  The WHERE true keeps SQLite's parser from reading
+# ON CONFLICT as a join constraint.
+_SQLITE_UPSERT = text("""
+    INSERT INTO note_trending (note_id, class_name, score)
+    SELECT id, class_name, :score FROM notes WHERE id = :note_id AND true
+    ON CONFLICT (note_id) DO UPDATE SET score = logaddexp(note_trending.score, excluded.score)
+""")
+_SQLITE_RETRACT = text("""
+    UPDATE note_trending SET score = logsubexp(score, :score) WHERE note_id = :note_id
+""")
+_POSTGRES_UPSERT = text("""
+    INSERT INTO note_trending (note_id, class_name, score)
+    SELECT id, class_name, :score FROM notes WHERE id = :note_id
+    ON CONFLICT (note_id) DO UPDATE SET score =
+        GREATEST(note_trending.score, excluded.score)
+        + LN(1 + EXP(-ABS(note_trending.score - excluded.score)))
+""")
+_POSTGRES_RETRACT = text("""
+    UPDATE note_trending SET score = CASE
+        WHEN CAST(:score AS DOUBLE PRECISION) < score - 1e-12
+        THEN score + LN(1 - EXP(CAST(:score AS DOUBLE PRECISION) - score))
+        ELSE :floor END
+    WHERE note_id = :note_id
+""")
+
+
+def record(db: Session, note_id: int, weight: float, at: Optional[datetime] = None) -> None:
+    """Add an event to a note's score (caller commits)."""
+    add_scores(db, {note_id: event_score(weight, at or datetime.utcnow())})
+
+
+def retract(db: Session, note_id: int, weight: float, at: datetime) -> None:
+    """Remove an earlier event, e.g. an unlike, from a note's score (caller commits)."""
+    retract_scores(db, {note_id: event_score(weight, at)})
+
+
+def add_scores(db: Session, scores: Dict[int, float]) -> None:
+    """Add log-space event scores, one per note, in a single executemany (caller commits)."""
+    if not scores:
+        return
+    postgres = db.get_bind().dialect.name == "postgresql"
+    db.execute(_POSTGRES_UPSERT if postgres else _SQLITE_UPSERT, [
+        {"note_id": note_id, "score": score} for note_id, score in scores.items()
+    ])
+
+
+def retract_scores(db: Session, scores: Dict[int, float]) -> None:
+    """Subtract log-space event scores added earlier (caller commits)."""
+    if not scores:
+        return
+    postgres = db.get_bind().dialect.name == "postgresql"
+    db.execute(_POSTGRES_RETRACT if postgres else _SQLITE_RETRACT, [
+        {"note_id": note_id, "score": score, "floor": FLOOR} for note_id, score in scores.items()
+    ])
+
+
+def trending_note_ids(db: Session, limit: int, offset: int = 0, class_name: Optional[str] = None) -> List[int]:
+    """Note ids in trending order, for one page."""
+    from models import NoteTrending
+
+    query = select(NoteTrending.note_id)
+    if class_name:
+        query = query.where(NoteTrending.class_name == class_name)
+    query = query.order_by(NoteTrending.score.desc(), NoteTrending.note_id.desc())
+    return db.execute(query.offset(offset).limit(limit)).scalars().all()
+
+
+def rebuild(db: Session) -> int:
+    """Recompute every note's score from its upload, likes and comments."""
+    from models import Note, Like, Comment, NoteTrending
+
+    scores: Dict[int, float] = {}
+    class_names: Dict[int, str] = {}
+    for note_id, class_name, created_at in db.execute(
+        select(Note.id, Note.class_name, Note.created_at)
+    ).yield_per(10_000):
+        class_names[note_id] = class_name
+        scores[note_id] = event_score(UPLOAD_WEIGHT, created_at)
+    for model, weight in ((Like, LIKE_WEIGHT), (Comment, COMMENT_WEIGHT)):
+        for note_id, created_at in db.execute(
+            select(model.note_id, model.created_at)
+        ).yield_per(10_000):
+            if note_id in scores:
+                scores[note_id] = logaddexp(scores[note_id], event_score(weight, created_at))
+
+    db.execute(delete(NoteTrending))
+    rows = [
+        {"note_id": note_id, "class_name": class_names[note_id], "score": score}
+        for note_id, score in scores.items()
+    ]
+    for start in range(0, len(rows), _INSERT_CHUNK_SIZE):
+        db.execute(NoteTrending.__table__.insert(), rows[start:start + _INSERT_CHUNK_SIZE])
+    logger.info("Rebuilt trending scores for %d notes (half-life %sh)", len(rows), TRENDING_HALF_LIFE_HOURS)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Trending score maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute all trending scores")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.rebuild:
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            count = rebuild(db)
+            db.commit()
+        finally:
+            db.close()
+        print(f"Rebuilt trending scores for {count} notes")
+    else:
+        parser.print_help()
@@ -26,6 +26,11 @@ export default function NotePreview({
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
   const [textContent, setTextContent] = useState<string | null>(null)
+  // The small generated thumbnail is shown first; the original file is only
+  // fetched for the note whose thumbnail is missing (still being generated)
+  // or when the user asks for the full file
+  const [originalFor, setOriginalFor] = useState<number | null>(null)
+  const showOriginal = originalFor === noteId
 
   // Determine file type from extension
   const getFileType = (path: string): 'pdf' | 'image' | 'text' | 'unsupported' => {
@@ -43,15 +48,20 @@ export default function NotePreview({
         URL.revokeObjectURL(previewUrl)
         setPreviewUrl(null)
       }
+      setOriginalFor(null)
       return
     }
 
-    setLoading(true)
     setError(null)
     setTextContent(null)
     
     const fileType = getFileType(filePath)
     setPreviewType(fileType)
+    if (fileType === 'unsupported' || !showOriginal) {
+      setLoading(false)
+      return
+    }
+    setLoading(true)
 
     const fetchPreview = async () => {
       try {
@@ -110,7 +120,7 @@ export default function NotePreview({
         setPreviewUrl(null)
       }
     }
-  }, [isOpen, noteId, filePath])
+  }, [isOpen, noteId, filePath, showOriginal])
 
   // Cleanup on close
   useEffect(() => {
@@ -227,6 +237,21 @@ export default function NotePreview({
                 </button>
               </div>
             </div>
+          ) : !showOriginal ? (
+            <div className="flex flex-col items-center justify-center h-full p-2 sm:p-4">
+              <img
+                src={getApiUrl(`/api/notes/${noteId}/thumbnail`)}
+                alt={noteTitle}
+                onError={() => setOriginalFor(noteId)}
+                className="max-w-full max-h-[70vh] object-contain rounded shadow"
+              />
+              <button
+                onClick={() => setOriginalFor(noteId)}
+                className="mt-4 px-6 py-2 bg-primary-600 text-white rounded-lg hover:bg-primary-700"
+              >
+                View Full File
+              </button>
+            </div>
           ) : previewType === 'pdf' && previewUrl ? (
             <iframe
               src={previewUrl}
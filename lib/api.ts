@@ -39,10 +39,14 @@ export function getCurrentApiUrl(): string {
   return API_URL
 }
 
-export function getAuthHeaders(): HeadersInit {
-  const token = typeof document !== 'undefined' 
-    ? document.cookie.split('; ').find(row => row.startsWith('token='))?.split('=')[1]
+export function getAuthToken(): string | null {
+  return typeof document !== 'undefined'
+    ? document.cookie.split('; ').find(row => row.startsWith('token='))?.split('=')[1] ?? null
     : null
+}
+
+export function getAuthHeaders(): HeadersInit {
+  const token = getAuthToken()
   
   const headers: HeadersInit = {
     'Content-Type': 'application/json',
@@ -56,9 +60,7 @@ export function getAuthHeaders(): HeadersInit {
 }
 
 export function getAuthHeadersFormData(): HeadersInit {
-  const token = typeof document !== 'undefined' 
-    ? document.cookie.split('; ').find(row => row.startsWith('token='))?.split('=')[1]
-    : null
+  const token = getAuthToken()
   
   const headers: HeadersInit = {}
   
@@ -0,0 +1,31 @@
+// Helpers for the notes feeds' delta mode (?since=<version>)
+
+export interface NoteDelta<T> {
+  version: number
+  reset: boolean
+  notes: T[]
+  deleted: number[]
+}
+
+// Full feed responses carry the version to pass back as ?since=
+export function getFeedVersion(response: Response): number | null {
+  const version = response.headers.get('X-Feed-Version')
+  return version === null ? null : Number(version)
+}
+
+// Apply a delta to the loaded notes: changed notes are replaced, deleted ones
+// dropped, and new notes added if they are not older than the oldest shown
+export function mergeNoteDelta<T extends { id: number; created_at: string }>(
+  notes: T[],
+  delta: NoteDelta<T>
+): T[] {
+  const deleted = new Set(delta.deleted)
+  const byId = new Map(notes.filter(note => !deleted.has(note.id)).map(note => [note.id, note]))
+  const oldest = notes.length > 0 ? notes[notes.length - 1].created_at : null
+  for (const note of delta.notes) {
+    if (byId.has(note.id) || oldest === null || note.created_at >= oldest) {
+      byId.set(note.id, note)
+    }
+  }
+  return Array.from(byId.values()).sort((a, b) => b.created_at.localeCompare(a.created_at))
+}